@@ -66,6 +66,14 @@ def run_migrations_online() -> None:
     and associate a connection with the context.
 
     """
+    # 调用方（如测试）可以通过 config.attributes['connection'] 传入已有连接
+    connection = config.attributes.get('connection')
+    if connection is not None:
+        context.configure(connection=connection, target_metadata=target_metadata)
+        with context.begin_transaction():
+            context.run_migrations()
+        return
+
     connectable = engine_from_config(
         config.get_section(config.config_ini_section, {}),
         prefix="sqlalchemy.",
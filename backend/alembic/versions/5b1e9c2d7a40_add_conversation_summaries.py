@@ -0,0 +1,35 @@
+"""add conversation summaries
+
+Revision ID: 5b1e9c2d7a40
+Revises: 47c668c5a05f
+Create Date: 2026-10-18 09:12:31.402117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b1e9c2d7a40'
+down_revision = '47c668c5a05f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('conversation_summaries',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('summary', sa.Text(), nullable=False),
+    sa.Column('last_history_id', sa.Integer(), nullable=False),
+    sa.Column('message_count', sa.Integer(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_conversation_summaries_user_id'), 'conversation_summaries', ['user_id'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_conversation_summaries_user_id'), table_name='conversation_summaries')
+    op.drop_table('conversation_summaries')
@@ -0,0 +1,24 @@
+"""add chat history truncated flag
+
+Revision ID: 8c3f1a6d2e91
+Revises: 5b1e9c2d7a40
+Create Date: 2026-10-18 14:37:05.218844
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c3f1a6d2e91'
+down_revision = '5b1e9c2d7a40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('chat_histories', sa.Column('truncated', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('chat_histories', 'truncated')
@@ -0,0 +1,92 @@
+"""add games fulltext search
+
+Revision ID: a9d4c6e2f810
+Revises: f3c8d1a95b27
+Create Date: 2026-10-18 20:14:52.603417
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9d4c6e2f810'
+down_revision = 'f3c8d1a95b27'
+branch_labels = None
+depends_on = None
+
+# 把连续的汉字切成重叠的 n 字片段并用空格分隔（n=2 建索引，n=1 用于 ts_headline 高亮），
+# 非汉字原样保留交给 simple 解析器分词
+ZH_NGRAM_FUNCTION = r"""
+CREATE OR REPLACE FUNCTION zh_ngram_text(input text, n integer DEFAULT 2) RETURNS text
+LANGUAGE plpgsql IMMUTABLE PARALLEL SAFE AS $$
+DECLARE
+    result text := '';
+    run text := '';
+    ch text;
+    len integer;
+    i integer;
+BEGIN
+    IF input IS NULL THEN
+        RETURN '';
+    END IF;
+    -- 末尾补一个空格，保证最后一段汉字也被输出
+    FOREACH ch IN ARRAY regexp_split_to_array(input || ' ', '') LOOP
+        IF ch ~ '[㐀-䶿一-鿿豈-﫿]' THEN
+            run := run || ch;
+        ELSE
+            IF run <> '' THEN
+                len := char_length(run);
+                IF len <= n THEN
+                    result := result || ' ' || run;
+                ELSE
+                    FOR i IN 1..len - n + 1 LOOP
+                        result := result || ' ' || substr(run, i, n);
+                    END LOOP;
+                END IF;
+                result := result || ' ';
+                run := '';
+            END IF;
+            result := result || ch;
+        END IF;
+    END LOOP;
+    RETURN result;
+END;
+$$
+"""
+
+SEARCH_VECTOR = """
+    setweight(to_tsvector('zh_bigram', zh_ngram_text(coalesce(name, ''), 2)), 'A') ||
+    setweight(to_tsvector('zh_bigram', zh_ngram_text(coalesce(name_en, ''), 2)), 'A') ||
+    setweight(to_tsvector('zh_bigram', zh_ngram_text(coalesce(category, ''), 2)), 'B') ||
+    setweight(to_tsvector('zh_bigram', zh_ngram_text(coalesce(tags, ''), 2)), 'C') ||
+    setweight(to_tsvector('zh_bigram', zh_ngram_text(coalesce(description, ''), 2)), 'D')
+"""
+
+
+def upgrade() -> None:
+    # 生成列 + tsvector 仅 Postgres 12+ 可用
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute(ZH_NGRAM_FUNCTION)
+    op.execute("""
+        DO $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'zh_bigram') THEN
+                CREATE TEXT SEARCH CONFIGURATION zh_bigram (COPY = simple);
+            END IF;
+        END
+        $$
+    """)
+    op.execute(f"ALTER TABLE games ADD COLUMN search_vector tsvector "
+               f"GENERATED ALWAYS AS ({SEARCH_VECTOR}) STORED")
+    op.create_index('ix_games_search_vector', 'games', ['search_vector'], unique=False,
+                    postgresql_using='gin')
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.drop_index('ix_games_search_vector', table_name='games')
+    op.drop_column('games', 'search_vector')
+    op.execute('DROP TEXT SEARCH CONFIGURATION IF EXISTS zh_bigram')
+    op.execute('DROP FUNCTION IF EXISTS zh_ngram_text(text, integer)')
@@ -0,0 +1,23 @@
+"""add chat history keyset index
+
+Revision ID: d41a7e3b9c18
+Revises: 8c3f1a6d2e91
+Create Date: 2026-10-18 16:05:48.730215
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41a7e3b9c18'
+down_revision = '8c3f1a6d2e91'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_chat_histories_user_created_id', 'chat_histories', ['user_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_chat_histories_user_created_id', table_name='chat_histories')
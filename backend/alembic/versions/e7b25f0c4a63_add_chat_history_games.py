@@ -0,0 +1,72 @@
+"""add chat history games
+
+Revision ID: e7b25f0c4a63
+Revises: d41a7e3b9c18
+Create Date: 2026-10-18 17:22:13.509361
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7b25f0c4a63'
+down_revision = 'd41a7e3b9c18'
+branch_labels = None
+depends_on = None
+
+# 回填时每批读取的消息数
+BACKFILL_BATCH = 1000
+
+
+def upgrade() -> None:
+    op.create_table('chat_history_games',
+    sa.Column('history_id', sa.Integer(), nullable=False),
+    sa.Column('game_id', sa.Integer(), nullable=False),
+    sa.Column('position', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['game_id'], ['games.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['history_id'], ['chat_histories.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('history_id', 'game_id')
+    )
+    op.create_index(op.f('ix_chat_history_games_game_id'), 'chat_history_games', ['game_id'], unique=False)
+
+    # 回填：解析已有消息的 game_ids（JSON），跳过格式错误和已删除的游戏
+    bind = op.get_bind()
+    # game_ids 列由 add_game_ids_column.py 添加，只用 alembic 建的库没有这一列，也就没有可回填的数据
+    if 'game_ids' not in {column['name'] for column in sa.inspect(bind).get_columns('chat_histories')}:
+        return
+    links = sa.table('chat_history_games',
+                     sa.column('history_id', sa.Integer),
+                     sa.column('game_id', sa.Integer),
+                     sa.column('position', sa.Integer))
+    game_ids = {row[0] for row in bind.execute(sa.text('SELECT id FROM games'))}
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.text('SELECT id, game_ids FROM chat_histories '
+                    'WHERE id > :last_id AND game_ids IS NOT NULL ORDER BY id LIMIT :limit'),
+            {'last_id': last_id, 'limit': BACKFILL_BATCH}
+        ).fetchall()
+        if not rows:
+            break
+        batch = []
+        for history_id, raw in rows:
+            try:
+                ids = [int(gid) for gid in json.loads(raw)]
+            except (ValueError, TypeError):
+                continue
+            seen = set()
+            for gid in ids:
+                if gid in game_ids and gid not in seen:
+                    seen.add(gid)
+                    batch.append({'history_id': history_id, 'game_id': gid, 'position': len(seen) - 1})
+        if batch:
+            op.bulk_insert(links, batch)
+        last_id = rows[-1][0]
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_chat_history_games_game_id'), table_name='chat_history_games')
+    op.drop_table('chat_history_games')
@@ -0,0 +1,35 @@
+"""add games trigram indexes
+
+Revision ID: f3c8d1a95b27
+Revises: e7b25f0c4a63
+Create Date: 2026-10-18 18:40:27.164902
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3c8d1a95b27'
+down_revision = 'e7b25f0c4a63'
+branch_labels = None
+depends_on = None
+
+TRIGRAM_COLUMNS = ('name', 'name_en', 'description')
+
+
+def upgrade() -> None:
+    # pg_trgm 仅 Postgres 可用，其他数据库保持进程内模糊搜索
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for column in TRIGRAM_COLUMNS:
+        op.create_index(f'ix_games_{column}_trgm', 'games', [column], unique=False,
+                        postgresql_using='gin', postgresql_ops={column: 'gin_trgm_ops'})
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for column in TRIGRAM_COLUMNS:
+        op.drop_index(f'ix_games_{column}_trgm', table_name='games')
+    # 扩展可能被其他对象使用，不删除
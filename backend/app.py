@@ -15,7 +15,7 @@ from routes.chat_history_routes import bp as chat_history_bp
 from middleware.logging_middleware import setup_logging
 
 app = Flask(__name__)
-CORS(app, resources={r"/*": {"origins": "*"}})
+CORS(app, resources={r"/*": {"origins": "*"}}, expose_headers=["X-Did-You-Mean"])
 
 # 配置
 app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024  # 500MB
@@ -0,0 +1,33 @@
+"""
+ASGI 入口
+POST /api/chat/stream 由异步实现处理（等待 LLM 输出时不占用线程），
+其余路由原样交给 Flask 应用（WsgiToAsgi 适配）
+
+运行：uvicorn asgi:app --host 0.0.0.0 --port 5000
+"""
+from asgiref.wsgi import WsgiToAsgi
+
+from app import app as flask_app
+from routes.chat_stream_async import STREAM_PATH, stream_chat_asgi
+from services.llm_client import llm_clients
+
+wsgi_app = WsgiToAsgi(flask_app)
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await llm_clients.aclose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    if (scope['type'] == 'http' and scope['method'] == 'POST'
+            and scope['path'].rstrip('/') == STREAM_PATH):
+        await stream_chat_asgi(scope, receive, send)
+        return
+
+    await wsgi_app(scope, receive, send)
@@ -0,0 +1,57 @@
+import sys
+import os
+import time
+
+# 添加当前目录到 python path
+sys.path.append(os.getcwd())
+
+from sqlalchemy import text
+from database.models import SessionLocal, engine
+from services.trigram_search import trigram_search
+
+# 用法：python check_trigram_search.py [查询词 ...]
+# 需要先执行 alembic upgrade head（创建 pg_trgm 扩展和 GIN 索引）
+DEFAULT_QUERIES = ['星露谷', 'stardew', 'eldn ring', '恐怖']
+
+
+def check_trigram_search(queries):
+    print(f"\n🔍 Checking pg_trgm search on {engine.url.render_as_string(hide_password=True)}")
+    if not trigram_search.available():
+        print("❌ pg_trgm is not available (not Postgres, or extension not installed)")
+        return
+
+    db = SessionLocal()
+    try:
+        indexes = db.execute(text(
+            "SELECT indexname FROM pg_indexes WHERE tablename = 'games' AND indexname LIKE '%_trgm'"
+        )).scalars().all()
+        print(f"✅ Trigram indexes: {', '.join(indexes) or '(none)'}")
+
+        for query in queries:
+            started = time.perf_counter()
+            hits = trigram_search.search(query, limit=5, db=db)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            db.rollback()
+            print("-" * 50)
+            print(f"Query: {query}  ({len(hits)} hits, {elapsed_ms:.1f} ms)")
+            for game, score in hits:
+                print(f"  {score:.3f}  {game.name} / {game.name_en or '-'}")
+
+        # 查看执行计划，确认使用了 GIN 索引而不是顺序扫描
+        plan = db.execute(text(
+            "EXPLAIN SELECT id FROM games WHERE name % :q OR name ILIKE :pattern"
+        ), {'q': queries[0], 'pattern': f'%{queries[0]}%'}).scalars().all()
+        print("-" * 50)
+        print("Plan:")
+        for line in plan:
+            print(f"  {line}")
+    except Exception as e:
+        print(f"❌ Error checking trigram search: {e}")
+        import traceback
+        traceback.print_exc()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    check_trigram_search(sys.argv[1:] or DEFAULT_QUERIES)
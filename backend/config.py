@@ -11,7 +11,8 @@ class Config:
     DB_PASSWORD = os.getenv('DB_PASSWORD', 'devpass')
     DB_NAME = os.getenv('DB_NAME', 'ltygames')
     
-    DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    # 设置 DATABASE_URL 时直接使用（测试用 SQLite 文件库），否则由以上各项拼接
+    DATABASE_URL = os.getenv('DATABASE_URL') or f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
     
     # 阿里云 OSS Configuration
     OSS_ENDPOINT = os.getenv('OSS_ENDPOINT', 'https://oss-cn-hangzhou.aliyuncs.com')
@@ -31,6 +32,88 @@ class Config:
     QWEN_MODEL = os.getenv('QWEN_MODEL', 'qwen3-max')
     QWEN_BASE_URL = os.getenv('QWEN_BASE_URL', 'https://dashscope.aliyuncs.com/compatible-mode/v1')
     
+    # LLM 连接池配置（进程内共享）
+    LLM_POOL_MAX_CONNECTIONS = int(os.getenv('LLM_POOL_MAX_CONNECTIONS', '50'))
+    LLM_POOL_MAX_KEEPALIVE = int(os.getenv('LLM_POOL_MAX_KEEPALIVE', '20'))
+    LLM_POOL_KEEPALIVE_EXPIRY = float(os.getenv('LLM_POOL_KEEPALIVE_EXPIRY', '60'))
+    LLM_HTTP2 = os.getenv('LLM_HTTP2', 'false').lower() == 'true'
+    LLM_CONNECT_TIMEOUT = float(os.getenv('LLM_CONNECT_TIMEOUT', '5'))
+    LLM_READ_TIMEOUT = float(os.getenv('LLM_READ_TIMEOUT', '60'))
+    LLM_WRITE_TIMEOUT = float(os.getenv('LLM_WRITE_TIMEOUT', '10'))
+    LLM_POOL_TIMEOUT = float(os.getenv('LLM_POOL_TIMEOUT', '10'))
+    LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '2'))
+    
+    # 游戏目录快照：超过该秒数自动重新加载（0 表示仅在写操作时更新）
+    CATALOG_REFRESH_SECONDS = float(os.getenv('CATALOG_REFRESH_SECONDS', '300'))
+    
+    # 推测执行：LLM 分析意图时并行用原话搜索
+    SPECULATIVE_SEARCH = os.getenv('SPECULATIVE_SEARCH', 'true').lower() == 'true'
+    SPECULATION_WORKERS = int(os.getenv('SPECULATION_WORKERS', '8'))
+    
+    # 一次回复中多个工具调用的并发执行线程数
+    TOOL_CALL_WORKERS = int(os.getenv('TOOL_CALL_WORKERS', '8'))
+    
+    # 相同问题并发到达时合并搜索和意图分析调用
+    COALESCE_REQUESTS = os.getenv('COALESCE_REQUESTS', 'true').lower() == 'true'
+    
+    # 工具结果和意图决策缓存（条数为 0 时关闭；目录变化时自动清空）
+    TOOL_CACHE_SIZE = int(os.getenv('TOOL_CACHE_SIZE', '1024'))
+    TOOL_CACHE_TTL = float(os.getenv('TOOL_CACHE_TTL', '300'))
+    INTENT_CACHE_SIZE = int(os.getenv('INTENT_CACHE_SIZE', '1024'))
+    INTENT_CACHE_TTL = float(os.getenv('INTENT_CACHE_TTL', '600'))
+    
+    # 提示词 token 预算（按部分）
+    PROMPT_TOKEN_ENCODING = os.getenv('PROMPT_TOKEN_ENCODING', 'cl100k_base')
+    PROMPT_BUDGET_SYSTEM = int(os.getenv('PROMPT_BUDGET_SYSTEM', '800'))
+    PROMPT_BUDGET_CATALOG = int(os.getenv('PROMPT_BUDGET_CATALOG', '1500'))
+    PROMPT_BUDGET_HISTORY = int(os.getenv('PROMPT_BUDGET_HISTORY', '2000'))
+    PROMPT_BUDGET_USER = int(os.getenv('PROMPT_BUDGET_USER', '500'))
+    PROMPT_BUDGET_SUMMARY = int(os.getenv('PROMPT_BUDGET_SUMMARY', '400'))
+    
+    # 搜索无结果时，按 BM25 相关性挑选放进提示词的游戏数和 token 预算
+    RETRIEVAL_TOP_K = int(os.getenv('RETRIEVAL_TOP_K', '20'))
+    PROMPT_BUDGET_RETRIEVAL = int(os.getenv('PROMPT_BUDGET_RETRIEVAL', '1200'))
+    
+    # 语义搜索：本地哈希向量维度、向量索引持久化目录（留空则不落盘）、最低相似度
+    SEMANTIC_EMBED_DIM = int(os.getenv('SEMANTIC_EMBED_DIM', '512'))
+    VECTOR_INDEX_DIR = os.getenv('VECTOR_INDEX_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'vector_index'))
+    SEMANTIC_MIN_SCORE = float(os.getenv('SEMANTIC_MIN_SCORE', '0.1'))
+    
+    # 对话滚动摘要：提示词只带摘要 + 最近几条消息，更早的消息由后台线程压缩进摘要
+    SUMMARY_ENABLED = os.getenv('SUMMARY_ENABLED', 'true').lower() == 'true'
+    HISTORY_WINDOW_MESSAGES = int(os.getenv('HISTORY_WINDOW_MESSAGES', '8'))
+    SUMMARY_BATCH_MESSAGES = int(os.getenv('SUMMARY_BATCH_MESSAGES', '12'))
+    # 每次送入摘要模型的最多消息数；积压更多时分多次合并
+    SUMMARY_PASS_MESSAGES = int(os.getenv('SUMMARY_PASS_MESSAGES', '100'))
+    SUMMARY_MAX_CHARS = int(os.getenv('SUMMARY_MAX_CHARS', '300'))
+    SUMMARY_CACHE_SIZE = int(os.getenv('SUMMARY_CACHE_SIZE', '1024'))
+    SUMMARY_MODEL = os.getenv('SUMMARY_MODEL', os.getenv('QWEN_MODEL', 'qwen3-max'))
+    
+    # 对话历史写入：默认后台批量写入（攒满一批或到时间间隔后一次多行插入），
+    # 关闭时在请求线程中同步提交
+    HISTORY_WRITE_BEHIND = os.getenv('HISTORY_WRITE_BEHIND', 'true').lower() == 'true'
+    HISTORY_BATCH_SIZE = int(os.getenv('HISTORY_BATCH_SIZE', '64'))
+    HISTORY_FLUSH_INTERVAL = float(os.getenv('HISTORY_FLUSH_INTERVAL', '0.2'))
+    HISTORY_WRITE_RETRIES = int(os.getenv('HISTORY_WRITE_RETRIES', '3'))
+    
+    # 活跃用户的 user_id 和最近消息缓存在进程内（按用户 LRU），热用户每轮不再查询历史
+    HISTORY_CACHE_SIZE = int(os.getenv('HISTORY_CACHE_SIZE', '1024'))
+    
+    # 对话历史接口：每页默认/最大条数，导出时每批从数据库读取的行数
+    HISTORY_PAGE_SIZE = int(os.getenv('HISTORY_PAGE_SIZE', '50'))
+    HISTORY_PAGE_MAX = int(os.getenv('HISTORY_PAGE_MAX', '200'))
+    HISTORY_EXPORT_BATCH = int(os.getenv('HISTORY_EXPORT_BATCH', '500'))
+    
+    # Postgres pg_trgm 搜索：auto 时目录达到 TRIGRAM_MIN_GAMES 且数据库已安装 pg_trgm 才启用，
+    # 否则使用进程内 n-gram 索引；on/off 强制开启/关闭
+    SEARCH_TRIGRAM = os.getenv('SEARCH_TRIGRAM', 'auto').lower()
+    TRIGRAM_MIN_GAMES = int(os.getenv('TRIGRAM_MIN_GAMES', '5000'))
+    TRIGRAM_THRESHOLD = float(os.getenv('TRIGRAM_THRESHOLD', '0.3'))
+    
+    # 全文搜索（mode=fulltext）每页默认/最大条数
+    FULLTEXT_PAGE_SIZE = int(os.getenv('FULLTEXT_PAGE_SIZE', '20'))
+    FULLTEXT_PAGE_MAX = int(os.getenv('FULLTEXT_PAGE_MAX', '100'))
+    
     # Flask Configuration
     SECRET_KEY = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
     MAX_CONTENT_LENGTH = 500 * 1024 * 1024  # 500MB
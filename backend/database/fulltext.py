@@ -0,0 +1,64 @@
+"""
+games.search_vector 全文检索列依赖的数据库对象（Postgres）
+与迁移 a9d4c6e2f810 中的定义保持一致；模型用它们声明生成列，create_all 建表前先创建函数和分词配置
+"""
+
+# 把连续的汉字切成重叠的 n 字片段并用空格分隔（n=2 建索引，n=1 用于 ts_headline 高亮），
+# 非汉字原样保留交给 simple 解析器分词
+ZH_NGRAM_FUNCTION = r"""
+CREATE OR REPLACE FUNCTION zh_ngram_text(input text, n integer DEFAULT 2) RETURNS text
+LANGUAGE plpgsql IMMUTABLE PARALLEL SAFE AS $$
+DECLARE
+    result text := '';
+    run text := '';
+    ch text;
+    len integer;
+    i integer;
+BEGIN
+    IF input IS NULL THEN
+        RETURN '';
+    END IF;
+    -- 末尾补一个空格，保证最后一段汉字也被输出
+    FOREACH ch IN ARRAY regexp_split_to_array(input || ' ', '') LOOP
+        IF ch ~ '[㐀-䶿一-鿿豈-﫿]' THEN
+            run := run || ch;
+        ELSE
+            IF run <> '' THEN
+                len := char_length(run);
+                IF len <= n THEN
+                    result := result || ' ' || run;
+                ELSE
+                    FOR i IN 1..len - n + 1 LOOP
+                        result := result || ' ' || substr(run, i, n);
+                    END LOOP;
+                END IF;
+                result := result || ' ';
+                run := '';
+            END IF;
+            result := result || ch;
+        END IF;
+    END LOOP;
+    RETURN result;
+END;
+$$
+"""
+
+# 汉字片段使用的分词配置（复制 simple），已存在时跳过
+ZH_BIGRAM_CONFIG = """
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'zh_bigram') THEN
+        CREATE TEXT SEARCH CONFIGURATION zh_bigram (COPY = simple);
+    END IF;
+END
+$$
+"""
+
+# 生成列表达式：名称权重最高，其次为分类、标签、简介
+SEARCH_VECTOR = """
+    setweight(to_tsvector('zh_bigram', zh_ngram_text(coalesce(name, ''), 2)), 'A') ||
+    setweight(to_tsvector('zh_bigram', zh_ngram_text(coalesce(name_en, ''), 2)), 'A') ||
+    setweight(to_tsvector('zh_bigram', zh_ngram_text(coalesce(category, ''), 2)), 'B') ||
+    setweight(to_tsvector('zh_bigram', zh_ngram_text(coalesce(tags, ''), 2)), 'C') ||
+    setweight(to_tsvector('zh_bigram', zh_ngram_text(coalesce(description, ''), 2)), 'D')
+"""
@@ -1,14 +1,40 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, create_engine
+from sqlalchemy import Column, Computed, Integer, String, Text, DateTime, Boolean, ForeignKey, Index, DDL, create_engine, event, false
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import sessionmaker, relationship, deferred
+from sqlalchemy.schema import CreateColumn
 from datetime import datetime
 from config import Config
+from database.fulltext import SEARCH_VECTOR, ZH_BIGRAM_CONFIG, ZH_NGRAM_FUNCTION
+from database.pool_metrics import instrument
 import uuid
 
 Base = declarative_base()
 
+# 游戏名/英文名/简介上的 pg_trgm GIN 索引（迁移 f3c8d1a95b27），只在 Postgres 上创建
+TRIGRAM_COLUMNS = ('name', 'name_en', 'description')
+
+
+@compiles(CreateColumn)
+def _create_column(element, compiler, **kw):
+    """info 中标记 postgresql_only 的列在其他数据库上建表时跳过"""
+    if element.element.info.get('postgresql_only') and compiler.dialect.name != 'postgresql':
+        return None
+    return compiler.visit_create_column(element, **kw)
+
+
 class Game(Base):
     __tablename__ = 'games'
+    __table_args__ = tuple(
+        Index(f'ix_games_{column}_trgm', column, postgresql_using='gin',
+              postgresql_ops={column: 'gin_trgm_ops'}).ddl_if(dialect='postgresql')
+        for column in TRIGRAM_COLUMNS
+    ) + (
+        Index('ix_games_search_vector', 'search_vector', postgresql_using='gin').ddl_if(dialect='postgresql'),
+    )
+    # 插入后不用 RETURNING 取回生成列：SQLite 和尚未执行迁移的库中没有 search_vector
+    __mapper_args__ = {'eager_defaults': False}
     
     id = Column(Integer, primary_key=True)
     name = Column(String(255), nullable=False)
@@ -29,6 +55,9 @@ class Game(Base):
     rating = Column(Integer)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # 全文检索生成列（迁移 a9d4c6e2f810），只存在于 Postgres；默认不加载
+    search_vector = deferred(Column(TSVECTOR, Computed(SEARCH_VECTOR, persisted=True),
+                                    info={'postgresql_only': True}))
     
     def to_dict(self):
         return {
@@ -66,6 +95,8 @@ class User(Base):
     
     # 关系
     chat_histories = relationship("ChatHistory", back_populates="user", cascade="all, delete-orphan")
+    conversation_summary = relationship("ConversationSummary", back_populates="user",
+                                        uselist=False, cascade="all, delete-orphan")
     
     def to_dict(self):
         return {
@@ -79,16 +110,23 @@ class User(Base):
 
 class ChatHistory(Base):
     __tablename__ = 'chat_histories'
+    __table_args__ = (
+        # 按用户分页 / 导出时按 (created_at, id) 做 keyset 翻页
+        Index('ix_chat_histories_user_created_id', 'user_id', 'created_at', 'id'),
+    )
     
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False, index=True)
     role = Column(String(20), nullable=False)  # 'user' or 'assistant'
     content = Column(Text, nullable=False)
-    game_ids = Column(Text, nullable=True)  # JSON 格式存储关联的游戏 ID，如 "[1, 2, 3]"
+    game_ids = Column(Text, nullable=True)  # JSON 格式的游戏 ID，如 "[1, 2, 3]"（保留兼容，查询使用 chat_history_games）
+    truncated = Column(Boolean, nullable=False, default=False, server_default=false())  # 客户端中途断开，只保存了部分回复
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # 关系
     user = relationship("User", back_populates="chat_histories")
+    game_links = relationship("ChatHistoryGame", order_by="ChatHistoryGame.position",
+                              cascade="all, delete-orphan", passive_deletes=True)
     
     def to_dict(self):
         return {
@@ -97,10 +135,51 @@ class ChatHistory(Base):
             'role': self.role,
             'content': self.content,
             'game_ids': self.game_ids,
+            'truncated': bool(self.truncated),
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
+class ChatHistoryGame(Base):
+    """对话消息关联的游戏（消息卡片），position 为卡片顺序"""
+    __tablename__ = 'chat_history_games'
+    
+    history_id = Column(Integer, ForeignKey('chat_histories.id', ondelete='CASCADE'), primary_key=True)
+    game_id = Column(Integer, ForeignKey('games.id', ondelete='CASCADE'), primary_key=True, index=True)
+    position = Column(Integer, nullable=False, default=0)
+    
+    # 关系
+    game = relationship("Game")
+
+class ConversationSummary(Base):
+    __tablename__ = 'conversation_summaries'
+    
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False, unique=True, index=True)
+    summary = Column(Text, nullable=False)  # 较早对话的压缩摘要
+    last_history_id = Column(Integer, nullable=False)  # 摘要已覆盖到的最后一条 ChatHistory.id
+    message_count = Column(Integer, default=0)  # 摘要累计覆盖的消息数
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # 关系
+    user = relationship("User", back_populates="conversation_summary")
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'summary': self.summary,
+            'last_history_id': self.last_history_id,
+            'message_count': self.message_count,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+# create_all 在 Postgres 上建 games 表前先创建 pg_trgm 扩展（gin_trgm_ops 依赖它）
+# 以及 search_vector 生成列用到的函数和分词配置
+for ddl in ('CREATE EXTENSION IF NOT EXISTS pg_trgm', ZH_NGRAM_FUNCTION, ZH_BIGRAM_CONFIG):
+    event.listen(Game.__table__, 'before_create', DDL(ddl).execute_if(dialect='postgresql'))
+
 engine = create_engine(Config.DATABASE_URL)
+instrument(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 def init_db():
@@ -0,0 +1,95 @@
+"""
+数据库连接池占用统计
+通过 SQLAlchemy 连接池事件记录每次 checkout 到 checkin 的持有时长，
+用于确认请求只在读写数据库的短暂阶段占用连接（例如流式输出期间不占用）
+"""
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import event
+
+# 计算分位数时保留的最近样本数
+RECENT_SAMPLES = 1024
+
+# 超过该时长（毫秒）的持有记为长时间占用
+LONG_HOLD_MS = 1000
+
+
+class PoolCheckoutStats:
+    """连接持有时长统计（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.checked_out = 0
+        self.max_checked_out = 0
+        self.long_holds = 0
+        self.total_hold_ms = 0.0
+        self.max_hold_ms = 0.0
+        self._recent = deque(maxlen=RECENT_SAMPLES)
+
+    def checkout(self):
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+
+    def checkin(self, hold_ms):
+        with self._lock:
+            self.checked_out -= 1
+            self.total_hold_ms += hold_ms
+            self.max_hold_ms = max(self.max_hold_ms, hold_ms)
+            if hold_ms > LONG_HOLD_MS:
+                self.long_holds += 1
+            self._recent.append(hold_ms)
+
+    def snapshot(self):
+        with self._lock:
+            recent = sorted(self._recent)
+            completed = self.checkouts - self.checked_out
+
+            def percentile(p):
+                if not recent:
+                    return 0.0
+                return round(recent[min(len(recent) - 1, int(len(recent) * p))], 2)
+
+            return {
+                'checkouts': self.checkouts,
+                'checked_out': self.checked_out,
+                'max_checked_out': self.max_checked_out,
+                'avg_hold_ms': round(self.total_hold_ms / completed, 2) if completed else 0.0,
+                'p50_hold_ms': percentile(0.5),
+                'p95_hold_ms': percentile(0.95),
+                'max_hold_ms': round(self.max_hold_ms, 2),
+                'long_holds': self.long_holds,
+            }
+
+
+pool_stats = PoolCheckoutStats()
+
+
+def instrument(engine):
+    """给 engine 的连接池挂上 checkout/checkin 事件"""
+
+    @event.listens_for(engine, 'checkout')
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        connection_record.info['checked_out_at'] = time.perf_counter()
+        pool_stats.checkout()
+
+    @event.listens_for(engine, 'checkin')
+    def _on_checkin(dbapi_connection, connection_record):
+        started = connection_record.info.pop('checked_out_at', None)
+        if started is not None:
+            pool_stats.checkin((time.perf_counter() - started) * 1000)
+
+
+def pool_status(engine):
+    """连接池当前状态 + 持有时长统计"""
+    data = pool_stats.snapshot()
+    pool = engine.pool
+    for name in ('size', 'checkedout', 'overflow'):
+        method = getattr(pool, name, None)
+        if callable(method):
+            data[f'pool_{name}'] = method()
+    return data
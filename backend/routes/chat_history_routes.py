@@ -2,15 +2,49 @@
 对话历史路由
 """
 import json
-from flask import Blueprint, request, jsonify
-from database.models import User, ChatHistory, Game, SessionLocal
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import joinedload, selectinload
+from config import Config
+from database.models import User, ChatHistory, ChatHistoryGame, ConversationSummary, SessionLocal
+from services.summarizer import conversation_summarizer
+from services.history_writer import history_writer, history_row
+from services.history_cache import history_cache
 
 bp = Blueprint('chat_history', __name__, url_prefix='/api/chat/history')
 
+def history_with_games(histories):
+    """消息 -> to_dict() 并附带关联的游戏（game_links 需随查询一起预加载）"""
+    result = []
+    for h in histories:
+        history_dict = h.to_dict()
+        history_dict['games'] = [link.game.to_dict() for link in h.game_links]
+        result.append(history_dict)
+    return result
+
+def parse_positive_int(name, default=None):
+    """读取正整数查询参数；缺省时返回 default，格式不对时抛出 ValueError"""
+    value = request.args.get(name)
+    if value is None or value == '':
+        return default
+    number = int(value)
+    if number <= 0:
+        raise ValueError
+    return number
+
 @bp.route('/<user_key>', methods=['GET'])
 def get_history(user_key):
-    """获取用户的对话历史"""
+    """
+    获取用户的对话历史（keyset 分页，每页按时间正序）
+    默认返回最近 limit 条；把响应中的 next_before_id 作为 before_id 传入即可继续向前翻页
+    """
     try:
+        try:
+            limit = min(parse_positive_int('limit', Config.HISTORY_PAGE_SIZE), Config.HISTORY_PAGE_MAX)
+            before_id = parse_positive_int('before_id')
+        except ValueError:
+            return jsonify({'error': 'limit 和 before_id 必须是正整数'}), 400
+        
         db = SessionLocal()
         try:
             # 查找用户
@@ -18,33 +52,29 @@ def get_history(user_key):
             if not user:
                 return jsonify({'error': '用户不存在'}), 404
             
-            # 获取对话历史（按时间排序）
-            histories = db.query(ChatHistory)\
-                .filter(ChatHistory.user_id == user.id)\
-                .order_by(ChatHistory.created_at.asc())\
+            # 按 (created_at, id) 倒序取一页，多取一条判断是否还有更早的消息
+            # 关联的游戏通过 chat_history_games 在同一条查询中 JOIN 取回
+            query = db.query(ChatHistory)\
+                .options(joinedload(ChatHistory.game_links).joinedload(ChatHistoryGame.game))\
+                .filter(ChatHistory.user_id == user.id)
+            if before_id is not None:
+                cursor_created_at = select(ChatHistory.created_at)\
+                    .where(ChatHistory.id == before_id, ChatHistory.user_id == user.id)\
+                    .scalar_subquery()
+                query = query.filter(
+                    tuple_(ChatHistory.created_at, ChatHistory.id) < tuple_(cursor_created_at, before_id)
+                )
+            page = query.order_by(ChatHistory.created_at.desc(), ChatHistory.id.desc())\
+                .limit(limit + 1)\
                 .all()
-            
-            # 构建返回数据，包含关联的游戏信息
-            result = []
-            for h in histories:
-                history_dict = h.to_dict()
-                
-                # 如果有关联的游戏 ID，查询游戏信息
-                if h.game_ids:
-                    try:
-                        game_ids = json.loads(h.game_ids)
-                        games = db.query(Game).filter(Game.id.in_(game_ids)).all()
-                        history_dict['games'] = [g.to_dict() for g in games]
-                    except:
-                        history_dict['games'] = []
-                else:
-                    history_dict['games'] = []
-                
-                result.append(history_dict)
+            has_more = len(page) > limit
+            histories = list(reversed(page[:limit]))
             
             return jsonify({
                 'success': True,
-                'histories': result
+                'histories': history_with_games(histories),
+                'has_more': has_more,
+                'next_before_id': histories[0].id if has_more else None
             }), 200
         finally:
             db.close()
@@ -52,6 +82,49 @@ def get_history(user_key):
         print(f"Error getting history: {e}")
         return jsonify({'error': str(e)}), 500
 
+@bp.route('/<user_key>/export', methods=['GET'])
+def export_history(user_key):
+    """以 NDJSON 流式导出用户的全部对话历史（每行一条，按时间正序），边读边写，内存占用与历史长度无关"""
+    try:
+        db = SessionLocal()
+        try:
+            user = db.query(User).filter(User.user_key == user_key).first()
+            if not user:
+                return jsonify({'error': '用户不存在'}), 404
+            user_id = user.id
+        finally:
+            db.close()
+        
+        # 先写完后台队列，导出内容包含刚保存的消息
+        history_writer.flush()
+        
+        def generate():
+            # 会话在开始迭代时才打开：响应体从未被读取时不会占用连接
+            db = SessionLocal()
+            try:
+                result = db.execute(
+                    select(ChatHistory)
+                    .options(selectinload(ChatHistory.game_links).joinedload(ChatHistoryGame.game))
+                    .where(ChatHistory.user_id == user_id)
+                    .order_by(ChatHistory.created_at.asc(), ChatHistory.id.asc())
+                    .execution_options(yield_per=Config.HISTORY_EXPORT_BATCH)
+                )
+                for partition in result.scalars().partitions():
+                    yield ''.join(json.dumps(history, ensure_ascii=False) + '\n'
+                                  for history in history_with_games(partition))
+                    db.expunge_all()
+            finally:
+                db.close()
+        
+        return Response(
+            stream_with_context(generate()),
+            mimetype='application/x-ndjson',
+            headers={'Content-Disposition': f'attachment; filename=chat_history_{user_key}.ndjson'}
+        )
+    except Exception as e:
+        print(f"Error exporting history: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @bp.route('/<user_key>', methods=['POST'])
 def save_message(user_key):
     """保存一条对话消息"""
@@ -70,20 +143,14 @@ def save_message(user_key):
             if not user:
                 return jsonify({'error': '用户不存在'}), 404
             
-            # 保存消息
-            history = ChatHistory(
-                user_id=user.id,
-                role=role,
-                content=content
-            )
-            
-            db.add(history)
-            db.commit()
-            db.refresh(history)
+            # 保存消息（单条显式保存同步提交，返回的记录带数据库 id）
+            row = history_row(user.id, role, content)
+            history_cache.append(user.id, [row])
+            history_writer.append([row], sync=True)
             
             return jsonify({
                 'success': True,
-                'history': history.to_dict()
+                'history': ChatHistory(**row).to_dict()
             }), 200
         finally:
             db.close()
@@ -102,12 +169,25 @@ def clear_history(user_key):
             if not user:
                 return jsonify({'error': '用户不存在'}), 404
             
-            # 删除所有对话历史
+            # 先写完后台队列中的消息，避免删除后又被写入
+            history_writer.flush()
+            
+            # 删除所有对话历史（先删关联的游戏卡片）
+            db.query(ChatHistoryGame)\
+                .filter(ChatHistoryGame.history_id.in_(
+                    select(ChatHistory.id).where(ChatHistory.user_id == user.id)
+                ))\
+                .delete(synchronize_session=False)
             db.query(ChatHistory)\
                 .filter(ChatHistory.user_id == user.id)\
                 .delete()
+            db.query(ConversationSummary)\
+                .filter(ConversationSummary.user_id == user.id)\
+                .delete()
             
             db.commit()
+            conversation_summarizer.invalidate(user.id)
+            history_cache.invalidate(user_key, user.id)
             
             return jsonify({
                 'success': True,
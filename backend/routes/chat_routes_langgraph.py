@@ -1,38 +1,43 @@
 from flask import Blueprint, request, jsonify, Response, stream_with_context
-from sqlalchemy import or_
-from database.models import Game, User, ChatHistory, SessionLocal
+from database.models import User, ChatHistory, SessionLocal, engine
+from database.pool_metrics import pool_status
 from langgraph.graph import StateGraph, END
-from typing import TypedDict, List, Dict, Any
+from typing import TypedDict, List, Dict, Any, Optional, Tuple
 import os
+import re
 import json
-from openai import OpenAI
+import time
 from dotenv import load_dotenv
-import httpx
+from services.llm_client import llm_clients
+from services.game_catalog import game_catalog
+from services.game_search import game_search
+from services.semantic_search import semantic_search
+from services.fulltext_search import fulltext_search
+from services.trigram_search import trigram_search
+from services.category_matcher import intent_matcher
+from services.intent_router import fast_router, normalize_query
+from services.speculation import speculative_search
+from services.tool_runner import run_tool_calls, merge_ranked
+from services.singleflight import search_flight, intent_flight, async_intent_flight
+from services.ttl_cache import tool_result_cache, intent_cache
+from services.prompt_builder import prompt_builder, CatalogItem
+from services.summarizer import conversation_summarizer
+from services.stream_metrics import stream_stats
+from services.history_writer import history_writer, history_row
+from services.history_cache import history_cache
+from config import Config
 
 # 加载环境变量
 load_dotenv()
 
 bp = Blueprint('chat_langgraph', __name__)
 
-# 全局变量存储对话历史
-conversation_store = {}
-
 # 全局 LangGraph 实例
 graph_app = None
 
 def get_openai_client():
-    """获取 OpenAI 客户端（禁用代理以避免兼容性问题）"""
-    # 创建一个不使用代理的 httpx 客户端
-    http_client = httpx.Client(
-        timeout=60.0,
-        limits=httpx.Limits(max_keepalive_connections=5, max_connections=10)
-    )
-    
-    return OpenAI(
-        api_key=os.getenv('QWEN_API_KEY'),
-        base_url=os.getenv('QWEN_BASE_URL', 'https://dashscope.aliyuncs.com/compatible-mode/v1'),
-        http_client=http_client
-    )
+    """获取共享的 OpenAI 客户端（复用连接池，避免每次调用重新握手）"""
+    return llm_clients.get_client()
 
 # 定义状态类型
 class AgentState(TypedDict):
@@ -42,220 +47,331 @@ class AgentState(TypedDict):
     all_games_list: List[Dict[str, Any]]  # 所有游戏列表（用于 AI 参考）
     intent: str
     final_response: str
-
-# 游戏类型映射（用于 AI 识别用户意图）
-CATEGORY_KEYWORDS = {
-    'action': ['动作', '冒险', 'action', 'adventure'],
-    'turn_based': ['回合', '战棋', 'turn-based', 'tactical', 'srpg'],
-    'wuxia': ['国风', '仙侠', '武侠', '修仙', 'wuxia', 'chinese'],
-    'retro': ['复古', '经典', '怀旧', 'retro', 'classic'],
-    'female_lead': ['女性', '女主', 'female', 'heroine'],
-    'utility': ['工具', '实用', 'utility', 'tool'],
-    'horror': ['恐怖', '惊悚', 'horror', 'thriller', 'scary'],
-    'shooter': ['射击', '枪战', 'fps', 'shooter', 'gun'],
-    'fighting': ['格斗', '对战', 'fighting', 'versus'],
-    'simulation': ['模拟', '经营', 'simulation', 'management', 'tycoon'],
-    'puzzle': ['益智', '休闲', 'puzzle', 'casual'],
-    'interactive': ['真人', '互动', 'interactive', 'fmv'],
-    'racing': ['竞速', '体育', '赛车', 'racing', 'sports'],
-    'strategy': ['策略', '战略', 'strategy', 'rts'],
-    'roguelike': ['肉鸽', 'roguelike', 'roguelite', 'rogue'],
-    'vr': ['vr', '虚拟现实', 'virtual reality'],
-    'visual_novel': ['视觉小说', 'galgame', 'visual novel', 'avg'],
-    'rpg': ['rpg', '角色扮演', 'role-playing']
-}
+    token_usage: Dict[str, int]  # 最终回复提示词各部分的 token 数
+    conversation_summary: str  # 更早对话的滚动摘要
+    did_you_mean: str  # 搜索词拼写纠正后的建议
+
+def recent_rows(db, user_id: int, summarized_id: int) -> List[Dict[str, Any]]:
+    """
+    摘要之后的最近消息（从旧到新），包含后台写入队列中尚未提交的消息
+    已并入摘要的消息不再重复发送；后台摘要落后时最多多带一批消息
+    """
+    limit = Config.HISTORY_WINDOW_MESSAGES + Config.SUMMARY_BATCH_MESSAGES
+    # 先取后台写入队列中尚未提交的消息，再查库；查询期间刚好提交的按 (created_at, role) 去重
+    pending = history_writer.pending(user_id)
+    histories = db.query(ChatHistory.id, ChatHistory.role, ChatHistory.content, ChatHistory.created_at)\
+        .filter(ChatHistory.user_id == user_id, ChatHistory.id > summarized_id)\
+        .order_by(ChatHistory.id.desc())\
+        .limit(limit)\
+        .all()
+    # 反转顺序（从旧到新）
+    rows = [{'id': h.id, 'role': h.role, 'content': h.content, 'created_at': h.created_at}
+            for h in reversed(histories)]
+    committed = {(h.created_at, h.role) for h in histories}
+    rows += [row for row in pending if (row['created_at'], row['role']) not in committed]
+    return rows[-limit:]
+
+def coalesce_key(query: str):
+    """
+    缓存与请求合并的键：(归一化查询, 目录版本)，目录变化后不会复用旧结果
+    键只决定哪些请求共享一次调用；调用本身仍按用户的原话执行
+    """
+    return normalize_query(query) or query.strip(), game_catalog.snapshot().version
 
 def detect_category(query: str) -> str:
     """从用户查询中检测游戏类型"""
+    return intent_matcher.detect(query)
+
+def substring_matches(snapshot, query: str, limit: int = 5):
+    """名称/英文名/简介包含查询词的游戏（等价于 ILIKE '%query%'）"""
     query_lower = query.lower()
-    for category, keywords in CATEGORY_KEYWORDS.items():
-        for keyword in keywords:
-            if keyword in query_lower:
-                return category
-    return None
-
-# 计算字符串相似度（简单的编辑距离）
-def similarity_score(s1: str, s2: str) -> float:
-    """计算两个字符串的相似度（0-1）"""
-    s1, s2 = s1.lower(), s2.lower()
-    if s1 == s2:
-        return 1.0
-    if not s1 or not s2:
-        return 0.0
-    
-    # 检查是否包含
-    if s1 in s2 or s2 in s1:
-        return 0.8
-    
-    # 计算共同字符比例
-    common = sum(1 for c in s1 if c in s2)
-    return common / max(len(s1), len(s2))
+    return [
+        g for g in snapshot.games
+        if query_lower in g.name.lower()
+        or query_lower in (g.name_en or '').lower()
+        or query_lower in (g.description or '').lower()
+    ][:limit]
 
 # 工具定义
-def search_games_tool(query: str) -> List[Dict[str, Any]]:
-    """搜索游戏数据库（支持模糊匹配）"""
-    db = SessionLocal()
-    try:
-        # 检测是否按类型搜索
-        detected_category = detect_category(query)
+def search_games_tool(query: str) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    搜索游戏目录（支持模糊匹配；目录较大且有 pg_trgm 时在数据库中搜索）
+    返回 (结果, 拼写纠正后的查询)；只有原查询没有结果、改用纠正后的查询找到时才有纠正
+    """
+    snapshot = game_catalog.snapshot()
+    
+    # 检测是否按类型搜索
+    detected_category = detect_category(query)
+    
+    # 处理通用查询，返回最近的游戏
+    generic_terms = ['游戏', '游戏库', '推荐', '所有', '列表', '有什么']
+    
+    if detected_category:
+        # 按类型搜索
+        games = snapshot.by_category.get(detected_category, ())[:5]
         
-        # 处理通用查询，返回最近的游戏
-        generic_terms = ['游戏', '游戏库', '推荐', '所有', '列表', '有什么']
+        if not games:
+            return [], None
+    elif not query or query in generic_terms or '游戏库' in query:
+        games = snapshot.games[:5]
+    elif trigram_search.enabled(len(snapshot)):
+        # 目录较大时交给数据库的 pg_trgm 索引（子串 + 相似度，已按相关性排序）
+        return [game.to_dict() for game, _score in trigram_search.search(query, limit=5)], None
+    else:
+        # 先尝试精确模糊搜索（等价于 ILIKE '%query%'）
+        games = substring_matches(snapshot, query)
         
-        if detected_category:
-            # 按类型搜索
-            games = db.query(Game).filter(
-                Game.category == detected_category
-            ).order_by(Game.created_at.desc()).limit(5).all()
-            
-            if not games:
-                return []
-        elif not query or query in generic_terms or '游戏库' in query:
-            games = db.query(Game).order_by(Game.created_at.desc()).limit(5).all()
-        else:
-            # 先尝试精确模糊搜索
-            games = db.query(Game).filter(
-                or_(
-                    Game.name.ilike(f'%{query}%'),
-                    Game.name_en.ilike(f'%{query}%'),
-                    Game.description.ilike(f'%{query}%')
-                )
-            ).limit(5).all()
-            
-            # 如果没找到，尝试相似度匹配
-            if not games:
-                all_games = db.query(Game).all()
-                scored_games = []
-                for game in all_games:
-                    # 计算与游戏名的相似度
-                    name_score = similarity_score(query, game.name)
-                    name_en_score = similarity_score(query, game.name_en or '')
-                    max_score = max(name_score, name_en_score)
-                    if max_score >= 0.5:  # 相似度阈值
-                        scored_games.append((game, max_score))
-                
-                # 按相似度排序
-                scored_games.sort(key=lambda x: x[1], reverse=True)
-                games = [g[0] for g in scored_games[:5]]
+        # 英文名拼错时，纠正单词后再匹配一次
+        if not games:
+            corrected = game_search.did_you_mean(query)
+            if corrected:
+                games = substring_matches(snapshot, corrected)
+                if games:
+                    return [game.to_dict() for game in games], corrected
         
-        return [game.to_dict() for game in games]
-    finally:
-        db.close()
+        # 如果没找到，通过 n-gram 索引做相似度匹配
+        if not games:
+            games = game_search.fuzzy_search(query, limit=5)
+    
+    return [game.to_dict() for game in games], None
 
-def list_all_games_tool() -> List[Dict[str, Any]]:
-    """列出游戏库中所有游戏的名称"""
-    db = SessionLocal()
-    try:
-        games = db.query(Game).order_by(Game.created_at.desc()).all()
-        return [{'id': g.id, 'name': g.name, 'name_en': g.name_en} for g in games]
-    finally:
-        db.close()
+def semantic_search_tool(query: str) -> List[Dict[str, Any]]:
+    """按玩法、题材、氛围等描述做语义搜索（本地向量索引）"""
+    key = ('semantic_search',) + coalesce_key(query)
+    return tool_result_cache.get_or_compute(
+        key, lambda: [record.to_dict() for record, _score in semantic_search.search(query, limit=5)]
+    )
 
-# Agent 节点
-def analyze_and_call_tools(state: AgentState) -> AgentState:
-    """分析用户意图并调用工具"""
-    user_query = state["user_query"]
-    
-    # 定义工具
-    tools = [
-        {
-            "type": "function",
-            "function": {
-                "name": "search_games",
-                "description": "搜索游戏数据库，支持模糊匹配。即使用户输入的名称有错别字或不完整，也能找到相似的游戏。",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "query": {
-                            "type": "string",
-                            "description": "搜索关键词，可以是游戏名称（支持模糊匹配）、英文名或相关描述"
-                        }
-                    },
-                    "required": ["query"]
-                }
+def list_all_games_tool(limit: int = None) -> List[Dict[str, Any]]:
+    """列出游戏库中所有游戏的名称（limit 限制条数）"""
+    return [{'id': g.id, 'name': g.name, 'name_en': g.name_en}
+            for g in game_catalog.snapshot().games[:limit]]
+
+# list_all_games 结果回传给模型时最多包含的游戏数
+TOOL_RESULT_LIST_LIMIT = 100
+
+# 返回游戏列表、结果需要合并进 search_results 的工具
+SEARCH_TOOLS = ("search_games", "semantic_search")
+
+# Agent 工具定义
+INTENT_TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "search_games",
+            "description": "搜索游戏数据库，支持模糊匹配。即使用户输入的名称有错别字或不完整，也能找到相似的游戏。",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "query": {
+                        "type": "string",
+                        "description": "搜索关键词，可以是游戏名称（支持模糊匹配）、英文名或相关描述"
+                    }
+                },
+                "required": ["query"]
             }
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "list_all_games",
-                "description": "列出游戏库中所有游戏的名称列表，用于查看库中有哪些游戏，或者当搜索失败时查找相似名称",
-                "parameters": {
-                    "type": "object",
-                    "properties": {},
-                    "required": []
-                }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "semantic_search",
+            "description": "按玩法、题材、氛围等描述语义搜索游戏，适合用户没有说出游戏名、而是描述想玩什么样的游戏时使用，例如\"温馨的种田游戏\"、\"a cozy farming game\"。",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "query": {
+                        "type": "string",
+                        "description": "对想要的游戏的描述"
+                    }
+                },
+                "required": ["query"]
             }
         }
-    ]
-    
-    # 构建消息
-    system_prompt = """你是一个私人游戏库管理助手。
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "list_all_games",
+            "description": "列出游戏库中所有游戏的名称列表，用于查看库中有哪些游戏，或者当搜索失败时查找相似名称",
+            "parameters": {
+                "type": "object",
+                "properties": {},
+                "required": []
+            }
+        }
+    }
+]
+
+# 意图分析的系统提示词
+INTENT_SYSTEM_PROMPT = """你是一个私人游戏库管理助手。
 
 你的任务：
 1. 分析用户的意图
 2. 如果用户想要搜索或了解游戏，使用 search_games 工具（支持模糊匹配）
-3. 如果搜索没有结果，可以用 list_all_games 查看库中所有游戏，找到名称相似的
-4. 如果用户只是闲聊，直接回复即可
+3. 如果用户描述的是想玩什么样的游戏（玩法、题材、氛围），使用 semantic_search 工具
+4. 如果搜索没有结果，可以用 list_all_games 查看库中所有游戏，找到名称相似的
+5. 如果用户只是闲聊，直接回复即可
 
 重要提示：
 - 用户提到的游戏名可能有错别字或不完整，search_games 支持模糊匹配
 - 例如用户说"康斯坦斯"，可能是指"康斯坦丝"，工具会自动匹配
 - 如果第一次搜索没结果，尝试用不同的关键词再搜索一次
+- 不确定准确名称时，可以在一次回复中同时调用多个 search_games，分别尝试不同的写法
 - 用户询问"有什么游戏"、"推荐游戏"时，调用 search_games
 - 游戏库是实时更新的，每次搜索都会获取最新数据
 - 保持友好、专业的语气"""
-    
-    messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": user_query}
-    ]
-    
-    client = get_openai_client()
-    
-    # 调用 OpenAI with tools
-    response = client.chat.completions.create(
-        model=os.getenv('QWEN_MODEL', 'qwen3-max'),
-        messages=messages,
-        tools=tools,
-        temperature=0.7
+
+def library_fallback(search_results: List[Dict[str, Any]]):
+    """搜索没有结果时附带的游戏库列表，供 AI 参考（只取回传给模型的前若干个）"""
+    return None if search_results else list_all_games_tool(limit=TOOL_RESULT_LIST_LIMIT)
+
+def coalesced_search(query: str):
+    """
+    相同查询优先复用缓存结果；并发未命中时只执行一次搜索，其余请求共享结果
+    返回 (搜索结果, 游戏库列表或 None, 拼写纠正或 None)；
+    缓存只保存搜索结果和纠正，游戏库列表每次从目录快照生成
+    """
+    key = ('search_games',) + coalesce_key(query)
+    flight = search_flight if Config.COALESCE_REQUESTS else None
+    search_results, did_you_mean = tool_result_cache.get_or_compute(
+        key, lambda: search_games_tool(query), flight
     )
-    
-    message = response.choices[0].message
-    
-    # 检查是否需要调用工具
-    if message.tool_calls:
-        tool_call = message.tool_calls[0]
-        function_name = tool_call.function.name
-        function_args = json.loads(tool_call.function.arguments) if tool_call.function.arguments else {}
-        
-        print(f"🔧 Tool called: {function_name} with args: {function_args}")
+    return search_results, library_fallback(search_results), did_you_mean
+
+def execute_tool(function_name: str, function_args: Dict[str, Any], speculation=None) -> Dict[str, Any]:
+    """执行单个工具调用（search_games 可复用推测执行的结果）"""
+    result = {"name": function_name, "args": function_args, "games": [], "all_games": None,
+              "did_you_mean": None}
+    if function_name == "search_games":
+        query = function_args.get("query", "")
+        speculated = speculative_search.take(speculation, query)
+        if speculated is not None:
+            result["games"], result["all_games"], result["did_you_mean"] = speculated
+            print(f"🔮 Reused speculative search for: {query}")
+        else:
+            result["games"], result["all_games"], result["did_you_mean"] = coalesced_search(query)
+        print(f"✅ Found {len(result['games'])} games for: {query}")
+    elif function_name == "semantic_search":
+        query = function_args.get("query", "")
+        result["games"] = semantic_search_tool(query)
+        print(f"✅ Semantic search found {len(result['games'])} games for: {query}")
+    elif function_name == "list_all_games":
+        result["all_games"] = list_all_games_tool()
+        print(f"📋 Listed {len(result['all_games'])} games in library")
+    return result
+
+def apply_tool_results(state: AgentState, results: List[Dict[str, Any]]) -> AgentState:
+    """合并所有工具调用的结果并写入状态"""
+    searches = [r for r in results if r["name"] in SEARCH_TOOLS]
+    if searches:
+        # 多次搜索的结果去重合并，多路都靠前的游戏排在前面
+        search_results = merge_ranked([r["games"] for r in searches])
+        state["search_results"] = search_results
+        state["intent"] = "search"
+        state["did_you_mean"] = next((r["did_you_mean"] for r in searches if r.get("did_you_mean")), None)
         
-        if function_name == "search_games":
-            search_results = search_games_tool(function_args.get("query", ""))
-            state["search_results"] = search_results
-            state["intent"] = "search"
-            print(f"✅ Found {len(search_results)} games")
-            
-            # 关键：如果搜索没有结果，自动获取所有游戏供 AI 参考
-            # 这样 AI 就不会编造不存在的游戏
-            if not search_results:
-                all_games = list_all_games_tool()
-                state["all_games_list"] = all_games
-                print(f"📋 No search results, loaded {len(all_games)} games for reference")
-        elif function_name == "list_all_games":
-            all_games = list_all_games_tool()
-            state["search_results"] = []
-            state["intent"] = "list"
+        # 关键：如果搜索没有结果，自动获取所有游戏供 AI 参考
+        # 这样 AI 就不会编造不存在的游戏
+        if not search_results:
+            all_games = next((r["all_games"] for r in searches if r["all_games"] is not None), None)
+            if all_games is None:
+                all_games = library_fallback(search_results)
             state["all_games_list"] = all_games
-            print(f"📋 Listed {len(all_games)} games in library")
-        else:
-            state["search_results"] = []
-            state["intent"] = "chat"
+            print(f"📋 No search results, loaded {len(all_games)} games for reference")
+    elif any(r["name"] == "list_all_games" for r in results):
+        state["search_results"] = []
+        state["intent"] = "list"
+        state["all_games_list"] = next(r["all_games"] for r in results if r["name"] == "list_all_games")
     else:
         state["search_results"] = []
         state["intent"] = "chat"
-        print("💬 No tool call needed, direct chat")
+    return state
+
+def tool_result_content(result: Dict[str, Any]) -> str:
+    """工具结果回传给模型时的精简内容"""
+    if result["name"] in SEARCH_TOOLS:
+        payload = [{'id': g['id'], 'name': g['name'], 'name_en': g.get('name_en')}
+                   for g in result["games"]]
+    elif result["name"] == "list_all_games":
+        payload = [g['name'] for g in (result["all_games"] or [])[:TOOL_RESULT_LIST_LIMIT]]
+    else:
+        payload = []
+    if result.get("did_you_mean"):
+        # 告诉模型纠正后的写法，避免再用同样的错词重试
+        payload = {"did_you_mean": result["did_you_mean"], "games": payload}
+    return json.dumps(payload, ensure_ascii=False)
+
+def intent_request(user_query: str) -> Dict[str, Any]:
+    """意图分析 LLM 调用的参数（同步与异步客户端共用）"""
+    return {
+        "model": os.getenv('QWEN_MODEL', 'qwen3-max'),
+        "messages": [
+            {"role": "system", "content": INTENT_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt_builder.fit_text(user_query)}
+        ],
+        "tools": INTENT_TOOLS,
+        "parallel_tool_calls": True,
+        "temperature": 0.7
+    }
+
+def route_fast_path(state: AgentState):
+    """明显的意图（游戏名、类型词、列表请求）本地直接路由；无法确定时返回 None"""
+    decision = fast_router.route(state["user_query"])
+    if not decision:
+        return None
+    print(f"⚡ Fast path ({decision.route}): {decision.tool} with args: {decision.args}")
+    return apply_tool_results(state, [execute_tool(decision.tool, decision.args)])
+
+def apply_intent_message(state: AgentState, message, speculation=None) -> AgentState:
+    """根据意图分析返回的消息执行工具调用，并把调用过程追加到对话消息中"""
+    # 检查是否需要调用工具
+    if message.tool_calls:
+        calls = []
+        for tool_call in message.tool_calls:
+            function_name = tool_call.function.name
+            function_args = json.loads(tool_call.function.arguments) if tool_call.function.arguments else {}
+            print(f"🔧 Tool called: {function_name} with args: {function_args}")
+            calls.append([function_name, function_args, None])
+        
+        # 推测结果只交给第一个查询与原话一致的搜索调用
+        for call in calls:
+            if speculation and call[0] == "search_games" and speculation.matches(call[1].get("query", "")):
+                call[2], speculation = speculation, None
+                break
+        speculative_search.discard(speculation)
+        
+        # 所有工具调用并发执行，结果一次性回传
+        results = run_tool_calls(calls, execute_tool)
+        apply_tool_results(state, results)
+        
+        state["messages"].append({
+            "role": "assistant",
+            "content": message.content or "",
+            "tool_calls": [
+                {
+                    "id": tool_call.id,
+                    "type": "function",
+                    "function": {
+                        "name": tool_call.function.name,
+                        "arguments": tool_call.function.arguments or "{}"
+                    }
+                }
+                for tool_call in message.tool_calls
+            ]
+        })
+        for tool_call, result in zip(message.tool_calls, results):
+            state["messages"].append({
+                "role": "tool",
+                "tool_call_id": tool_call.id,
+                "content": tool_result_content(result)
+            })
+        return state
+    
+    speculative_search.discard(speculation)
+    state["search_results"] = []
+    state["intent"] = "chat"
+    print("💬 No tool call needed, direct chat")
     
     # 保存 AI 的响应消息
     state["messages"].append({
@@ -265,41 +381,110 @@ def analyze_and_call_tools(state: AgentState) -> AgentState:
     
     return state
 
-def generate_final_response(state: AgentState) -> AgentState:
-    """生成最终响应"""
+# Agent 节点
+def analyze_and_call_tools(state: AgentState, speculate: bool = None) -> AgentState:
+    """分析用户意图并调用工具（speculate 为真时与 LLM 并行推测执行搜索）"""
     user_query = state["user_query"]
-    search_results = state.get("search_results", [])
-    intent = state.get("intent", "chat")
+    if speculate is None:
+        speculate = Config.SPECULATIVE_SEARCH
+    
+    # 明显的意图本地直接路由，省掉一次 LLM 调用
+    routed = route_fast_path(state)
+    if routed is not None:
+        return routed
     
     client = get_openai_client()
     
-    if intent == "search" and search_results:
-        # 有搜索结果时，让 AI 介绍游戏
-        games_info = "\n".join([
-            f"- {g['name']}: {g.get('description', '暂无描述')[:100]}"
-            for g in search_results[:5]
-        ])
-        
-        system_prompt = f"""你是一个私人游戏库管理助手。这是用户自己上传的游戏资源库。
+    # LLM 分析意图期间，先用用户原话推测执行搜索
+    speculation = speculative_search.start(user_query, coalesced_search) if speculate else None
+    
+    # 调用 OpenAI with tools（相同问题复用缓存的决策，并发到达时共享同一次调用）
+    key = coalesce_key(user_query)
+    request_args = intent_request(user_query)
+    try:
+        response = intent_cache.get_or_compute(
+            key,
+            lambda: client.chat.completions.create(**request_args),
+            intent_flight if Config.COALESCE_REQUESTS else None
+        )
+    except Exception:
+        speculative_search.discard(speculation)
+        raise
+    
+    return apply_intent_message(state, response.choices[0].message, speculation)
+
+# 回复阶段的系统提示词模板（{user_query}、{catalog} 由 prompt_builder 按预算填充）
+SEARCH_RESPONSE_PROMPT = """你是一个私人游戏库管理助手。这是用户自己上传的游戏资源库。
 
 用户询问："{user_query}"
 
 已从用户的游戏库中找到以下游戏：
-{games_info}
+{catalog}
 
 回复要求：
 1. 直接告诉用户"已找到XXX"，引导用户点击下方卡片下载
 2. 可以简单介绍游戏特点（1-2句话）
 3. 不要提及版权、购买、正版等话题，这是用户自己的私人资源库
 4. 保持简洁友好，不要说教"""
-    else:
-        # 没有搜索结果或纯聊天
-        system_prompt = f"""你是一个私人游戏库管理助手。用户说："{user_query}"
+
+LIBRARY_RECOMMEND_PROMPT = """你是一个私人游戏库管理助手。这是用户自己上传的游戏资源库。
+
+用户询问："{user_query}"
+
+搜索没有找到精确匹配的游戏。以下是用户游戏库中与问题最相关的游戏及简介：
+{catalog}
+
+重要规则：
+1. 你只能推荐上面列表中存在的游戏，绝对不能编造或推荐列表中没有的游戏！
+2. 根据用户的需求，从列表中选择最合适的1-2款游戏推荐
+3. 推荐时请使用书名号《》包裹游戏名称，如《神之天平》
+4. 简单介绍为什么推荐这款游戏
+5. 如果列表中确实没有符合用户需求的游戏，诚实告诉用户"游戏库中暂时没有这类游戏"
+6. 建议用户点击右上角"上传游戏"按钮添加想要的游戏
+7. 不要提及版权、购买等话题"""
+
+CHAT_RESPONSE_PROMPT = """你是一个私人游戏库管理助手。用户说："{user_query}"
 
 请友好地回应用户。如果游戏库中没有找到相关游戏，告诉用户可以点击右上角"上传游戏"按钮添加。
 不要提及版权、购买等话题。"""
+
+STREAM_CHAT_PROMPT = CHAT_RESPONSE_PROMPT + "绝对不要编造或推荐游戏库中不存在的游戏。"
+
+# 模板固定部分不截断，超出 PROMPT_BUDGET_SYSTEM 时启动即失败
+prompt_builder.check_system(SEARCH_RESPONSE_PROMPT, LIBRARY_RECOMMEND_PROMPT,
+                            CHAT_RESPONSE_PROMPT, STREAM_CHAT_PROMPT)
+
+def search_result_items(search_results: List[Dict[str, Any]]) -> List[CatalogItem]:
+    """搜索结果作为提示词中的目录上下文"""
+    return [CatalogItem(f"- {g['name']}: ", (g.get('description') or '暂无描述')[:100])
+            for g in search_results[:5]]
+
+def library_items(query: str) -> List[CatalogItem]:
+    """与问题最相关的前 K 款游戏作为提示词中的目录上下文（BM25 检索，超出预算时由 prompt_builder 裁剪）"""
+    return [CatalogItem(f"- 《{g.name}》: ", (g.description or '暂无描述')[:80])
+            for g in game_search.relevant(query, limit=Config.RETRIEVAL_TOP_K)]
+
+def generate_final_response(state: AgentState) -> AgentState:
+    """生成最终响应"""
+    user_query = state["user_query"]
+    search_results = state.get("search_results", [])
+    intent = state.get("intent", "chat")
     
-    messages = [{"role": "system", "content": system_prompt}] + state["messages"]
+    client = get_openai_client()
+    
+    if intent == "search" and search_results:
+        # 有搜索结果时，让 AI 介绍游戏
+        template, catalog_items = SEARCH_RESPONSE_PROMPT, search_result_items(search_results)
+    else:
+        # 没有搜索结果或纯聊天
+        template, catalog_items = CHAT_RESPONSE_PROMPT, []
+    
+    messages, usage = prompt_builder.build(
+        template, state["messages"], catalog_items, user_query,
+        summary=state.get("conversation_summary")
+    )
+    state["token_usage"] = usage
+    print(f"🧮 Prompt tokens: {usage}")
     
     response = client.chat.completions.create(
         model=os.getenv('QWEN_MODEL', 'qwen3-max'),
@@ -312,6 +497,111 @@ def generate_final_response(state: AgentState) -> AgentState:
     
     return state
 
+def new_state(history: List[Dict[str, str]], user_message: str, summary) -> AgentState:
+    """一轮对话的初始状态"""
+    return {
+        "messages": history + [{"role": "user", "content": user_message}],
+        "user_query": user_message,
+        "search_results": [],
+        "all_games_list": [],
+        "intent": "",
+        "final_response": "",
+        "conversation_summary": summary
+    }
+
+def sse_event(payload: Dict[str, Any]) -> str:
+    """一条 SSE 事件（/stream 同步与异步实现共用，格式必须保持一致）"""
+    return f"data: {json.dumps(payload)}\n\n"
+
+def build_stream_prompt(analyzed_state: AgentState, user_message: str, summary) -> List[Dict[str, Any]]:
+    """流式回复的提示词：按意图和搜索结果选择模板，再按 token 预算组装"""
+    search_results = analyzed_state.get("search_results", [])
+    intent = analyzed_state.get("intent", "chat")
+    all_games_list = analyzed_state.get("all_games_list", [])
+    
+    catalog_budget = None
+    if intent == "search" and search_results:
+        template, catalog_items = SEARCH_RESPONSE_PROMPT, search_result_items(search_results)
+    elif all_games_list:
+        # 搜索没有精确结果，检索与问题最相关的少量游戏让 AI 从中选择推荐
+        template, catalog_items = LIBRARY_RECOMMEND_PROMPT, library_items(user_message)
+        catalog_budget = Config.PROMPT_BUDGET_RETRIEVAL
+    else:
+        template, catalog_items = STREAM_CHAT_PROMPT, []
+    
+    # 按 token 预算组装提示词（丢弃最早的历史、截短最长的描述）
+    messages, usage = prompt_builder.build(
+        template, analyzed_state["messages"], catalog_items, user_message,
+        summary=summary, catalog_budget=catalog_budget
+    )
+    print(f"🧮 Prompt tokens: {usage}")
+    return messages
+
+def games_mentioned_in(text: str) -> List[Dict[str, Any]]:
+    """AI 回复中用书名号提到的游戏（在目录快照中查找，最多 2 个）"""
+    mentioned_games = re.findall(r'《([^》]+)》', text)
+    games_by_name = game_catalog.snapshot().by_name
+    matched_games = []
+    for game_name in mentioned_games[:2]:
+        game = games_by_name.get(game_name)
+        if game:
+            matched_games.append(game.to_dict())
+    return matched_games
+
+def load_turn_context(user_key: str):
+    """
+    读取一轮对话需要的用户、摘要和最近历史
+    活跃用户直接使用缓存的窗口；未命中时查询一次，读完立即归还连接
+    返回 (user_id, history, summary)；用户不存在时返回 None
+    """
+    cached = history_cache.get(user_key)
+    if cached is None:
+        token = history_cache.token()
+        db = SessionLocal()
+        try:
+            user = db.query(User.id).filter(User.user_key == user_key).first()
+            if not user:
+                return None
+            _, summarized_id = conversation_summarizer.get(user.id, db)
+            rows = recent_rows(db, user.id, summarized_id)
+        finally:
+            db.close()
+        history_cache.put(user_key, user.id, rows, token)
+        cached = (user.id, rows)
+    
+    user_id, rows = cached
+    summary, summarized_id = conversation_summarizer.get(user_id)
+    history = [{'role': row['role'], 'content': row['content']}
+               for row in rows if row.get('id') is None or row['id'] > summarized_id]
+    return user_id, history, summary
+
+def save_conversation(user_id: int, user_message: str, full_response: str,
+                      search_results: List[Dict[str, Any]], truncated: bool = False):
+    """保存一轮对话（AI 响应附带关联的游戏 ID）；交给后台批量写入，提交后安排摘要"""
+    game_ids_json = None
+    if search_results:
+        game_ids_json = json.dumps([g['id'] for g in search_results[:2]])
+    
+    rows = [
+        history_row(user_id, 'user', user_message),
+        history_row(user_id, 'assistant', full_response, game_ids=game_ids_json, truncated=truncated),
+    ]
+    history_cache.append(user_id, rows)
+    history_writer.append(rows, on_commit=lambda: conversation_summarizer.schedule(user_id))
+
+def finish_stream(full_response: str):
+    """流式回复正常结束"""
+    stream_stats.complete(prompt_builder.counter.count(full_response))
+
+def abandon_stream(user_id: int, user_message: str, partial_response: str,
+                   search_results: List[Dict[str, Any]]):
+    """客户端中途断开（上游流已关闭）：记录统计，已生成的部分回复标记为 truncated 保存"""
+    tokens = prompt_builder.counter.count(partial_response)
+    stream_stats.abandon(tokens)
+    print(f"✂️ Client disconnected, upstream stream closed after {tokens} tokens")
+    if partial_response:
+        save_conversation(user_id, user_message, partial_response, search_results, truncated=True)
+
 def create_graph():
     """创建 LangGraph 工作流"""
     workflow = StateGraph(AgentState)
@@ -361,69 +651,36 @@ def send_message():
         print(f"\n{'='*50}")
         print(f"📨 New message from user {user_key}: {user_message}")
         
-        # 从数据库加载对话历史
-        db = SessionLocal()
-        try:
-            user = db.query(User).filter(User.user_key == user_key).first()
-            if not user:
-                return jsonify({'error': '用户不存在'}), 404
-            
-            # 获取最近的对话历史（最多20条）
-            histories = db.query(ChatHistory)\
-                .filter(ChatHistory.user_id == user.id)\
-                .order_by(ChatHistory.created_at.desc())\
-                .limit(20)\
-                .all()
-            
-            # 反转顺序（从旧到新）
-            history = [{'role': h.role, 'content': h.content} for h in reversed(histories)]
-            
-            # 构建初始状态
-            initial_state = {
-                "messages": history + [{"role": "user", "content": user_message}],
-                "user_query": user_message,
-                "search_results": [],
-                "all_games_list": [],
-                "intent": "",
-                "final_response": ""
-            }
-            
-            # 运行 LangGraph
-            print("🤖 Running LangGraph workflow...")
-            final_state = graph_app.invoke(initial_state)
-            
-            response_text = final_state["final_response"]
-            search_results = final_state.get("search_results", [])
-            
-            print(f"✅ Response generated: {response_text[:100]}...")
-            print(f"📊 Games found: {len(search_results)}")
-            
-            # 保存用户消息到数据库
-            user_history = ChatHistory(
-                user_id=user.id,
-                role='user',
-                content=user_message
-            )
-            db.add(user_history)
-            
-            # 保存 AI 响应到数据库
-            assistant_history = ChatHistory(
-                user_id=user.id,
-                role='assistant',
-                content=response_text
-            )
-            db.add(assistant_history)
-            db.commit()
-            
-            print(f"💾 Conversation saved to database for user {user_key}")
-            
-            return jsonify({
-                'response': response_text,
-                'games': search_results[:2],  # 卡片最多显示2个
-                'intent': final_state.get("intent", "chat")
-            }), 200
-        finally:
-            db.close()
+        # 从数据库加载摘要和对话历史（读完即归还连接，LLM 调用期间不占用）
+        context = load_turn_context(user_key)
+        if context is None:
+            return jsonify({'error': '用户不存在'}), 404
+        user_id, history, summary = context
+        
+        # 构建初始状态
+        initial_state = new_state(history, user_message, summary)
+        
+        # 运行 LangGraph
+        print("🤖 Running LangGraph workflow...")
+        final_state = graph_app.invoke(initial_state)
+        
+        response_text = final_state["final_response"]
+        search_results = final_state.get("search_results", [])
+        
+        print(f"✅ Response generated: {response_text[:100]}...")
+        print(f"📊 Games found: {len(search_results)}")
+        
+        # 保存用户消息和 AI 响应到数据库（后台批量写入，提交后检查是否需要压缩摘要）
+        save_conversation(user_id, user_message, response_text, [])
+        print(f"💾 Conversation queued for saving for user {user_key}")
+        
+        return jsonify({
+            'response': response_text,
+            'games': search_results[:2],  # 卡片最多显示2个
+            'intent': final_state.get("intent", "chat"),
+            'token_usage': final_state.get("token_usage"),
+            'did_you_mean': final_state.get("did_you_mean")
+        }), 200
         
     except Exception as e:
         print(f"❌ Error in chat: {type(e).__name__}: {str(e)}")
@@ -443,102 +700,34 @@ def stream_chat():
             return jsonify({'error': 'Missing required fields'}), 400
             
         def generate():
-            db = SessionLocal()
+            # 分阶段占用数据库连接：读取上下文后立即归还，流式输出期间不持有连接，
+            # 书名号中的游戏从内存目录解析，最后只在写入时短暂借用连接
             try:
-                user = db.query(User).filter(User.user_key == user_key).first()
-                if not user:
-                    yield f"data: {json.dumps({'error': 'User not found'})}\n\n"
+                # 1. 加载摘要和最近的历史
+                context = load_turn_context(user_key)
+                if context is None:
+                    yield sse_event({'error': 'User not found'})
                     return
-
-                # 1. 加载历史
-                histories = db.query(ChatHistory)\
-                    .filter(ChatHistory.user_id == user.id)\
-                    .order_by(ChatHistory.created_at.desc())\
-                    .limit(20)\
-                    .all()
-                history = [{'role': h.role, 'content': h.content} for h in reversed(histories)]
+                user_id, history, summary = context
                 
                 # 2. 构建状态并分析意图
-                initial_state = {
-                    "messages": history + [{"role": "user", "content": user_message}],
-                    "user_query": user_message,
-                    "search_results": [],
-                    "all_games_list": [],
-                    "intent": "",
-                    "final_response": ""
-                }
+                initial_state = new_state(history, user_message, summary)
                 
                 # 发送"正在分析"状态
-                yield f"data: {json.dumps({'type': 'status', 'data': 'analyzing'})}\n\n"
+                yield sse_event({'type': 'status', 'data': 'analyzing'})
                 
                 # 调用分析函数（复用现有的逻辑）
                 analyzed_state = analyze_and_call_tools(initial_state)
                 search_results = analyzed_state.get("search_results", [])
-                intent = analyzed_state.get("intent", "chat")
-                
-                # 3. 构建最终提示词
                 all_games_list = analyzed_state.get("all_games_list", [])
                 
                 # 如果有游戏结果，先发送搜索状态，再发送结果（卡片最多显示2个）
                 if search_results:
-                    yield f"data: {json.dumps({'type': 'status', 'data': 'searching'})}\n\n"
-                    yield f"data: {json.dumps({'type': 'games', 'data': search_results[:2]})}\n\n"
-                elif all_games_list and intent == "search":
-                    # 搜索没结果但有游戏库，获取所有游戏的完整信息供 AI 选择
-                    all_full_games = db.query(Game).all()
-                    all_games_dict = {g.name: g.to_dict() for g in all_full_games}
-                    # 先不发送卡片，等 AI 回复后再处理
+                    yield sse_event({'type': 'status', 'data': 'searching'})
+                    yield sse_event({'type': 'games', 'data': search_results[:2]})
                 
-                if intent == "search" and search_results:
-                    games_info = "\n".join([
-                        f"- {g['name']}: {g.get('description', '暂无描述')[:100]}"
-                        for g in search_results[:5]
-                    ])
-                    system_prompt = f"""你是一个私人游戏库管理助手。这是用户自己上传的游戏资源库。
-
-用户询问："{user_message}"
-
-已从用户的游戏库中找到以下游戏：
-{games_info}
-
-回复要求：
-1. 直接告诉用户"已找到XXX"，引导用户点击下方卡片下载
-2. 可以简单介绍游戏特点（1-2句话）
-3. 不要提及版权、购买、正版等话题，这是用户自己的私人资源库
-4. 保持简洁友好，不要说教"""
-                elif all_games_list:
-                    # 搜索没有精确结果，但有游戏库列表，让 AI 从中选择推荐
-                    # 获取完整游戏信息（包含描述）供 AI 参考
-                    all_full_games = db.query(Game).all()
-                    games_with_desc = "\n".join([
-                        f"- 《{g.name}》: {(g.description or '暂无描述')[:80]}"
-                        for g in all_full_games
-                    ])
-                    system_prompt = f"""你是一个私人游戏库管理助手。这是用户自己上传的游戏资源库。
-
-用户询问："{user_message}"
-
-搜索没有找到精确匹配的游戏。以下是用户游戏库中的所有游戏及简介：
-{games_with_desc}
-
-重要规则：
-1. 你只能推荐上面列表中存在的游戏，绝对不能编造或推荐列表中没有的游戏！
-2. 根据用户的需求，从列表中选择最合适的1-2款游戏推荐
-3. 推荐时请使用书名号《》包裹游戏名称，如《神之天平》
-4. 简单介绍为什么推荐这款游戏
-5. 如果列表中确实没有符合用户需求的游戏，诚实告诉用户"游戏库中暂时没有这类游戏"
-6. 建议用户点击右上角"上传游戏"按钮添加想要的游戏
-7. 不要提及版权、购买等话题"""
-                    
-                    # 将完整游戏信息存储，用于后续匹配
-                    all_games_dict = {g.name: g.to_dict() for g in all_full_games}
-                else:
-                    system_prompt = f"""你是一个私人游戏库管理助手。用户说："{user_message}"
-                    
-请友好地回应用户。如果游戏库中没有找到相关游戏，告诉用户可以点击右上角"上传游戏"按钮添加。
-不要提及版权、购买等话题。绝对不要编造或推荐游戏库中不存在的游戏。"""
-
-                messages = [{"role": "system", "content": system_prompt}] + analyzed_state["messages"]
+                # 3. 构建最终提示词
+                messages = build_stream_prompt(analyzed_state, user_message, summary)
                 
                 # 4. 流式调用 OpenAI
                 client = get_openai_client()
@@ -549,64 +738,43 @@ def stream_chat():
                     stream=True
                 )
                 
+                stream_stats.begin()
                 full_response = ""
-                for chunk in stream:
-                    if chunk.choices[0].delta.content:
-                        content = chunk.choices[0].delta.content
-                        full_response += content
-                        yield f"data: {json.dumps({'type': 'content', 'data': content})}\n\n"
+                try:
+                    for chunk in stream:
+                        if chunk.choices[0].delta.content:
+                            content = chunk.choices[0].delta.content
+                            full_response += content
+                            yield sse_event({'type': 'content', 'data': content})
+                except GeneratorExit:
+                    # 客户端断开时服务器关闭生成器：关闭上游连接让模型停止生成
+                    stream.close()
+                    abandon_stream(user_id, user_message, full_response, search_results)
+                    raise
+                except Exception:
+                    stream_stats.error()
+                    raise
+                finish_stream(full_response)
                 
                 # 如果之前没有搜索结果但有游戏库，尝试从 AI 回复中提取推荐的游戏
                 if not search_results and all_games_list:
-                    import re
-                    # 提取书名号中的游戏名
-                    mentioned_games = re.findall(r'《([^》]+)》', full_response)
-                    if mentioned_games:
-                        # 查找匹配的游戏
-                        matched_games = []
-                        for game_name in mentioned_games[:2]:  # 最多2个
-                            game = db.query(Game).filter(Game.name == game_name).first()
-                            if game:
-                                matched_games.append(game.to_dict())
-                        
-                        if matched_games:
-                            search_results = matched_games
-                            yield f"data: {json.dumps({'type': 'games', 'data': matched_games})}\n\n"
-                            print(f"📎 Extracted {len(matched_games)} games from AI response")
+                    matched_games = games_mentioned_in(full_response)
+                    if matched_games:
+                        search_results = matched_games
+                        yield sse_event({'type': 'games', 'data': matched_games})
+                        print(f"📎 Extracted {len(matched_games)} games from AI response")
                 
                 # 5. 保存到数据库
-                # 保存用户消息
-                user_history = ChatHistory(
-                    user_id=user.id,
-                    role='user',
-                    content=user_message
-                )
-                db.add(user_history)
-                
-                # 保存 AI 响应（包含关联的游戏 ID）
-                game_ids_json = None
-                if search_results:
-                    game_ids_json = json.dumps([g['id'] for g in search_results[:2]])
-                
-                assistant_history = ChatHistory(
-                    user_id=user.id,
-                    role='assistant',
-                    content=full_response,
-                    game_ids=game_ids_json
-                )
-                db.add(assistant_history)
-                db.commit()
+                save_conversation(user_id, user_message, full_response, search_results)
                 
                 # 发送结束信号
-                yield f"data: {json.dumps({'type': 'done'})}\n\n"
+                yield sse_event({'type': 'done'})
                 
             except Exception as e:
                 print(f"Error in stream: {e}")
                 import traceback
                 traceback.print_exc()
-                yield f"data: {json.dumps({'error': str(e)})}\n\n"
-            finally:
-                db.close()
+                yield sse_event({'error': str(e)})
 
         return Response(stream_with_context(generate()), mimetype='text/event-stream')
         
@@ -618,11 +786,44 @@ def clear_history():
     """清空对话历史"""
     try:
         data = request.json
-        session_id = data.get('session_id', 'default')
+        user_key = data.get('user_key') or data.get('session_id', 'default')
         
-        if session_id in conversation_store:
-            del conversation_store[session_id]
+        # 只清除进程内的最近历史缓存；数据库中的记录由 DELETE /api/chat/history/<user_key> 删除
+        history_cache.invalidate(user_key)
         
         return jsonify({'message': 'History cleared'}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+@bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """聊天链路的运行指标（用于监控）"""
+    snapshot = game_catalog.snapshot()
+    return jsonify({
+        'llm_pool': llm_clients.stats(),
+        'fast_path': fast_router.stats(),
+        'speculation': speculative_search.stats(),
+        'prompt_tokens': prompt_builder.stats.snapshot(),
+        'summarizer': conversation_summarizer.stats(),
+        'semantic_search': semantic_search.stats(),
+        'trigram_search': trigram_search.stats(),
+        'fulltext_search': fulltext_search.stats(),
+        'streams': stream_stats.snapshot(),
+        'history_writer': history_writer.stats(),
+        'history_cache': history_cache.stats(),
+        'db_pool': pool_status(engine),
+        'cache': {
+            'tool_results': tool_result_cache.stats(),
+            'intent': intent_cache.stats(),
+        },
+        'coalescing': {
+            'search': search_flight.stats(),
+            'intent': intent_flight.stats(),
+            'intent_async': async_intent_flight.stats(),
+        },
+        'catalog': {
+            'version': snapshot.version,
+            'games': len(snapshot),
+            'age_seconds': round(time.time() - snapshot.loaded_at, 1)
+        }
+    }), 200
@@ -0,0 +1,209 @@
+"""
+异步流式聊天（ASGI）
+与 /api/chat/stream 的 Flask 实现共用提示词、工具和存储逻辑，SSE 事件格式完全一致；
+LLM 调用使用 AsyncOpenAI，等待模型输出期间不占用线程。
+数据库读写只发生在流式输出前后的短暂阶段，通过 asyncio.to_thread 在线程池中执行
+"""
+import asyncio
+import json
+import os
+import traceback
+
+from config import Config
+from routes.chat_routes_langgraph import (
+    abandon_stream, apply_intent_message, build_stream_prompt, coalesce_key, coalesced_search,
+    finish_stream, games_mentioned_in, intent_request, load_turn_context, new_state, route_fast_path,
+    save_conversation, sse_event,
+)
+from services.llm_client import llm_clients
+from services.singleflight import async_intent_flight
+from services.stream_metrics import stream_stats
+from services.speculation import speculative_search
+from services.ttl_cache import intent_cache
+
+STREAM_PATH = '/api/chat/stream'
+
+
+async def analyze_and_call_tools_async(state):
+    """analyze_and_call_tools 的异步版本：意图分析走 AsyncOpenAI，工具在线程池中执行"""
+    user_query = state["user_query"]
+
+    routed = await asyncio.to_thread(route_fast_path, state)
+    if routed is not None:
+        return routed
+
+    speculation = (speculative_search.start(user_query, coalesced_search)
+                   if Config.SPECULATIVE_SEARCH else None)
+    key = coalesce_key(user_query)
+    try:
+        hit, response = intent_cache.get(key)
+        if not hit:
+            client = llm_clients.get_async_client()
+            request_args = intent_request(user_query)
+
+            async def request_intent():
+                result = await client.chat.completions.create(**request_args)
+                intent_cache.set(key, result)
+                return result
+
+            if Config.COALESCE_REQUESTS:
+                response = await async_intent_flight.do(key, request_intent)
+            else:
+                response = await request_intent()
+    except BaseException:
+        speculative_search.discard(speculation)
+        raise
+
+    return await asyncio.to_thread(apply_intent_message, state, response.choices[0].message, speculation)
+
+
+async def stream_events(user_message, user_key):
+    """异步生成 SSE 事件，顺序与同步实现一致：status -> games -> content... -> games -> done"""
+    try:
+        context = await asyncio.to_thread(load_turn_context, user_key)
+        if context is None:
+            yield sse_event({'error': 'User not found'})
+            return
+        user_id, history, summary = context
+
+        initial_state = new_state(history, user_message, summary)
+        yield sse_event({'type': 'status', 'data': 'analyzing'})
+
+        analyzed_state = await analyze_and_call_tools_async(initial_state)
+        search_results = analyzed_state.get("search_results", [])
+        all_games_list = analyzed_state.get("all_games_list", [])
+
+        if search_results:
+            yield sse_event({'type': 'status', 'data': 'searching'})
+            yield sse_event({'type': 'games', 'data': search_results[:2]})
+
+        messages = await asyncio.to_thread(build_stream_prompt, analyzed_state, user_message, summary)
+
+        client = llm_clients.get_async_client()
+        stream = await client.chat.completions.create(
+            model=os.getenv('QWEN_MODEL', 'qwen3-max'),
+            messages=messages,
+            temperature=0.7,
+            stream=True
+        )
+
+        stream_stats.begin()
+        full_response = ""
+        try:
+            async for chunk in stream:
+                if chunk.choices[0].delta.content:
+                    content = chunk.choices[0].delta.content
+                    full_response += content
+                    yield sse_event({'type': 'content', 'data': content})
+        except (GeneratorExit, asyncio.CancelledError):
+            # 客户端断开：关闭上游连接让模型停止生成，保存已输出的部分
+            await stream.close()
+            await asyncio.to_thread(abandon_stream, user_id, user_message, full_response, search_results)
+            raise
+        except Exception:
+            stream_stats.error()
+            raise
+        finish_stream(full_response)
+
+        if not search_results and all_games_list:
+            matched_games = games_mentioned_in(full_response)
+            if matched_games:
+                search_results = matched_games
+                yield sse_event({'type': 'games', 'data': matched_games})
+                print(f"📎 Extracted {len(matched_games)} games from AI response")
+
+        await asyncio.to_thread(save_conversation, user_id, user_message, full_response, search_results)
+        yield sse_event({'type': 'done'})
+
+    except Exception as e:
+        print(f"Error in async stream: {e}")
+        traceback.print_exc()
+        yield sse_event({'error': str(e)})
+
+
+async def _read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+async def _wait_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+async def _send_json(send, status, payload):
+    body = json.dumps(payload).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+            (b'access-control-allow-origin', b'*'),
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def stream_chat_asgi(scope, receive, send):
+    """POST /api/chat/stream 的原生 ASGI 处理函数"""
+    body = await _read_body(receive)
+    if body is None:
+        return
+    try:
+        data = json.loads(body or b'{}')
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        await _send_json(send, 400, {'error': 'Invalid JSON body'})
+        return
+
+    user_message = data.get('message', '')
+    user_key = data.get('user_key')
+    if not user_message or not user_key:
+        await _send_json(send, 400, {'error': 'Missing required fields'})
+        return
+
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream; charset=utf-8'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+            (b'access-control-allow-origin', b'*'),
+        ],
+    })
+
+    async def pump():
+        events = stream_events(user_message, user_key)
+        try:
+            async for event in events:
+                await send({'type': 'http.response.body', 'body': event.encode('utf-8'), 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            await events.aclose()
+
+    # 服务器不会因客户端断开而中断 send，需要单独监听 http.disconnect，收到后取消输出任务
+    pump_task = asyncio.ensure_future(pump())
+    disconnect_task = asyncio.ensure_future(_wait_disconnect(receive))
+    try:
+        await asyncio.wait({pump_task, disconnect_task}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        disconnect_task.cancel()
+        if not pump_task.done():
+            pump_task.cancel()
+            try:
+                await pump_task
+            except asyncio.CancelledError:
+                pass
+    if not pump_task.cancelled():
+        pump_task.result()
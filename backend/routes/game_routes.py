@@ -1,6 +1,14 @@
+import json
 from flask import Blueprint, request, jsonify
-from sqlalchemy import or_
-from database.models import Game, SessionLocal
+from datetime import datetime, timedelta
+from sqlalchemy import or_, func
+from config import Config
+from database.models import Game, ChatHistory, ChatHistoryGame, SessionLocal
+from services.fulltext_search import fulltext_search
+from services.game_catalog import game_catalog
+from services.game_search import game_search
+from services.semantic_search import semantic_search
+from services.trigram_search import trigram_search
 
 bp = Blueprint('games', __name__)
 
@@ -32,25 +40,128 @@ def get_game(game_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def ilike_search(db, query):
+    return db.query(Game).filter(
+        or_(
+            Game.name.ilike(f'%{query}%'),
+            Game.name_en.ilike(f'%{query}%'),
+            Game.description.ilike(f'%{query}%')
+        )
+    ).all()
+
+def trigram_response(db, query, limit=20):
+    hits = trigram_search.search(query, limit=limit, db=db)
+    headers = {}
+    if not hits:
+        corrected = game_search.did_you_mean(query)
+        if corrected:
+            hits = trigram_search.search(corrected, limit=limit, db=db)
+            # 只有返回的是纠正后查询的结果时才提示纠正
+            if hits:
+                headers['X-Did-You-Mean'] = json.dumps(corrected)
+    return jsonify([dict(game.to_dict(), score=round(score, 4)) for game, score in hits]), 200, headers
+
+def fulltext_response(query):
+    """按 ts_rank 排序的全文搜索，offset 分页，每条结果附带描述的高亮摘要"""
+    try:
+        limit = min(int(request.args.get('limit', Config.FULLTEXT_PAGE_SIZE)), Config.FULLTEXT_PAGE_MAX)
+        offset = int(request.args.get('offset', 0))
+    except ValueError:
+        return jsonify({'error': 'limit and offset must be integers'}), 400
+    if limit <= 0 or offset < 0:
+        return jsonify({'error': 'limit must be positive and offset must not be negative'}), 400
+    if not fulltext_search.available():
+        return jsonify({'error': 'Full-text search requires PostgreSQL with migration a9d4c6e2f810 applied'}), 501
+
+    results, has_more = fulltext_search.search(query, limit=limit, offset=offset)
+    return jsonify({
+        'games': [
+            dict(game.to_dict(), score=round(rank, 4), headline=headline)
+            for game, rank, headline in results
+        ],
+        'has_more': has_more,
+        'next_offset': offset + len(results) if has_more else None
+    }), 200
+
 @bp.route('/search', methods=['GET'])
 def search_games():
-    """搜索游戏"""
+    """搜索游戏（mode=semantic 时按描述做语义搜索，mode=fulltext 时做带高亮的全文搜索）"""
     try:
         query = request.args.get('q', '')
+        mode = request.args.get('mode', 'keyword')
         if not query:
             return jsonify({'error': 'Query parameter required'}), 400
+        if mode not in ('keyword', 'semantic', 'fulltext'):
+            return jsonify({'error': 'mode must be keyword, semantic or fulltext'}), 400
+        
+        if mode == 'semantic':
+            hits = semantic_search.search(query, limit=20)
+            return jsonify([record.to_dict() for record, _score in hits]), 200
+        
+        if mode == 'fulltext':
+            return fulltext_response(query)
         
         db = SessionLocal()
         try:
-            games = db.query(Game).filter(
-                or_(
-                    Game.name.ilike(f'%{query}%'),
-                    Game.name_en.ilike(f'%{query}%'),
-                    Game.description.ilike(f'%{query}%')
-                )
-            ).all()
+            # 目录较大时在数据库中用 pg_trgm 索引做子串 + 相似度匹配，按相关性排序并限制条数
+            if trigram_search.enabled(len(game_catalog.snapshot())):
+                return trigram_response(db, query)
             
-            return jsonify([game.to_dict() for game in games]), 200
+            games = ilike_search(db, query)
+            if games:
+                return jsonify([game.to_dict() for game in games]), 200
+            
+            # 英文名拼错时纠正单词后重试，纠正后的查询有结果时通过响应头 X-Did-You-Mean 返回
+            corrected = game_search.did_you_mean(query)
+            if corrected:
+                games = ilike_search(db, corrected)
+                if games:
+                    headers = {'X-Did-You-Mean': json.dumps(corrected)}
+                    return jsonify([game.to_dict() for game in games]), 200, headers
+            
+            # 仍然没有子串匹配时，回退到原查询的 n-gram 模糊匹配（容忍错别字），不提示纠正
+            fuzzy_games = game_search.fuzzy_search(query, limit=20)
+            return jsonify([game.to_dict() for game in fuzzy_games]), 200
+        finally:
+            db.close()
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/most-recommended', methods=['GET'])
+def most_recommended_games():
+    """被 AI 推荐（出现在对话卡片中）次数最多的游戏；days 限定最近若干天"""
+    try:
+        try:
+            limit = min(int(request.args.get('limit', 10)), 100)
+            days = request.args.get('days')
+            days = int(days) if days else None
+        except ValueError:
+            return jsonify({'error': 'limit and days must be integers'}), 400
+        if limit <= 0 or (days is not None and days <= 0):
+            return jsonify({'error': 'limit and days must be positive'}), 400
+        
+        db = SessionLocal()
+        try:
+            # 先在 chat_history_games 上按 game_id 聚合（走 game_id 索引），再取游戏详情
+            counts = db.query(
+                ChatHistoryGame.game_id,
+                func.count().label('times')
+            )
+            if days is not None:
+                counts = counts.join(ChatHistory, ChatHistory.id == ChatHistoryGame.history_id)\
+                    .filter(ChatHistory.created_at >= datetime.utcnow() - timedelta(days=days))
+            counts = counts.group_by(ChatHistoryGame.game_id)\
+                .order_by(func.count().desc(), ChatHistoryGame.game_id)\
+                .limit(limit)\
+                .subquery()
+            
+            rows = db.query(Game, counts.c.times)\
+                .join(counts, counts.c.game_id == Game.id)\
+                .order_by(counts.c.times.desc(), Game.id)\
+                .all()
+            return jsonify([
+                dict(game.to_dict(), recommended_count=times) for game, times in rows
+            ]), 200
         finally:
             db.close()
     except Exception as e:
@@ -78,6 +189,7 @@ def create_game():
             db.add(game)
             db.commit()
             db.refresh(game)
+            game_catalog.upsert(game)
             
             return jsonify(game.to_dict()), 201
         finally:
@@ -103,6 +215,7 @@ def update_game(game_id):
             
             db.commit()
             db.refresh(game)
+            game_catalog.upsert(game)
             
             return jsonify(game.to_dict()), 200
         finally:
@@ -122,6 +235,7 @@ def delete_game(game_id):
             
             db.delete(game)
             db.commit()
+            game_catalog.remove(game_id)
             
             return jsonify({'message': 'Game deleted'}), 200
         finally:
@@ -1,6 +1,8 @@
 from flask import Blueprint, request, jsonify
 from services.storage_service import StorageService
 from database.models import Game, SessionLocal
+from services.game_catalog import game_catalog
+from services.category_matcher import categorize_game
 import os
 
 bp = Blueprint('upload', __name__)
@@ -14,10 +16,14 @@ def save_upload():
         
         db = SessionLocal()
         try:
+            name = data.get('filename', 'Unknown')
             game = Game(
-                name=data.get('filename', 'Unknown'),
+                name=name,
                 name_en=data.get('name_en'),
                 description=data.get('description'),
+                category=data.get('category') or categorize_game(
+                    f"{name} {data.get('name_en') or ''}", data.get('description')
+                ),
                 game_file_url=data.get('url'),
                 file_size=str(data.get('size', 0))  # 转换为字符串
             )
@@ -25,6 +31,7 @@ def save_upload():
             db.add(game)
             db.commit()
             db.refresh(game)
+            game_catalog.upsert(game)
             
             return jsonify({
                 'message': 'Upload saved successfully',
@@ -66,6 +73,10 @@ def upload_file():
         upload_id = request.form.get('upload_id', 'default')
         cover_image_file = request.files.get('cover_image')  # 封面图片
         
+        # 未指定类型时根据名称和描述自动分类
+        if not category:
+            category = categorize_game(f"{game_name} {name_en or ''}", description)
+        
         # 检查是否已存在相同名称和存储类型的游戏
         db = SessionLocal()
         try:
@@ -133,6 +144,7 @@ def upload_file():
             db.add(game)
             db.commit()
             db.refresh(game)
+            game_catalog.upsert(game)
             
             # 最终完成状态
             upload_progress_store[upload_id] = {
@@ -183,6 +195,10 @@ def upload_netdisk():
         if not netdisk_type:
             return jsonify({'error': '网盘类型不能为空'}), 400
         
+        # 未指定类型时根据名称和描述自动分类
+        if not category:
+            category = categorize_game(f"{game_name} {name_en or ''}", description)
+        
         # 检查是否已存在相同名称和存储类型的游戏
         db = SessionLocal()
         try:
@@ -226,6 +242,7 @@ def upload_netdisk():
             db.add(game)
             db.commit()
             db.refresh(game)
+            game_catalog.upsert(game)
             
             # 最终完成状态
             upload_progress_store[upload_id] = {
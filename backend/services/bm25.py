@@ -0,0 +1,106 @@
+"""
+BM25 词法相关性索引
+中文按二元组、英文按单词切分，多字段加权（BM25F 简化版），
+支持增量增删，查询只访问包含查询词的文档
+"""
+import math
+import threading
+
+
+def _is_cjk(ch):
+    return '㐀' <= ch <= '鿿' or '豈' <= ch <= '﫿'
+
+
+def tokenize(text):
+    """
+    切词：连续汉字取二元组（单个汉字保留本身），字母数字串按单词小写，其余字符视为分隔
+    返回词列表（保留重复，用于词频）
+    """
+    tokens = []
+    run = []
+    word = []
+    for ch in (text or '').lower() + ' ':
+        if _is_cjk(ch):
+            run.append(ch)
+        elif run:
+            tokens.extend(run if len(run) == 1 else
+                          (run[i] + run[i + 1] for i in range(len(run) - 1)))
+            run = []
+        if ch.isascii() and ch.isalnum():
+            word.append(ch)
+        elif word:
+            tokens.append(''.join(word))
+            word = []
+    return tokens
+
+
+class BM25Index:
+    """
+    多字段 BM25 索引
+
+    每个字段的词频乘以字段权重后合并为文档的加权词频，文档长度同样按权重累加，
+    之后按标准 BM25 计分（k1、b 为常用默认值）
+    """
+
+    def __init__(self, field_weights, k1=1.2, b=0.75):
+        self.field_weights = dict(field_weights)
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._postings = {}
+        self._doc_terms = {}
+        self._doc_len = {}
+        self._total_len = 0.0
+        self.version = None
+
+    def __len__(self):
+        return len(self._doc_len)
+
+    def add(self, item_id, fields):
+        """索引一个条目，fields 为 {字段名: 文本}；已存在则先移除"""
+        with self._lock:
+            self.remove(item_id)
+            terms = {}
+            length = 0.0
+            for field, value in fields.items():
+                weight = self.field_weights.get(field, 1.0)
+                for token in tokenize(value):
+                    terms[token] = terms.get(token, 0.0) + weight
+                    length += weight
+            self._doc_terms[item_id] = terms
+            self._doc_len[item_id] = length
+            self._total_len += length
+            for token, tf in terms.items():
+                self._postings.setdefault(token, {})[item_id] = tf
+
+    def remove(self, item_id):
+        with self._lock:
+            terms = self._doc_terms.pop(item_id, None)
+            if terms is None:
+                return
+            self._total_len -= self._doc_len.pop(item_id)
+            for token in terms:
+                posting = self._postings.get(token)
+                if posting is not None:
+                    posting.pop(item_id, None)
+                    if not posting:
+                        del self._postings[token]
+
+    def search(self, query, limit=10):
+        """返回 [(item_id, score)]，按得分降序；查询词均未出现时返回空列表"""
+        with self._lock:
+            n = len(self._doc_len)
+            if not n:
+                return []
+            avg_len = self._total_len / n or 1.0
+            scores = {}
+            for token in set(tokenize(query)):
+                posting = self._postings.get(token)
+                if not posting:
+                    continue
+                idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+                for item_id, tf in posting.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_len[item_id] / avg_len)
+                    scores[item_id] = scores.get(item_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        ranked = sorted(scores.items(), key=lambda x: -x[1])
+        return ranked[:limit]
@@ -0,0 +1,147 @@
+"""
+游戏类型关键词匹配
+基于 Aho-Corasick 自动机，一次扫描找出文本中所有类型关键词，
+供聊天意图识别、上传时自动分类和批量重新分类脚本共用
+"""
+import threading
+from collections import deque
+
+from services.category_keywords import CATEGORY_KEYWORDS, GAME_CATEGORIES
+
+
+class AhoCorasick:
+    """多模式串匹配自动机（构建后只读）"""
+
+    def __init__(self, patterns):
+        """patterns: [(pattern, payload)]，pattern 需已统一大小写"""
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        self._patterns = []
+        for pattern, payload in patterns:
+            if pattern:
+                self._insert(pattern, payload)
+        self._build_failure_links()
+
+    def _insert(self, pattern, payload):
+        state = 0
+        for ch in pattern:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = nxt
+        self._output[state].append(len(self._patterns))
+        self._patterns.append((pattern, payload))
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                # 合并后缀状态的输出，匹配时无需再沿失败链回溯
+                self._output[nxt] = self._output[nxt] + self._output[self._fail[nxt]]
+
+    def __len__(self):
+        return len(self._patterns)
+
+    def iter_matches(self, text):
+        """产出 (start, end, pattern, payload)，end 为开区间"""
+        state = 0
+        goto, fail, output, patterns = self._goto, self._fail, self._output, self._patterns
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for pid in output[state]:
+                pattern, payload = patterns[pid]
+                yield i - len(pattern) + 1, i + 1, pattern, payload
+
+
+class CategoryMatcher:
+    """
+    类型分类器
+
+    classify() 返回按命中情况排序的多类型结果，detect() 返回排名第一的类型。
+    排序规则：命中的不同关键词数 > 命中总次数 > 关键词表中的先后顺序
+    （与原先"按表顺序返回第一个命中类型"的行为在单类型命中时一致）。
+    关键词表变化后调用 rebuild() 即可原子替换自动机。
+    """
+
+    def __init__(self, table):
+        self._lock = threading.Lock()
+        self._table = table
+        self._order = {}
+        self._automaton = None
+        self.rebuild()
+
+    def rebuild(self, table=None):
+        """重新编译自动机；不传 table 时使用当前表（可能已被原地修改）"""
+        with self._lock:
+            if table is not None:
+                self._table = table
+            patterns = []
+            order = {}
+            for category, keywords in self._table.items():
+                order.setdefault(category, len(order))
+                for keyword in keywords:
+                    patterns.append((keyword.lower(), category))
+            self._order = order
+            self._automaton = AhoCorasick(patterns)
+
+    def set_keywords(self, category, keywords):
+        """替换某个类型的关键词并立即生效"""
+        with self._lock:
+            table = dict(self._table)
+            table[category] = list(keywords)
+        self.rebuild(table)
+
+    def classify(self, text):
+        """
+        返回 [{'category', 'keywords', 'hits', 'positions'}]，按排名排序
+        positions 为 (start, end) 列表，基于小写化后的文本
+        """
+        automaton, order = self._automaton, self._order
+        results = {}
+        for start, end, keyword, category in automaton.iter_matches((text or '').lower()):
+            entry = results.get(category)
+            if entry is None:
+                entry = results[category] = {
+                    'category': category,
+                    'keywords': [],
+                    'hits': 0,
+                    'positions': []
+                }
+            if keyword not in entry['keywords']:
+                entry['keywords'].append(keyword)
+            entry['hits'] += 1
+            entry['positions'].append((start, end))
+        return sorted(
+            results.values(),
+            key=lambda e: (-len(e['keywords']), -e['hits'], order.get(e['category'], 0))
+        )
+
+    def detect(self, text):
+        """返回最匹配的类型，没有命中时返回 None"""
+        matches = self.classify(text)
+        return matches[0]['category'] if matches else None
+
+
+# 聊天意图识别：用户说"恐怖游戏"、"rpg" 等类型词
+intent_matcher = CategoryMatcher(CATEGORY_KEYWORDS)
+
+# 根据游戏名称/描述自动分类：上传时和批量重新分类脚本使用
+title_matcher = CategoryMatcher(GAME_CATEGORIES)
+
+
+def categorize_game(name, description=''):
+    """根据游戏名称和描述判断类型"""
+    return title_matcher.detect(f"{name or ''} {description or ''}")
@@ -0,0 +1,298 @@
+"""
+本地文本向量与向量索引
+- HashingEmbedder：确定性的哈希 n-gram 特征向量，无需联网或模型文件；
+  类型词/主题词（中英文同义词）额外映射到共享的概念特征，
+  "cozy farming game" 这类说法也能命中中文简介里写着"温馨""种田"的游戏
+- VectorIndex：NumPy 矩阵存储，批量余弦 top-K，支持增量增删，
+  可保存为 .npy 文件并以内存映射方式加载，启动时无需重新计算；
+  每次保存写入独立的版本子目录，再原子替换 CURRENT 指针，多个进程可共用同一目录
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from functools import lru_cache
+
+import numpy as np
+
+from services.category_keywords import CATEGORY_KEYWORDS, THEME_KEYWORDS
+from services.category_matcher import CategoryMatcher
+
+# 各类特征的权重
+WEIGHT_CJK_CHAR = 0.5
+WEIGHT_CJK_BIGRAM = 1.0
+WEIGHT_WORD = 1.0
+WEIGHT_TRIGRAM = 0.5
+WEIGHT_CONCEPT = 2.5
+
+# 索引目录中指向当前版本子目录的指针文件
+INDEX_POINTER = 'CURRENT'
+INDEX_VERSION_PREFIX = 'index-'
+
+# 不是当前版本、且超过该时长（秒）未修改的版本子目录在保存后清理；
+# 留出时间给其他进程完成正在进行的保存或加载
+STALE_VERSION_SECONDS = 300
+
+
+@lru_cache(maxsize=65536)
+def _feature_slot(feature, dim):
+    """特征 -> (维度下标, 符号)；使用 blake2b 保证跨进程结果一致"""
+    digest = hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest()
+    value = int.from_bytes(digest, 'little')
+    return value % dim, 1.0 if (value >> 63) & 1 else -1.0
+
+
+def content_hash(text):
+    """文本内容指纹（uint64），用于判断持久化的向量是否仍然有效"""
+    digest = hashlib.blake2b((text or '').encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+class HashingEmbedder:
+    """
+    哈希 n-gram 向量
+
+    特征：汉字单字与二元组、英文单词及词内三元组、命中的类型/主题概念；
+    词频取 1 + log(tf)，按符号哈希累加到 dim 维后做 L2 归一化
+    """
+
+    def __init__(self, dim=512, concept_tables=(CATEGORY_KEYWORDS, THEME_KEYWORDS)):
+        self.dim = dim
+        concepts = {}
+        for table in concept_tables:
+            for concept, keywords in table.items():
+                concepts.setdefault(concept, []).extend(keywords)
+        self._concepts = CategoryMatcher(concepts)
+        self.name = f"hashing-ngram-v1-{dim}"
+
+    def features(self, text):
+        text = (text or '').lower()
+        counts = {}
+
+        def bump(feature, weight):
+            counts[feature] = counts.get(feature, 0.0) + weight
+
+        run = []
+        word = []
+        for ch in text + ' ':
+            if not ch.isascii() and ch.isalnum():
+                run.append(ch)
+            elif run:
+                for i, c in enumerate(run):
+                    bump('c:' + c, WEIGHT_CJK_CHAR)
+                    if i + 1 < len(run):
+                        bump('b:' + c + run[i + 1], WEIGHT_CJK_BIGRAM)
+                run = []
+            if ch.isascii() and ch.isalnum():
+                word.append(ch)
+            elif word:
+                token = ''.join(word)
+                bump('w:' + token, WEIGHT_WORD)
+                padded = f'<{token}>'
+                for i in range(len(padded) - 2):
+                    bump('t:' + padded[i:i + 3], WEIGHT_TRIGRAM)
+                word = []
+
+        for entry in self._concepts.classify(text):
+            bump('k:' + entry['category'], WEIGHT_CONCEPT * len(entry['keywords']))
+        return counts
+
+    def embed(self, texts):
+        """批量计算向量，返回 (len(texts), dim) 的 float32 矩阵（行已归一化）"""
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            vector = matrix[row]
+            for feature, weight in self.features(text).items():
+                slot, sign = _feature_slot(feature, self.dim)
+                vector[slot] += sign * (1.0 + np.log(weight) if weight > 1.0 else weight)
+            norm = np.linalg.norm(vector)
+            if norm > 0:
+                vector /= norm
+        return matrix
+
+    def embed_one(self, text):
+        return self.embed([text])[0]
+
+
+class VectorIndex:
+    """
+    向量矩阵 + id 映射
+
+    行按插入顺序存放，删除时用最后一行填补空位；矩阵按容量倍增，
+    从内存映射文件加载后第一次修改时才复制到内存
+    """
+
+    FILES = ('vectors.npy', 'ids.npy', 'hashes.npy')
+
+    def __init__(self, dim):
+        self.dim = dim
+        self._lock = threading.RLock()
+        self._matrix = np.zeros((0, dim), dtype=np.float32)
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._hashes = np.zeros(0, dtype=np.uint64)
+        self._size = 0
+        self._rows = {}
+        self.mapped = False
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, item_id):
+        return item_id in self._rows
+
+    def ids(self):
+        return list(self._rows)
+
+    def content_hash_of(self, item_id):
+        row = self._rows.get(item_id)
+        return None if row is None else int(self._hashes[row])
+
+    def _reserve(self, extra):
+        """保证还能写入 extra 行；内存映射的只读矩阵在这里复制到内存"""
+        needed = self._size + extra
+        if not self.mapped and needed <= len(self._matrix):
+            return
+        capacity = max(needed, len(self._matrix) * 2 if not self.mapped else needed, 16)
+        matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+        ids = np.zeros(capacity, dtype=np.int64)
+        hashes = np.zeros(capacity, dtype=np.uint64)
+        matrix[:self._size] = self._matrix[:self._size]
+        ids[:self._size] = self._ids[:self._size]
+        hashes[:self._size] = self._hashes[:self._size]
+        self._matrix, self._ids, self._hashes = matrix, ids, hashes
+        self.mapped = False
+
+    def add(self, ids, vectors, hashes):
+        """批量写入（已存在的 id 原位覆盖）"""
+        with self._lock:
+            self._reserve(len(ids))
+            for item_id, vector, digest in zip(ids, vectors, hashes):
+                row = self._rows.get(item_id)
+                if row is None:
+                    row = self._size
+                    self._size += 1
+                    self._rows[item_id] = row
+                    self._ids[row] = item_id
+                self._matrix[row] = vector
+                self._hashes[row] = digest
+
+    def remove(self, item_id):
+        with self._lock:
+            row = self._rows.pop(item_id, None)
+            if row is None:
+                return False
+            self._reserve(0)
+            last = self._size - 1
+            if row != last:
+                moved = int(self._ids[last])
+                self._matrix[row] = self._matrix[last]
+                self._ids[row] = moved
+                self._hashes[row] = self._hashes[last]
+                self._rows[moved] = row
+            self._size = last
+            return True
+
+    def search_batch(self, queries, k=10, min_score=0.0):
+        """
+        queries 为 (m, dim) 的归一化矩阵；一次矩阵乘法算出全部余弦相似度，
+        每个查询返回 [(item_id, score)]，按相似度降序
+        """
+        with self._lock:
+            size = self._size
+            if not size:
+                return [[] for _ in range(len(queries))]
+            scores = queries @ self._matrix[:size].T
+            ids = self._ids[:size].copy()
+        k = min(k, size)
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for row_scores, candidates in zip(scores, top):
+            ordered = candidates[np.argsort(-row_scores[candidates])]
+            results.append([(int(ids[i]), float(row_scores[i])) for i in ordered
+                            if row_scores[i] > min_score])
+        return results
+
+    def search(self, query, k=10, min_score=0.0):
+        return self.search_batch(query[np.newaxis, :], k, min_score)[0]
+
+    def save(self, directory, meta):
+        """
+        写入一个新的版本子目录（名称唯一），完成后原子替换 CURRENT 指向它；
+        并发保存互不覆盖，读取方总是看到某一次完整的保存
+        """
+        os.makedirs(directory, exist_ok=True)
+        version = tempfile.mkdtemp(prefix=INDEX_VERSION_PREFIX, dir=directory)
+        try:
+            with self._lock:
+                arrays = (self._matrix[:self._size], self._ids[:self._size], self._hashes[:self._size])
+                for filename, array in zip(self.FILES, arrays):
+                    np.save(os.path.join(version, filename), np.ascontiguousarray(array))
+                meta = dict(meta, dim=self.dim, count=self._size)
+            with open(os.path.join(version, 'meta.json'), 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+            fd, pointer = tempfile.mkstemp(prefix=INDEX_POINTER + '-', suffix='.tmp', dir=directory)
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    f.write(os.path.basename(version))
+                os.replace(pointer, os.path.join(directory, INDEX_POINTER))
+            except BaseException:
+                if os.path.exists(pointer):
+                    os.remove(pointer)
+                raise
+        except BaseException:
+            shutil.rmtree(version, ignore_errors=True)
+            raise
+        self._remove_stale_versions(directory, keep=os.path.basename(version))
+
+    @staticmethod
+    def _remove_stale_versions(directory, keep):
+        """清理已不是当前版本的旧版本子目录（当前版本和刚写入的版本除外）"""
+        try:
+            with open(os.path.join(directory, INDEX_POINTER), encoding='utf-8') as f:
+                current = f.read().strip()
+        except OSError:
+            return
+        cutoff = time.time() - STALE_VERSION_SECONDS
+        for name in os.listdir(directory):
+            if not name.startswith(INDEX_VERSION_PREFIX) or name in (current, keep):
+                continue
+            path = os.path.join(directory, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    shutil.rmtree(path)
+            except OSError:
+                continue
+
+    @classmethod
+    def load(cls, directory):
+        """以内存映射方式加载 CURRENT 指向的版本，返回 (VectorIndex, meta)；文件不存在或不完整时返回 (None, None)"""
+        # 读到指针后该版本可能刚好被其他进程的保存清理掉，此时重新读取指针
+        for attempt in range(3):
+            try:
+                with open(os.path.join(directory, INDEX_POINTER), encoding='utf-8') as f:
+                    version = os.path.join(directory, f.read().strip())
+                with open(os.path.join(version, 'meta.json'), encoding='utf-8') as f:
+                    meta = json.load(f)
+                matrix, ids, hashes = (np.load(os.path.join(version, name), mmap_mode='r')
+                                       for name in cls.FILES)
+                break
+            except FileNotFoundError:
+                continue
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Failed to load vector index from {directory}: {type(e).__name__}: {e}")
+                return None, None
+        else:
+            return None, None
+        directory = version
+        if matrix.shape != (meta['count'], meta['dim']) or not len(ids) == len(hashes) == meta['count']:
+            print(f"⚠️ Vector index in {directory} is inconsistent, rebuilding")
+            return None, None
+        index = cls(meta['dim'])
+        index._matrix, index._ids, index._hashes = matrix, ids, hashes
+        index._size = meta['count']
+        index._rows = {int(item_id): row for row, item_id in enumerate(ids)}
+        index.mapped = True
+        return index, meta
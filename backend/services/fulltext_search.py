@@ -0,0 +1,116 @@
+"""
+Postgres 全文搜索
+games.search_vector 是由 name / name_en / category / tags / description 生成的 tsvector 列
+（见 alembic 迁移 a9d4c6e2f810），汉字按重叠二字片段切分（zh_bigram 配置 + zh_ngram_text），
+查询用同样的切分构造 tsquery，走 GIN 索引，按 ts_rank 排序分页，并用 ts_headline 生成高亮摘要
+"""
+import re
+import threading
+
+from sqlalchemy import func, literal, literal_column, select, text
+
+from config import Config
+from database.models import Game, SessionLocal, engine
+
+TS_CONFIG = literal_column("'zh_bigram'::regconfig")
+
+HEADLINE_OPTIONS = 'StartSel=<mark>, StopSel=</mark>, MaxWords=30, MinWords=10, MaxFragments=2'
+
+# 高亮时汉字逐字用空格分开（ts_headline 才能按字定位），输出后去掉这些空格
+_CJK = '\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\u3000-\u303f\uff00-\uffef'
+_CJK_GAP = re.compile(rf'(?<=[{_CJK}])(</?mark>)?\s+(</?mark>)?(?=[{_CJK}])')
+
+
+def restore_cjk_spacing(snippet):
+    """去掉汉字（含全角标点）之间插入的空格，并合并相邻的高亮片段"""
+    if not snippet:
+        return snippet
+    snippet = _CJK_GAP.sub(lambda m: (m.group(1) or '') + (m.group(2) or ''), snippet)
+    return snippet.replace('</mark><mark>', '').strip()
+
+
+def fulltext_query(db, query, limit, offset):
+    """返回 [(Game, rank, headline)]；先按 rank 取出一页 id，只对这一页生成摘要"""
+    q = literal(query)
+    tsquery = func.plainto_tsquery(TS_CONFIG, func.zh_ngram_text(q, 2))
+    rank = func.ts_rank(Game.search_vector, tsquery).label('rank')
+    page = select(Game.id, rank)\
+        .where(Game.search_vector.op('@@')(tsquery))\
+        .order_by(rank.desc(), Game.id)\
+        .limit(limit)\
+        .offset(offset)\
+        .subquery()
+
+    # 摘要按单字切分文本，短语查询保证汉字按原顺序连续命中
+    headline = func.ts_headline(
+        TS_CONFIG,
+        func.zh_ngram_text(func.coalesce(Game.description, ''), 1),
+        func.phraseto_tsquery(TS_CONFIG, func.zh_ngram_text(q, 1)),
+        HEADLINE_OPTIONS
+    ).label('headline')
+    return db.query(Game, page.c.rank, headline)\
+        .join(page, page.c.id == Game.id)\
+        .order_by(page.c.rank.desc(), Game.id)\
+        .all()
+
+
+class FullTextSearch:
+    """search_vector 列是否存在只检测一次（未执行迁移或不是 Postgres 时不可用）"""
+
+    def __init__(self, engine=engine, session_factory=SessionLocal):
+        self._engine = engine
+        self._session_factory = session_factory
+        self._available = None
+        self._lock = threading.Lock()
+        self._stats = {'searches': 0, 'errors': 0}
+
+    def available(self):
+        if self._available is None:
+            with self._lock:
+                if self._available is None:
+                    self._available = self._detect()
+        return self._available
+
+    def _detect(self):
+        if self._engine.dialect.name != 'postgresql':
+            return False
+        try:
+            with self._engine.connect() as conn:
+                column = conn.execute(text(
+                    "SELECT 1 FROM information_schema.columns "
+                    "WHERE table_name = 'games' AND column_name = 'search_vector'"
+                )).first()
+            if not column:
+                print("⚠️ games.search_vector missing, full-text search disabled (run alembic upgrade head)")
+            return bool(column)
+        except Exception as e:
+            print(f"⚠️ Full-text search detection failed: {type(e).__name__}: {e}")
+            return False
+
+    def search(self, query, limit=None, offset=0, db=None):
+        """
+        返回 (结果, 是否还有下一页)；结果为 [(Game, rank, headline)]
+        多取一条判断是否还有下一页
+        """
+        limit = limit or Config.FULLTEXT_PAGE_SIZE
+        own_session = db is None
+        db = db or self._session_factory()
+        try:
+            rows = fulltext_query(db, query, limit + 1, offset)
+            self._stats['searches'] += 1
+        except Exception:
+            self._stats['errors'] += 1
+            raise
+        finally:
+            if own_session:
+                db.close()
+        results = [(game, rank, restore_cjk_spacing(headline)) for game, rank, headline in rows[:limit]]
+        return results, len(rows) > limit
+
+    def stats(self):
+        data = dict(self._stats)
+        data['available'] = self._available
+        return data
+
+
+fulltext_search = FullTextSearch()
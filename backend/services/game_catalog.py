@@ -0,0 +1,293 @@
+"""
+游戏目录快照
+进程内缓存一份不可变的游戏列表，聊天搜索/列表/提示词构建直接读快照，
+Game 表发生增删改时原子替换快照并递增版本号
+"""
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from types import MappingProxyType
+
+from config import Config
+from database.models import Game, SessionLocal
+
+
+@dataclass(frozen=True, slots=True)
+class GameRecord:
+    """Game 行的不可变精简副本"""
+    id: int
+    name: str
+    name_en: str
+    description: str
+    category: str
+    tags: str
+    game_file_url: str
+    storage_type: str
+    netdisk_type: str
+    cover_image_url: str
+    video_url: str
+    screenshots: str
+    file_size: str
+    version: str
+    release_date: str
+    developer: str
+    rating: int
+    created_at: str
+    updated_at: str
+    sort_key: float
+
+    @classmethod
+    def from_model(cls, game):
+        created = game.created_at
+        return cls(
+            id=game.id,
+            name=game.name,
+            name_en=game.name_en,
+            description=game.description,
+            category=game.category,
+            tags=game.tags,
+            game_file_url=game.game_file_url,
+            storage_type=game.storage_type,
+            netdisk_type=game.netdisk_type,
+            cover_image_url=game.cover_image_url,
+            video_url=game.video_url,
+            screenshots=game.screenshots,
+            file_size=game.file_size,
+            version=game.version,
+            release_date=game.release_date,
+            developer=game.developer,
+            rating=game.rating,
+            created_at=created.isoformat() if created else None,
+            updated_at=game.updated_at.isoformat() if game.updated_at else None,
+            sort_key=created.timestamp() if isinstance(created, datetime) else 0.0,
+        )
+
+    def to_dict(self):
+        """与 Game.to_dict() 相同的结构"""
+        return {
+            'id': self.id,
+            'name': self.name,
+            'name_en': self.name_en,
+            'description': self.description,
+            'category': self.category,
+            'tags': self.tags,
+            'game_file_url': self.game_file_url,
+            'storage_type': self.storage_type,
+            'netdisk_type': self.netdisk_type,
+            'cover_image_url': self.cover_image_url,
+            'video_url': self.video_url,
+            'screenshots': self.screenshots,
+            'file_size': self.file_size,
+            'version': self.version,
+            'release_date': self.release_date,
+            'developer': self.developer,
+            'rating': self.rating,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
+        }
+
+
+class CatalogSnapshot:
+    """某一版本的游戏目录（只读）"""
+
+    __slots__ = ('version', 'games', 'by_id', 'by_name', 'by_category', 'loaded_at')
+
+    def __init__(self, version, records):
+        # 与原先 order_by(Game.created_at.desc()) 保持一致
+        self.games = tuple(sorted(records, key=lambda r: r.sort_key, reverse=True))
+        self.version = version
+        self.by_id = MappingProxyType({r.id: r for r in self.games})
+        by_name = {}
+        by_category = {}
+        for r in self.games:
+            by_name.setdefault(r.name, r)
+            if r.category:
+                by_category.setdefault(r.category, []).append(r)
+        self.by_name = MappingProxyType(by_name)
+        self.by_category = MappingProxyType({k: tuple(v) for k, v in by_category.items()})
+        self.loaded_at = time.time()
+
+    def __len__(self):
+        return len(self.games)
+
+
+def change_action(applied_version, snapshot, event):
+    """
+    监听器收到目录事件时该怎么处理（通知在目录锁外发出，可能乱序到达，也可能与查询触发的重建并发）：
+    'skip' 表示事件不比已应用的版本新；'apply' 表示正好是下一个版本，可增量应用；
+    'rebuild' 表示尚未建立、中间缺了版本或是 reload，需要按事件携带的快照重建
+    """
+    if applied_version is not None and snapshot.version <= applied_version:
+        return 'skip'
+    if applied_version is None or event == 'reload' or snapshot.version != applied_version + 1:
+        return 'rebuild'
+    return 'apply'
+
+
+class GameCatalog:
+    """
+    进程级游戏目录
+
+    - snapshot() 返回当前快照，首次访问时从数据库加载
+    - upsert()/remove() 在写操作提交后调用，生成新快照并原子替换
+    - subscribe() 注册监听器，目录变化时回调 listener(event, snapshot, old_record, new_record)，
+      event 为 'reload' / 'upsert' / 'remove'，snapshot 为这次变化产生的快照（带版本号）；
+      回调在目录锁外执行，慢的监听器不会阻塞其他写入和读取，但事件可能乱序到达（见 change_action）
+    - 新快照在锁外构建，锁内只比较并替换；期间快照已被其他写入替换时重新构建
+    - CATALOG_REFRESH_SECONDS > 0 时快照过期后在后台线程重新加载（兼顾其他进程的写入），
+      期间请求继续使用旧快照；数据库中的目录没有变化时不生成新版本，各索引不必重建
+    """
+
+    def __init__(self, session_factory=SessionLocal, refresh_seconds=None):
+        self._session_factory = session_factory
+        self._refresh_seconds = (Config.CATALOG_REFRESH_SECONDS
+                                 if refresh_seconds is None else refresh_seconds)
+        self._lock = threading.RLock()
+        self._snapshot = None
+        self._version = 0
+        self._listeners = []
+        self._checked_at = 0.0
+        self._refresh_thread = None
+
+    @property
+    def version(self):
+        """当前目录版本号（单调递增）"""
+        return self.snapshot().version
+
+    def subscribe(self, listener):
+        with self._lock:
+            self._listeners.append(listener)
+
+    def _notify(self, event, snapshot, old, new):
+        """在目录锁外调用"""
+        with self._lock:
+            listeners = list(self._listeners)
+        for listener in listeners:
+            try:
+                listener(event, snapshot, old, new)
+            except Exception as e:
+                print(f"⚠️ Catalog listener failed: {type(e).__name__}: {e}")
+
+    def _is_stale(self):
+        return (self._refresh_seconds > 0
+                and time.time() - self._checked_at > self._refresh_seconds)
+
+    def snapshot(self):
+        """获取当前目录快照（只有首次加载在调用线程中进行）"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            loaded = False
+            with self._lock:
+                snapshot = self._snapshot
+                if snapshot is None:
+                    snapshot, loaded = self._load(only_if_changed=False)
+            if loaded:
+                self._notify('reload', snapshot, None, None)
+            return snapshot
+        if self._is_stale():
+            self._refresh_in_background()
+        return snapshot
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return
+            self._refresh_thread = threading.Thread(target=self._refresh, name='catalog-refresh',
+                                                    daemon=True)
+            self._refresh_thread.start()
+
+    def _refresh(self):
+        try:
+            self.reload(only_if_changed=True)
+        except Exception as e:
+            # 下一个刷新周期再试
+            with self._lock:
+                self._checked_at = time.time()
+            print(f"⚠️ Catalog refresh failed: {type(e).__name__}: {e}")
+
+    def reload(self, only_if_changed=False):
+        """
+        从数据库全量加载目录
+        only_if_changed 时（后台定期刷新）目录与当前快照相同则保留当前快照；
+        加载期间本进程有写入（upsert/remove）时放弃这次结果，本进程的写入更新
+        """
+        snapshot, loaded = self._load(only_if_changed)
+        if loaded:
+            self._notify('reload', snapshot, None, None)
+        return snapshot
+
+    def _load(self, only_if_changed):
+        """返回 (快照, 是否生成了新快照)；不发通知"""
+        version_before = self._version
+        db = self._session_factory()
+        try:
+            records = [GameRecord.from_model(g) for g in db.query(Game).all()]
+        finally:
+            db.close()
+        self._checked_at = time.time()
+
+        def build(current):
+            if only_if_changed and current is not None and (
+                    current.version != version_before or
+                    sorted(current.games, key=lambda r: r.id) == sorted(records, key=lambda r: r.id)):
+                return None
+            return records
+
+        snapshot = self._swap(build)
+        if snapshot is None:
+            return self._snapshot, False
+        print(f"📚 Game catalog loaded: {len(records)} games (version {snapshot.version})")
+        return snapshot, True
+
+    def _swap(self, build_records):
+        """
+        build_records(当前快照) 返回新快照的记录（返回 None 表示不需要变化）；
+        在锁外构建快照，锁内确认当前快照未变后替换（版本号与快照一一对应，新快照的版本号就是当前版本 + 1）
+        """
+        while True:
+            current = self._snapshot
+            version = self._version
+            records = build_records(current)
+            if records is None:
+                return None
+            snapshot = CatalogSnapshot(version + 1, records)
+            with self._lock:
+                if self._snapshot is current and self._version == version:
+                    self._version = snapshot.version
+                    self._snapshot = snapshot
+                    return snapshot
+
+    def upsert(self, game):
+        """新增或更新一款游戏（传入已提交的 Game 对象）"""
+        record = GameRecord.from_model(game)
+        if self._snapshot is None:
+            return
+        replaced = {}
+
+        def build(current):
+            replaced['old'] = current.by_id.get(record.id)
+            return [r for r in current.games if r.id != record.id] + [record]
+
+        snapshot = self._swap(build)
+        self._notify('upsert', snapshot, replaced['old'], record)
+
+    def remove(self, game_id):
+        """从目录中移除一款游戏"""
+        current = self._snapshot
+        if current is None or game_id not in current.by_id:
+            return
+        removed = {}
+
+        def build(current):
+            removed['old'] = current.by_id.get(game_id)
+            if removed['old'] is None:
+                return None
+            return [r for r in current.games if r.id != game_id]
+
+        snapshot = self._swap(build)
+        if snapshot is not None:
+            self._notify('remove', snapshot, removed['old'], None)
+
+
+game_catalog = GameCatalog()
@@ -0,0 +1,165 @@
+"""
+游戏搜索引擎
+在游戏目录快照之上维护内存索引，供聊天工具和 /api/games/search 共用
+"""
+import threading
+
+from services.bm25 import BM25Index
+from services.category_keywords import CATEGORY_KEYWORDS
+from services.game_catalog import change_action, game_catalog
+from services.ngram_index import NgramIndex
+from services.pinyin_index import PinyinIndex
+from services.spell_index import SymSpellIndex
+
+# 模糊匹配的相似度阈值（与原 similarity_score 的阈值一致）
+FUZZY_THRESHOLD = 0.5
+
+# 相关性检索各字段的权重
+RELEVANCE_FIELD_WEIGHTS = {
+    'name': 3.0,
+    'name_en': 2.0,
+    'category': 2.0,
+    'tags': 1.5,
+    'description': 1.0,
+}
+
+
+def _index_fields(record):
+    return {'name': record.name, 'name_en': record.name_en}
+
+
+def _relevance_fields(record):
+    # 类型存的是英文代号，附上对应的中文类型词，"恐怖"之类的问法才能命中
+    category = record.category or ''
+    return {
+        'name': record.name,
+        'name_en': record.name_en,
+        'category': ' '.join([category] + CATEGORY_KEYWORDS.get(category, [])),
+        'tags': record.tags,
+        'description': record.description,
+    }
+
+
+class GameSearchEngine:
+    """
+    跟随目录快照增量维护的内存索引
+    - name_index：游戏名 n-gram 索引（模糊搜索）
+    - pinyin_index：游戏名的全拼/模糊音/首字母索引（同音错别字、拼音缩写）
+    - spell_index：游戏名中英文单词的 SymSpell 索引（英文拼写纠错）
+    - relevance_index：名称/类型/标签/简介的 BM25 索引（相关性检索）
+    """
+
+    def __init__(self, catalog):
+        self._catalog = catalog
+        self._lock = threading.RLock()
+        self.name_index = NgramIndex()
+        self.pinyin_index = PinyinIndex()
+        self.spell_index = SymSpellIndex()
+        self.relevance_index = BM25Index(RELEVANCE_FIELD_WEIGHTS)
+        catalog.subscribe(self._on_catalog_change)
+
+    def _rebuild(self, snapshot):
+        # 构建新索引后整体替换，查询不会看到构建到一半的索引
+        index = NgramIndex()
+        pinyin = PinyinIndex()
+        spell = SymSpellIndex()
+        relevance = BM25Index(RELEVANCE_FIELD_WEIGHTS)
+        for record in snapshot.games:
+            index.add(record.id, _index_fields(record))
+            pinyin.add(record.id, record.name)
+            spell.add(record.id, (record.name, record.name_en))
+            relevance.add(record.id, _relevance_fields(record))
+        index.version = pinyin.version = spell.version = relevance.version = snapshot.version
+        self.relevance_index = relevance
+        self.spell_index = spell
+        self.pinyin_index = pinyin
+        self.name_index = index
+
+    def _set_version(self, version):
+        self.pinyin_index.version = self.relevance_index.version = version
+        self.spell_index.version = version
+        self.name_index.version = version
+
+    def _on_catalog_change(self, event, snapshot, old, new):
+        with self._lock:
+            action = change_action(self.name_index.version, snapshot, event)
+            if action == 'skip':
+                return
+            if action == 'apply' and event == 'upsert':
+                self.name_index.add(new.id, _index_fields(new))
+                self.pinyin_index.add(new.id, new.name)
+                self.spell_index.add(new.id, (new.name, new.name_en))
+                self.relevance_index.add(new.id, _relevance_fields(new))
+                self._set_version(snapshot.version)
+            elif action == 'apply' and event == 'remove':
+                self.name_index.remove(old.id)
+                self.pinyin_index.remove(old.id)
+                self.spell_index.remove(old.id)
+                self.relevance_index.remove(old.id)
+                self._set_version(snapshot.version)
+            else:
+                self._rebuild(snapshot)
+
+    def _ensure_current(self):
+        # 先在锁外取快照，避免与目录锁形成嵌套
+        snapshot = self._catalog.snapshot()
+        if self.name_index.version != snapshot.version:
+            with self._lock:
+                current = self.name_index.version
+                if current is None or current < snapshot.version:
+                    self._rebuild(snapshot)
+        return snapshot
+
+    def titles_in(self, query):
+        """查询中完整出现的游戏名，返回 [(GameRecord, 匹配长度)]，长的在前"""
+        snapshot = self._ensure_current()
+        best = {}
+        for game_id, _field, length in self.name_index.contained_items(query):
+            if game_id in snapshot.by_id and length > best.get(game_id, 0):
+                best[game_id] = length
+        return sorted(((snapshot.by_id[i], n) for i, n in best.items()),
+                      key=lambda x: -x[1])
+
+    def pinyin_matches(self, query, limit=5):
+        """按拼音查找游戏名（同音字、全拼、首字母缩写），返回 [(GameRecord, 分数)]"""
+        snapshot = self._ensure_current()
+        return [(snapshot.by_id[game_id], score)
+                for game_id, score in self.pinyin_index.search(query, limit=limit)
+                if game_id in snapshot.by_id]
+
+    def did_you_mean(self, query):
+        """把查询中拼错的英文单词纠正为游戏名中出现过的词；无需纠正时返回 None"""
+        self._ensure_current()
+        return self.spell_index.correct(query)
+
+    def fuzzy_search(self, query, limit=5, threshold=FUZZY_THRESHOLD):
+        """按游戏名/英文名模糊搜索（字符 n-gram + 拼音），返回按相似度排序的 GameRecord 列表"""
+        snapshot = self._ensure_current()
+        best = dict(self.pinyin_index.search(query, limit=limit))
+        for game_id, score in self.name_index.search(query, threshold=threshold, limit=limit):
+            if score > best.get(game_id, 0.0):
+                best[game_id] = score
+        ranked = sorted(best.items(), key=lambda x: (-x[1], x[0]))[:limit]
+        return [snapshot.by_id[game_id] for game_id, _score in ranked
+                if game_id in snapshot.by_id]
+
+    def relevant(self, query, limit=20):
+        """
+        按 BM25 相关性检索，返回最多 limit 个 GameRecord；
+        相关游戏不足时用最新的游戏补足，结果数量与目录规模无关
+        """
+        snapshot = self._ensure_current()
+        hits = self.relevance_index.search(query, limit=limit)
+        records = [snapshot.by_id[game_id] for game_id, _score in hits
+                   if game_id in snapshot.by_id]
+        if len(records) < limit:
+            seen = {record.id for record in records}
+            for record in snapshot.games:
+                if len(records) >= limit:
+                    break
+                if record.id not in seen:
+                    records.append(record)
+        return records
+
+
+game_search = GameSearchEngine(game_catalog)
@@ -0,0 +1,130 @@
+"""
+最近对话历史缓存
+按 user_key 缓存用户 id 和最近一段消息（LRU，条数有上限）；
+保存新一轮对话时直接追加到缓存，清空历史时失效，活跃用户每轮无需查询历史
+"""
+import threading
+from collections import OrderedDict
+
+from config import Config
+from services.history_writer import history_writer
+
+# 记录最近变更序号的用户数（相对缓存容量的倍数），用于判断加载期间是否有并发写入
+_CHANGE_LOG_FACTOR = 4
+
+
+class HistoryEntry:
+    __slots__ = ('user_key', 'user_id', 'messages')
+
+    def __init__(self, user_key, user_id, messages):
+        self.user_key = user_key
+        self.user_id = user_id
+        self.messages = messages
+
+
+class RecentHistoryCache:
+    """
+    消息为 chat_histories 行的字典（id、role、content、created_at）；
+    刚保存、尚未写入数据库的行 id 为空，写入后由 history_writer 补上
+
+    未命中时调用方先取 token()，查完数据库再 put(..., token)：
+    加载期间该用户有新消息或被清空时放弃缓存这次结果，避免缓存缺少消息的窗口
+    """
+
+    def __init__(self, maxsize=None, window=None):
+        self.maxsize = Config.HISTORY_CACHE_SIZE if maxsize is None else maxsize
+        self.window = window or (Config.HISTORY_WINDOW_MESSAGES + Config.SUMMARY_BATCH_MESSAGES)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._keys_by_id = {}
+        self._seq = 0
+        self._changes = OrderedDict()
+        self._stats = {'hits': 0, 'misses': 0, 'appends': 0, 'evictions': 0,
+                       'invalidations': 0, 'stale_loads': 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _changed(self, user_id):
+        self._seq += 1
+        self._changes[user_id] = self._seq
+        self._changes.move_to_end(user_id)
+        while len(self._changes) > max(1, self.maxsize) * _CHANGE_LOG_FACTOR:
+            self._changes.popitem(last=False)
+
+    def get(self, user_key):
+        """命中时返回 (user_id, 消息列表副本)，否则返回 None"""
+        with self._lock:
+            entry = self._entries.get(user_key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(user_key)
+            self._stats['hits'] += 1
+            return entry.user_id, list(entry.messages)
+
+    def token(self):
+        with self._lock:
+            return self._seq
+
+    def put(self, user_key, user_id, messages, token):
+        """缓存从数据库加载的窗口；token 之后该用户有变更时不缓存"""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            if self._changes.get(user_id, 0) > token:
+                self._stats['stale_loads'] += 1
+                return
+            self._entries[user_key] = HistoryEntry(user_key, user_id, list(messages[-self.window:]))
+            self._entries.move_to_end(user_key)
+            self._keys_by_id[user_id] = user_key
+            while len(self._entries) > self.maxsize:
+                _, evicted = self._entries.popitem(last=False)
+                self._keys_by_id.pop(evicted.user_id, None)
+                self._stats['evictions'] += 1
+
+    def append(self, user_id, rows):
+        """新保存的消息追加到该用户的窗口（用户未缓存时只记录变更）"""
+        with self._lock:
+            self._changed(user_id)
+            entry = self._entries.get(self._keys_by_id.get(user_id))
+            if entry is None:
+                return
+            entry.messages.extend(rows)
+            del entry.messages[:-self.window]
+            self._stats['appends'] += 1
+
+    def invalidate(self, user_key=None, user_id=None):
+        with self._lock:
+            if user_id is None:
+                entry = self._entries.get(user_key)
+                user_id = entry.user_id if entry is not None else None
+            if user_key is None:
+                user_key = self._keys_by_id.get(user_id)
+            if user_id is not None:
+                self._changed(user_id)
+                self._keys_by_id.pop(user_id, None)
+            if self._entries.pop(user_key, None) is not None:
+                self._stats['invalidations'] += 1
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data['size'] = len(self._entries)
+        lookups = data['hits'] + data['misses']
+        data['hit_rate'] = round(data['hits'] / lookups, 4) if lookups else 0.0
+        data['maxsize'] = self.maxsize
+        data['window'] = self.window
+        return data
+
+
+history_cache = RecentHistoryCache()
+
+
+def _on_rows_dropped(rows):
+    # 写入失败被丢弃的消息不能留在缓存窗口里，下次从数据库重新加载
+    for user_id in {row['user_id'] for row in rows}:
+        history_cache.invalidate(user_id=user_id)
+
+
+history_writer.subscribe(_on_rows_dropped)
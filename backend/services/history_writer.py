@@ -0,0 +1,275 @@
+"""
+对话历史的后台批量写入（write-behind）
+请求线程只把行放进内存队列就返回；后台线程攒满一批或等到刷新间隔后
+用一条多行 INSERT 写入并提交。进程退出时把剩余的行写完
+整批写入失败时逐条重写，只丢弃写不进去的那一次 append 的行
+HISTORY_WRITE_BEHIND 关闭时退化为在调用线程中同步写入，写入失败时把异常抛给调用方
+"""
+import atexit
+import json
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import DataError, IntegrityError
+
+from config import Config
+from database.models import ChatHistory, ChatHistoryGame, Game, SessionLocal
+
+
+def history_row(user_id, role, content, game_ids=None, truncated=False):
+    """
+    一条待写入的 chat_histories 行；created_at 在入队时确定，保证批量写入后顺序不变
+    game_ids 为 JSON 数组字符串，写入时同时展开到 chat_history_games
+    """
+    return {
+        'user_id': user_id,
+        'role': role,
+        'content': content,
+        'game_ids': game_ids,
+        'truncated': truncated,
+        'created_at': datetime.utcnow(),
+    }
+
+
+def game_links(db, rows, ids):
+    """根据各行的 game_ids 生成 chat_history_games 行（跳过重复和已删除的游戏）"""
+    wanted = [(row_id, json.loads(row['game_ids'])) for row, row_id in zip(rows, ids) if row.get('game_ids')]
+    if not wanted:
+        return []
+    existing = set(db.scalars(
+        select(Game.id).where(Game.id.in_({gid for _, gids in wanted for gid in gids}))
+    ))
+    return [
+        {'history_id': history_id, 'game_id': game_id, 'position': position}
+        for history_id, gids in wanted
+        for position, game_id in enumerate(dict.fromkeys(gid for gid in gids if gid in existing))
+    ]
+
+
+class HistoryWriter:
+    """
+    append(rows, on_commit, sync)：入队（同步模式或 sync=True 时直接写入）；on_commit 在这些行提交后调用
+    pending(user_id)：已入队但尚未提交的行，读取最近历史时合并，保证读到自己刚写的内容
+    flush()：立即写完队列中的所有行（清空历史前调用，避免删除后又写入旧消息）
+    subscribe(listener)：listener(rows) 在行因写入失败被丢弃时调用
+    """
+
+    def __init__(self, session_factory=SessionLocal, write_behind=None, batch_size=None,
+                 flush_interval=None, retries=None):
+        self._session_factory = session_factory
+        self.write_behind = Config.HISTORY_WRITE_BEHIND if write_behind is None else write_behind
+        self.batch_size = batch_size or Config.HISTORY_BATCH_SIZE
+        self.flush_interval = Config.HISTORY_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        self.retries = Config.HISTORY_WRITE_RETRIES if retries is None else retries
+        # _lock 保护队列；_write_lock 保证同一时间只有一个批次在写
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._write_lock = threading.Lock()
+        self._queue = []
+        self._inflight = []
+        self._closed = False
+        self._worker = None
+        self._listeners = []
+        self._stats = {'enqueued': 0, 'written': 0, 'flushes': 0, 'sync_writes': 0,
+                       'errors': 0, 'dropped': 0, 'max_batch': 0, 'max_flush_ms': 0.0}
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name='history-writer', daemon=True)
+            self._worker.start()
+
+    def subscribe(self, listener):
+        self._listeners.append(listener)
+
+    def append(self, rows, on_commit=None, sync=False):
+        entry = (list(rows), on_commit)
+        if sync or not self.write_behind:
+            with self._write_lock:
+                error = self._write([entry])
+            with self._lock:
+                self._stats['sync_writes'] += 1
+            if error is not None:
+                raise error
+            return
+        with self._lock:
+            if self._closed:
+                entry = None
+            else:
+                self._queue.append(entry)
+                self._stats['enqueued'] += len(entry[0])
+                self._ensure_worker()
+                if self._queued_rows() >= self.batch_size:
+                    self._wakeup.notify()
+        if entry is None:
+            # 进程正在退出，后台线程已停止
+            with self._write_lock:
+                error = self._write([(list(rows), on_commit)])
+            if error is not None:
+                raise error
+
+    def _queued_rows(self):
+        return sum(len(rows) for rows, _ in self._queue)
+
+    def _take_batch(self):
+        """从队首取出不超过 batch_size 行的条目（同一条目的行不拆开）"""
+        batch, size = [], 0
+        while self._queue and (not batch or size + len(self._queue[0][0]) <= self.batch_size):
+            entry = self._queue.pop(0)
+            batch.append(entry)
+            size += len(entry[0])
+        return batch
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._queue and not self._closed:
+                    self._wakeup.wait()
+                if self._closed and not self._queue:
+                    return
+                # 不满一批时最多等一个刷新间隔
+                if self._queued_rows() < self.batch_size and not self._closed:
+                    self._wakeup.wait(self.flush_interval)
+            self._flush_once()
+
+    def _flush_once(self):
+        with self._write_lock:
+            with self._lock:
+                batch = self._take_batch()
+                self._inflight = batch
+            try:
+                if batch:
+                    self._write(batch)
+            finally:
+                with self._lock:
+                    self._inflight = []
+
+    def _insert(self, batch):
+        """在一个事务中写入这些条目的行和游戏关联，成功后回填 id"""
+        rows = [row for entry_rows, _ in batch for row in entry_rows]
+        db = self._session_factory()
+        try:
+            result = db.execute(
+                insert(ChatHistory).returning(ChatHistory.id, sort_by_parameter_order=True), rows
+            )
+            ids = result.scalars().all()
+            links = game_links(db, rows, ids)
+            if links:
+                db.execute(insert(ChatHistoryGame), links)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        # 回填 id（最近历史缓存中保存的是同一批行，据此判断哪些消息已并入摘要）
+        for row, row_id in zip(rows, ids):
+            row['id'] = row_id
+
+    def _write(self, batch):
+        """
+        写入一批条目，返回最后一个导致丢弃的异常（全部写入时为 None）
+        整批写入失败后不再整批重试，改为逐条写入，一条坏数据不会连累同批的其他用户
+        """
+        if len(batch) > 1:
+            started = time.perf_counter()
+            try:
+                self._insert(batch)
+            except Exception as e:
+                self._failed(batch, e, 1)
+            else:
+                self._committed(batch, started)
+                return None
+        error = None
+        for entry in batch:
+            error = self._write_entry(entry) or error
+        return error
+
+    def _write_entry(self, entry):
+        started = time.perf_counter()
+        for attempt in range(self.retries + 1):
+            try:
+                self._insert([entry])
+            except Exception as e:
+                self._failed([entry], e, attempt + 1)
+                # 约束或数据错误重试也不会成功
+                if attempt == self.retries or isinstance(e, (IntegrityError, DataError)):
+                    self._dropped(entry)
+                    return e
+                time.sleep(min(1.0, 0.1 * 2 ** attempt))
+            else:
+                self._committed([entry], started)
+                return None
+
+    def _failed(self, batch, error, attempt):
+        with self._lock:
+            self._stats['errors'] += 1
+        print(f"⚠️ Chat history write failed ({sum(len(rows) for rows, _ in batch)} rows, "
+              f"attempt {attempt}): {type(error).__name__}: {error}")
+
+    def _dropped(self, entry):
+        rows = entry[0]
+        with self._lock:
+            self._stats['dropped'] += len(rows)
+        for listener in self._listeners:
+            try:
+                listener(rows)
+            except Exception as e:
+                print(f"⚠️ History drop listener failed: {type(e).__name__}: {e}")
+
+    def _committed(self, batch, started):
+        written = sum(len(rows) for rows, _ in batch)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self._stats['written'] += written
+            self._stats['flushes'] += 1
+            self._stats['max_batch'] = max(self._stats['max_batch'], written)
+            self._stats['max_flush_ms'] = max(self._stats['max_flush_ms'], round(elapsed_ms, 2))
+        for _, on_commit in batch:
+            if on_commit is not None:
+                try:
+                    on_commit()
+                except Exception as e:
+                    print(f"⚠️ History commit callback failed: {type(e).__name__}: {e}")
+
+    def pending(self, user_id):
+        """该用户已入队、尚未提交的行（按入队顺序；返回的是队列中的同一批字典，提交后会补上 id）"""
+        with self._lock:
+            return [row
+                    for rows, _ in self._inflight + self._queue
+                    for row in rows if row['user_id'] == user_id]
+
+    def flush(self):
+        """写完当前队列中的所有行"""
+        while True:
+            with self._lock:
+                if not self._queue:
+                    break
+            self._flush_once()
+        # 等待后台线程正在写的批次完成
+        with self._write_lock:
+            pass
+
+    def close(self):
+        """进程退出时调用：停止后台线程并写完剩余的行"""
+        with self._lock:
+            self._closed = True
+            self._wakeup.notify_all()
+            worker = self._worker
+        if worker is not None and worker.is_alive():
+            worker.join(timeout=10)
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data['pending'] = self._queued_rows() + sum(len(rows) for rows, _ in self._inflight)
+        data['write_behind'] = self.write_behind
+        data['avg_batch'] = round(data['written'] / data['flushes'], 1) if data['flushes'] else 0.0
+        return data
+
+
+history_writer = HistoryWriter()
+
+atexit.register(history_writer.close)
@@ -0,0 +1,125 @@
+"""
+意图快速路由
+对明显的意图（直接说出游戏名或其同音字/拼音缩写、只说类型词、"有什么游戏"之类的列表请求）
+在本地直接决定要调用的工具，跳过一次 LLM 意图分析；拿不准的交给 LLM
+"""
+import re
+import threading
+from collections import namedtuple
+
+from services.category_matcher import intent_matcher
+from services.game_search import game_search
+from services.pinyin_index import SCORE_INITIALS
+
+RouteDecision = namedtuple('RouteDecision', ['route', 'tool', 'args'])
+
+# 查询两端可忽略的标点、书名号和语气词
+_STRIP_CHARS = ' \t\r\n，。！？、,.!?~～《》"\'“”「」'
+_TRAILING_PARTICLES = ('吗', '呢', '啊', '呀', '吧', '嘛')
+
+# 只包含这些词和类型关键词的查询视为"按类型找游戏"
+_FILLER_PATTERN = re.compile(
+    r'(我想|我要|想要|想玩|帮我|给我|有没有|有什么|有哪些|推荐|来点|来个|来一款|'
+    r'几款|一些|一款|一个|好玩的|好玩|的|类型|类|游戏|game|games|\s)',
+    re.IGNORECASE
+)
+
+# 列出游戏库的常见问法（归一化后整句匹配）
+GENERIC_LIST_PHRASES = {
+    '游戏', '游戏库', '推荐', '推荐游戏', '推荐一下', '推荐几款游戏', '所有游戏', '游戏列表',
+    '有什么', '有什么游戏', '有哪些游戏', '有什么好玩的', '有什么好玩的游戏',
+    '有啥游戏', '有啥好玩的', '都有什么游戏', '库里有什么', '游戏库里有什么',
+    '你有什么游戏', '你们有什么游戏',
+}
+
+# 查询中出现的游戏名至少占查询长度的比例，才视为在找这款游戏
+TITLE_COVERAGE = 0.5
+
+# 超过这个长度的查询不再做拼音匹配（整句读音不可能是游戏名，逐段查找只会拖慢每轮对话）
+PINYIN_MAX_QUERY_LENGTH = 32
+
+
+def normalize_query(query):
+    """去掉两端标点和句尾语气词，统一小写"""
+    text = (query or '').strip(_STRIP_CHARS).lower()
+    while text.endswith(_TRAILING_PARTICLES):
+        text = text[:-1].rstrip(_STRIP_CHARS)
+    return text
+
+
+class FastPathRouter:
+    """本地意图路由，带各路由的命中计数"""
+
+    ROUTES = ('exact_title', 'title_in_query', 'category', 'pinyin_title', 'generic_list')
+
+    def __init__(self, search_engine, matcher):
+        self._search = search_engine
+        self._matcher = matcher
+        self._lock = threading.Lock()
+        self._counters = {name: 0 for name in self.ROUTES}
+        self._counters['llm_fallback'] = 0
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def _match_title(self, text):
+        titles = self._search.titles_in(text)
+        if not titles:
+            return None
+        record, length = titles[0]
+        if length == len(text):
+            return RouteDecision('exact_title', 'search_games', {'query': record.name})
+        if length >= 2 and length / len(text) >= TITLE_COVERAGE:
+            return RouteDecision('title_in_query', 'search_games', {'query': record.name})
+        return None
+
+    def _match_pinyin(self, text):
+        # 只接受整句读音命中（同音字、全拼；纯拼音输入时还有首字母缩写），部分命中交给 LLM
+        if len(text) > PINYIN_MAX_QUERY_LENGTH:
+            return None
+        matches = self._search.pinyin_matches(text, limit=2)
+        if not matches or matches[0][1] < SCORE_INITIALS:
+            return None
+        if len(matches) > 1 and matches[1][1] >= matches[0][1]:
+            return None
+        return RouteDecision('pinyin_title', 'search_games', {'query': matches[0][0].name})
+
+    def _match_category(self, text, query):
+        matches = self._matcher.classify(text)
+        if not matches:
+            return None
+        # 去掉类型关键词和常见虚词后不应再剩下别的内容，否则交给 LLM 理解
+        rest = list(text)
+        for entry in matches:
+            for start, end in entry['positions']:
+                rest[start:end] = [' '] * (end - start)
+        if _FILLER_PATTERN.sub('', ''.join(rest)):
+            return None
+        return RouteDecision('category', 'search_games', {'query': query})
+
+    def route(self, query):
+        """返回 RouteDecision；无法确定时返回 None（由 LLM 分析）"""
+        text = normalize_query(query)
+        decision = None
+        if text:
+            if text in GENERIC_LIST_PHRASES:
+                decision = RouteDecision('generic_list', 'search_games', {'query': '游戏'})
+            else:
+                decision = (self._match_title(text)
+                            or self._match_category(text, query.strip())
+                            or self._match_pinyin(text))
+        self._count(decision.route if decision else 'llm_fallback')
+        return decision
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self._counters)
+        total = sum(counters.values())
+        fast = total - counters['llm_fallback']
+        counters['total'] = total
+        counters['fast_path_ratio'] = round(fast / total, 4) if total else 0.0
+        return counters
+
+
+fast_router = FastPathRouter(game_search, intent_matcher)
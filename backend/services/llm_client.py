@@ -0,0 +1,350 @@
+"""
+LLM 客户端管理
+进程内共享一个带连接池的 httpx/OpenAI 客户端，避免每次调用都重新握手；
+ASGI 入口另有一个绑定到事件循环的 AsyncOpenAI 客户端
+"""
+import asyncio
+import atexit
+import threading
+import time
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+from config import Config
+
+
+class PoolStats:
+    """连接池统计（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.in_flight = 0
+        self.connections_opened = 0
+        self.connections_reused = 0
+        self.tls_handshakes = 0
+        self.errors = 0
+        self.total_wait_ms = 0.0
+
+    def begin(self):
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+
+    def end(self, opened_connection, tls_handshake, elapsed_ms, error=False):
+        """收到响应头（或请求失败）时记录连接情况；in_flight 在 release() 中减少"""
+        with self._lock:
+            self.total_wait_ms += elapsed_ms
+            if error:
+                self.errors += 1
+                return
+            if opened_connection:
+                self.connections_opened += 1
+            else:
+                self.connections_reused += 1
+            if tls_handshake:
+                self.tls_handshakes += 1
+
+    def release(self):
+        """响应体关闭（或请求失败）时调用"""
+        with self._lock:
+            self.in_flight -= 1
+
+    def snapshot(self):
+        with self._lock:
+            completed = self.connections_opened + self.connections_reused
+            return {
+                'requests': self.requests,
+                'in_flight': self.in_flight,
+                'connections_opened': self.connections_opened,
+                'connections_reused': self.connections_reused,
+                'reuse_ratio': round(self.connections_reused / completed, 4) if completed else 0.0,
+                'tls_handshakes': self.tls_handshakes,
+                'errors': self.errors,
+                'avg_time_to_headers_ms': round(self.total_wait_ms / completed, 2) if completed else 0.0,
+            }
+
+
+class _RequestTrace:
+    """单个请求的 httpcore trace 回调，用于判断是否新建了连接"""
+
+    def __init__(self):
+        self.opened_connection = False
+        self.tls_handshake = False
+
+    def __call__(self, event_name, info):
+        if event_name == 'connection.connect_tcp.complete':
+            self.opened_connection = True
+        elif event_name == 'connection.start_tls.complete':
+            self.tls_handshake = True
+
+
+class _AsyncRequestTrace(_RequestTrace):
+    """异步传输层使用的 trace 回调（httpcore 要求异步接口的回调是协程函数）"""
+
+    async def __call__(self, event_name, info):
+        super().__call__(event_name, info)
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    """包装响应体，关闭时调用 on_close（流式响应在读完正文前一直计入 in_flight）"""
+
+    def __init__(self, stream, on_close):
+        self._stream = stream
+        self._on_close = on_close
+        self._closed = False
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._stream.close()
+        finally:
+            self._on_close()
+
+
+class _AsyncReleasingStream(httpx.AsyncByteStream):
+    """_ReleasingStream 的异步版本"""
+
+    def __init__(self, stream, on_close):
+        self._stream = stream
+        self._on_close = on_close
+        self._closed = False
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            await self._stream.aclose()
+        finally:
+            self._on_close()
+
+
+class InstrumentedTransport(httpx.HTTPTransport):
+    """记录连接新建/复用情况的 httpx 传输层"""
+
+    def __init__(self, stats, **kwargs):
+        super().__init__(**kwargs)
+        self._stats = stats
+
+    def handle_request(self, request):
+        trace = _RequestTrace()
+        request.extensions['trace'] = trace
+        self._stats.begin()
+        start = time.perf_counter()
+        try:
+            response = super().handle_request(request)
+        except BaseException:
+            self._stats.end(False, False, (time.perf_counter() - start) * 1000, error=True)
+            self._stats.release()
+            raise
+        self._stats.end(trace.opened_connection, trace.tls_handshake,
+                        (time.perf_counter() - start) * 1000)
+        response.stream = _ReleasingStream(response.stream, self._stats.release)
+        return response
+
+    def pool_state(self):
+        """当前连接池中的连接状态"""
+        connections = list(getattr(self._pool, 'connections', []))
+        idle = sum(1 for c in connections if c.is_idle())
+        return {
+            'open': len(connections),
+            'idle': idle,
+            'active': len(connections) - idle,
+        }
+
+
+class InstrumentedAsyncTransport(httpx.AsyncHTTPTransport):
+    """InstrumentedTransport 的异步版本"""
+
+    def __init__(self, stats, **kwargs):
+        super().__init__(**kwargs)
+        self._stats = stats
+
+    async def handle_async_request(self, request):
+        trace = _AsyncRequestTrace()
+        request.extensions['trace'] = trace
+        self._stats.begin()
+        start = time.perf_counter()
+        try:
+            response = await super().handle_async_request(request)
+        except BaseException:
+            self._stats.end(False, False, (time.perf_counter() - start) * 1000, error=True)
+            self._stats.release()
+            raise
+        self._stats.end(trace.opened_connection, trace.tls_handshake,
+                        (time.perf_counter() - start) * 1000)
+        response.stream = _AsyncReleasingStream(response.stream, self._stats.release)
+        return response
+
+    pool_state = InstrumentedTransport.pool_state
+
+
+def _http2_available():
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class LLMClientManager:
+    """
+    进程级 LLM 客户端管理器
+
+    - 惰性创建，所有线程共享同一个 OpenAI 客户端及其连接池
+    - 连接池大小、keep-alive、HTTP/2、各阶段超时均可通过 Config 配置
+    - close() 关闭连接池，进程退出时自动调用
+    - get_async_client() 返回绑定到当前事件循环的 AsyncOpenAI 客户端（ASGI 入口使用），
+      由 aclose() 在事件循环结束前关闭
+    """
+
+    def __init__(self, config=Config):
+        self._config = config
+        self._lock = threading.Lock()
+        self._client = None
+        self._transport = None
+        self._stats = PoolStats()
+        self._created_at = None
+        self._http2 = False
+        self._async_client = None
+        self._async_loop = None
+        self._async_transport = None
+        self._async_stats = PoolStats()
+
+    def _build_limits(self):
+        return httpx.Limits(
+            max_connections=self._config.LLM_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=self._config.LLM_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=self._config.LLM_POOL_KEEPALIVE_EXPIRY,
+        )
+
+    def _build_timeout(self):
+        return httpx.Timeout(
+            connect=self._config.LLM_CONNECT_TIMEOUT,
+            read=self._config.LLM_READ_TIMEOUT,
+            write=self._config.LLM_WRITE_TIMEOUT,
+            pool=self._config.LLM_POOL_TIMEOUT,
+        )
+
+    def _use_http2(self):
+        if not self._config.LLM_HTTP2:
+            return False
+        if not _http2_available():
+            print("⚠️ LLM_HTTP2 is enabled but 'h2' is not installed, falling back to HTTP/1.1")
+            return False
+        return True
+
+    def _create(self):
+        self._http2 = self._use_http2()
+        self._transport = InstrumentedTransport(
+            self._stats,
+            http2=self._http2,
+            limits=self._build_limits(),
+        )
+        http_client = httpx.Client(
+            transport=self._transport,
+            timeout=self._build_timeout(),
+        )
+        self._created_at = time.time()
+        return OpenAI(
+            api_key=self._config.QWEN_API_KEY,
+            base_url=self._config.QWEN_BASE_URL,
+            http_client=http_client,
+            max_retries=self._config.LLM_MAX_RETRIES,
+        )
+
+    def get_client(self):
+        """获取共享的 OpenAI 客户端"""
+        client = self._client
+        if client is not None:
+            return client
+        with self._lock:
+            if self._client is None:
+                self._client = self._create()
+                print(f"✅ LLM client pool created "
+                      f"(max_connections={self._config.LLM_POOL_MAX_CONNECTIONS}, "
+                      f"http2={self._http2})")
+            return self._client
+
+    def get_async_client(self):
+        """获取当前事件循环共享的 AsyncOpenAI 客户端（只能在事件循环中调用）"""
+        loop = asyncio.get_running_loop()
+        if self._async_client is not None and self._async_loop is loop:
+            return self._async_client
+        self._async_transport = InstrumentedAsyncTransport(
+            self._async_stats,
+            http2=self._use_http2(),
+            limits=self._build_limits(),
+        )
+        http_client = httpx.AsyncClient(
+            transport=self._async_transport,
+            timeout=self._build_timeout(),
+        )
+        self._async_client = AsyncOpenAI(
+            api_key=self._config.QWEN_API_KEY,
+            base_url=self._config.QWEN_BASE_URL,
+            http_client=http_client,
+            max_retries=self._config.LLM_MAX_RETRIES,
+        )
+        self._async_loop = loop
+        print(f"✅ Async LLM client pool created "
+              f"(max_connections={self._config.LLM_POOL_MAX_CONNECTIONS})")
+        return self._async_client
+
+    async def aclose(self):
+        """关闭异步客户端（ASGI lifespan 结束时调用）"""
+        client, self._async_client = self._async_client, None
+        self._async_loop = None
+        self._async_transport = None
+        if client is not None:
+            await client.close()
+
+    def close(self):
+        """关闭客户端及其连接池"""
+        with self._lock:
+            client, self._client = self._client, None
+            self._transport = None
+        if client is not None:
+            client.close()
+
+    def stats(self):
+        """连接池统计信息"""
+        data = self._stats.snapshot()
+        transport = self._transport
+        if transport is not None:
+            pool = transport.pool_state()
+            data.update({
+                'connections_open': pool['open'],
+                'connections_idle': pool['idle'],
+                'connections_active': pool['active'],
+                'waiting': max(0, data['in_flight'] - pool['active']),
+            })
+        else:
+            data.update({'connections_open': 0, 'connections_idle': 0,
+                         'connections_active': 0, 'waiting': 0})
+        data['initialized'] = transport is not None
+        data['max_connections'] = self._config.LLM_POOL_MAX_CONNECTIONS
+        data['http2'] = self._http2
+        data['uptime_seconds'] = round(time.time() - self._created_at, 1) if self._created_at else 0
+        async_data = self._async_stats.snapshot()
+        async_transport = self._async_transport
+        async_data['initialized'] = async_transport is not None
+        if async_transport is not None:
+            async_data.update({'connections_' + k: v for k, v in async_transport.pool_state().items()})
+        data['async'] = async_data
+        return data
+
+
+llm_clients = LLMClientManager()
+atexit.register(llm_clients.close)
@@ -0,0 +1,178 @@
+"""
+字符 n-gram 倒排索引
+用于游戏名的模糊搜索：中文按单字+二元组、英文按三元组建立倒排表，
+按 Dice 系数排序，支持增量增删，查询只访问与查询共享 n-gram 的候选文档
+"""
+import math
+import threading
+from collections import Counter
+
+
+def normalize(text):
+    """统一大小写并去掉首尾空白"""
+    return (text or '').strip().lower()
+
+
+def char_ngrams(text):
+    """
+    提取字符 n-gram 集合
+    中文名通常只有 4~6 个字，单字 + 二元组能容忍一个错别字；
+    英文用三元组，倒排表更短。过短的文本直接作为一个 gram
+    """
+    grams = set()
+    for i, ch in enumerate(text):
+        if not ch.isascii():
+            grams.add(ch)
+        bigram = text[i:i + 2]
+        if len(bigram) == 2 and not bigram.isascii():
+            grams.add(bigram)
+        trigram = text[i:i + 3]
+        if len(trigram) == 3 and trigram.isascii():
+            grams.add(trigram)
+    if not grams and text:
+        grams.add(text)
+    return grams
+
+
+class NgramIndex:
+    """
+    倒排索引：gram -> {doc_key}，doc_key 为 (item_id, field)
+
+    评分与原 similarity_score 的语义保持一致：
+    - 完全相同得 1.0
+    - 一方包含另一方得 0.8
+    - 否则为 n-gram Dice 系数
+
+    _exact 的值是 frozenset，修改时整体替换，contained_items 因此可以不加锁读取
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._postings = {}
+        self._doc_grams = {}
+        self._doc_text = {}
+        self._exact = {}
+        self._item_docs = {}
+        # 已索引文本的长度分布，查询子串不必超过最长的文本
+        self._text_lengths = Counter()
+        self._max_len = 0
+        self.version = None
+
+    def __len__(self):
+        return len(self._item_docs)
+
+    def clear(self):
+        with self._lock:
+            self._postings.clear()
+            self._doc_grams.clear()
+            self._doc_text.clear()
+            self._exact.clear()
+            self._item_docs.clear()
+            self._text_lengths.clear()
+            self._max_len = 0
+
+    def add(self, item_id, fields):
+        """索引一个条目，fields 为 {字段名: 文本}；已存在则先移除"""
+        with self._lock:
+            self.remove(item_id)
+            keys = []
+            for field, value in fields.items():
+                text = normalize(value)
+                if not text:
+                    continue
+                key = (item_id, field)
+                grams = char_ngrams(text)
+                self._doc_grams[key] = grams
+                self._doc_text[key] = text
+                self._exact[text] = self._exact.get(text, frozenset()) | {key}
+                self._text_lengths[len(text)] += 1
+                self._max_len = max(self._max_len, len(text))
+                for gram in grams:
+                    self._postings.setdefault(gram, set()).add(key)
+                keys.append(key)
+            self._item_docs[item_id] = keys
+
+    def remove(self, item_id):
+        with self._lock:
+            for key in self._item_docs.pop(item_id, ()):
+                for gram in self._doc_grams.pop(key, ()):
+                    posting = self._postings.get(gram)
+                    if posting is not None:
+                        posting.discard(key)
+                        if not posting:
+                            del self._postings[gram]
+                text = self._doc_text.pop(key, None)
+                if text is None:
+                    continue
+                exact = self._exact.get(text, frozenset()) - {key}
+                if exact:
+                    self._exact[text] = exact
+                else:
+                    self._exact.pop(text, None)
+                self._text_lengths[len(text)] -= 1
+                if not self._text_lengths[len(text)]:
+                    del self._text_lengths[len(text)]
+                    self._max_len = max(self._text_lengths, default=0)
+
+    def contained_items(self, query):
+        """查询中完整出现的已索引文本，返回 [(item_id, field, 匹配长度)]"""
+        query = normalize(query)
+        exact = self._exact
+        max_len = self._max_len
+        found = []
+        for i in range(len(query)):
+            for j in range(i + 1, min(len(query), i + max_len) + 1):
+                for item_id, field in exact.get(query[i:j], ()):
+                    found.append((item_id, field, j - i))
+        return found
+
+    def search(self, query, threshold=0.5, limit=5):
+        """返回 [(item_id, score)]，按分数降序"""
+        query = normalize(query)
+        if not query:
+            return []
+        q_grams = char_ngrams(query)
+        scores = {}
+
+        # 1. 文档名被查询包含（或完全相同）：枚举查询子串做哈希查找
+        for item_id, field, length in self.contained_items(query):
+            score = 1.0 if length == len(query) else 0.8
+            if score > scores.get((item_id, field), 0.0):
+                scores[(item_id, field)] = score
+
+        with self._lock:
+
+            # 2. Dice 系数：达到阈值至少需要 min_overlap 个共同 gram。
+            #    中文单字的倒排表很长，只用多字 gram 生成候选：单字最多贡献
+            #    unigram_count 个共同 gram，其余必须来自多字 gram，因此只需
+            #    取最稀有的 len(multi) - needed + 1 个多字 gram（剪枝后无漏召回；
+            #    仅在单字就足以过阈值的极端情况下要求至少共享一个多字 gram）
+            q_size = len(q_grams)
+            min_overlap = max(1, math.ceil(threshold * q_size / (2 - threshold)))
+            multi = [g for g in q_grams if len(g) > 1 or g.isascii()]
+            if multi:
+                needed = max(1, min_overlap - (q_size - len(multi)))
+                pool = multi
+            else:
+                needed = min_overlap
+                pool = list(q_grams)
+            pool.sort(key=lambda g: len(self._postings.get(g, ())))
+            candidates = set()
+            for gram in pool[:len(pool) - needed + 1]:
+                candidates.update(self._postings.get(gram, ()))
+
+            for key in candidates:
+                d_grams = self._doc_grams[key]
+                overlap = len(q_grams & d_grams)
+                score = 2.0 * overlap / (q_size + len(d_grams))
+                if query in self._doc_text[key]:
+                    score = max(score, 0.8)
+                if score > scores.get(key, 0.0):
+                    scores[key] = score
+
+        best = {}
+        for (item_id, _field), score in scores.items():
+            if score >= threshold and score > best.get(item_id, 0.0):
+                best[item_id] = score
+        ranked = sorted(best.items(), key=lambda x: (-x[1], x[0]))
+        return ranked[:limit] if limit else ranked
@@ -0,0 +1,204 @@
+"""
+拼音索引
+把游戏名转成全拼、模糊音全拼和首字母三种键，用哈希表查找：
+同音错别字（"康斯坦斯" -> "康斯坦丝"）、拼音输入（"kangsitansi"）和
+首字母缩写（"hsdl"）都只需一次查表；首字母另有有序表支持前缀查找
+首字母和前缀只用于纯拼音输入：汉字查询必须整段读音相同，否则 "意思"(ys) 也会命中 "原神"(ys)
+繁体字与简体字读音相同，全角字符先做 NFKC 归一化，因此三者都落到同一个键上
+"""
+import bisect
+import itertools
+import threading
+import unicodedata
+from collections import Counter
+
+from pypinyin import Style, pinyin
+
+# 一个名称最多展开的多音字读音组合数
+MAX_READINGS = 8
+
+# 前缀查找时首字母缩写的最短长度
+MIN_PREFIX_LENGTH = 2
+
+# 各类命中的分数（与 NgramIndex 的 1.0 / 0.8 处于同一量纲）
+SCORE_FULL = 0.95
+SCORE_FUZZY = 0.9
+SCORE_INITIALS = 0.85
+SCORE_CONTAINED = 0.8
+SCORE_PREFIX = 0.7
+
+# 常见的模糊音（平翘舌、前后鼻音、n/l 不分）
+_FUZZY_INITIALS = (('zh', 'z'), ('ch', 'c'), ('sh', 's'), ('n', 'l'))
+_FUZZY_FINALS = (('ang', 'an'), ('eng', 'en'), ('ing', 'in'))
+
+
+def normalize_name(text):
+    """NFKC（全角转半角）+ 小写"""
+    return unicodedata.normalize('NFKC', text or '').lower()
+
+
+def _is_cjk(ch):
+    return '㐀' <= ch <= '鿿' or '豈' <= ch <= '﫿'
+
+
+def fuzzy_syllable(syllable):
+    for src, dst in _FUZZY_INITIALS:
+        if syllable.startswith(src):
+            syllable = dst + syllable[len(src):]
+            break
+    for src, dst in _FUZZY_FINALS:
+        if syllable.endswith(src):
+            syllable = syllable[:-len(src)] + dst
+            break
+    return syllable
+
+
+def reading_units(text):
+    """
+    文本 -> 读音单元列表；每个单元为 (是否汉字, 候选读音元组)
+    汉字取不带声调的全部读音，连续的字母数字作为一个单元，其余字符丢弃
+    """
+    units = []
+    run = []
+    word = []
+    for ch in normalize_name(text) + ' ':
+        if _is_cjk(ch):
+            run.append(ch)
+        elif run:
+            for readings in pinyin(''.join(run), style=Style.NORMAL, heteronym=True):
+                units.append((True, tuple(dict.fromkeys(readings))))
+            run = []
+        if ch.isascii() and ch.isalnum():
+            word.append(ch)
+        elif word:
+            units.append((False, (''.join(word),)))
+            word = []
+    return units
+
+
+def expand_readings(units, limit=MAX_READINGS):
+    """展开多音字，返回最多 limit 种读法，每种为 [(是否汉字, 读音)]"""
+    choices = [[(is_cjk, r) for r in readings] for is_cjk, readings in units]
+    return [list(combo) for combo in itertools.islice(itertools.product(*choices), limit)]
+
+
+def reading_keys(reading):
+    """一种读法 -> {'full': 全拼, 'fuzzy': 模糊音全拼, 'initials': 首字母}"""
+    return {
+        'full': ''.join(s for _, s in reading),
+        'fuzzy': ''.join(fuzzy_syllable(s) if is_cjk else s for is_cjk, s in reading),
+        'initials': ''.join(s[0] if is_cjk else s for is_cjk, s in reading),
+    }
+
+
+class PinyinIndex:
+    """键 -> {item_id: 分数}；支持增量增删"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._keys = {}
+        self._item_keys = {}
+        self._initials = []
+        # 各游戏名的读音单元数，用于限制查询中滑动窗口的长度
+        self._unit_counts = {}
+        self._unit_lengths = Counter()
+        self._max_units = 0
+        self.version = None
+
+    def __len__(self):
+        return len(self._item_keys)
+
+    def add(self, item_id, text):
+        units = reading_units(text)
+        with self._lock:
+            self.remove(item_id)
+            entries = {}
+            for reading in expand_readings(units):
+                # 纯字母名称的全拼就是原文，交给 n-gram 索引即可
+                if not any(is_cjk for is_cjk, _ in reading):
+                    continue
+                keys = reading_keys(reading)
+                for kind, score in (('full', SCORE_FULL), ('fuzzy', SCORE_FUZZY),
+                                    ('initials', SCORE_INITIALS)):
+                    key = (kind, keys[kind])
+                    entries[key] = max(entries.get(key, 0.0), score)
+            for key, score in entries.items():
+                self._keys.setdefault(key, {})[item_id] = score
+                if key[0] == 'initials' and len(self._keys[key]) == 1:
+                    bisect.insort(self._initials, key[1])
+            self._item_keys[item_id] = list(entries)
+            if entries:
+                self._unit_counts[item_id] = len(units)
+                self._unit_lengths[len(units)] += 1
+                self._max_units = max(self._max_units, len(units))
+
+    def remove(self, item_id):
+        with self._lock:
+            count = self._unit_counts.pop(item_id, None)
+            if count is not None:
+                self._unit_lengths[count] -= 1
+                if not self._unit_lengths[count]:
+                    del self._unit_lengths[count]
+                    self._max_units = max(self._unit_lengths, default=0)
+            for key in self._item_keys.pop(item_id, ()):
+                items = self._keys.get(key)
+                if items is None:
+                    continue
+                items.pop(item_id, None)
+                if not items:
+                    del self._keys[key]
+                    if key[0] == 'initials':
+                        pos = bisect.bisect_left(self._initials, key[1])
+                        if pos < len(self._initials) and self._initials[pos] == key[1]:
+                            del self._initials[pos]
+
+    def _prefix(self, prefix):
+        start = bisect.bisect_left(self._initials, prefix)
+        end = bisect.bisect_right(self._initials, prefix + '￿')
+        return self._initials[start:end]
+
+    def search(self, query, limit=5):
+        """返回 [(item_id, score)]，按分数降序"""
+        units = reading_units(query)
+        if not units:
+            return []
+        has_cjk = any(is_cjk for is_cjk, _ in units)
+        readings = expand_readings(units)
+        max_units = self._max_units
+
+        # 先在锁外算出所有要查的键，再在锁内逐个查表
+        lookups = []
+        for reading in readings:
+            keys = reading_keys(reading)
+            # 整句：全拼 / 模糊音；首字母只接受拼音或缩写输入（此时原文即为键）
+            lookups.append(('full', keys['full'], None))
+            lookups.append(('fuzzy', keys['fuzzy'], None))
+            if not has_cjk:
+                lookups.append(('initials', keys['initials'], None))
+                continue
+            # 查询中包含某个游戏名的读音（"我想玩康斯坦斯"），窗口不超过最长的游戏名
+            for i in range(len(reading)):
+                for j in range(i + 2, min(len(reading), i + max_units) + 1):
+                    if i == 0 and j == len(reading):
+                        continue
+                    window = reading_keys(reading[i:j])
+                    lookups.append(('full', window['full'], SCORE_CONTAINED))
+                    lookups.append(('fuzzy', window['fuzzy'], SCORE_CONTAINED))
+
+        # 首字母缩写前缀（"hsd" -> "hsdl"）
+        query_text = ''.join(s for _, s in readings[0])
+        prefix_query = (len(units) == 1 and not has_cjk
+                        and query_text.isalpha() and len(query_text) >= MIN_PREFIX_LENGTH)
+
+        best = {}
+        with self._lock:
+            if prefix_query:
+                lookups.extend(('initials', key, SCORE_PREFIX) for key in self._prefix(query_text))
+            for kind, key, score in lookups:
+                for item_id, item_score in self._keys.get((kind, key), {}).items():
+                    value = item_score if score is None else score
+                    if value > best.get(item_id, 0.0):
+                        best[item_id] = value
+
+        ranked = sorted(best.items(), key=lambda x: (-x[1], x[0]))
+        return ranked[:limit] if limit else ranked
@@ -0,0 +1,259 @@
+"""
+按 token 预算组装提示词
+系统提示、游戏目录上下文、对话历史、用户输入分别有预算；超出时优先丢弃
+最早的历史轮次、截短最长的游戏描述，并记录每次请求各部分的 token 数
+"""
+import threading
+
+from config import Config
+
+# 每条消息在 chat 格式中的固定开销（role、分隔符等）
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# 游戏描述被截短时至少保留的字符数，再短就直接丢弃该游戏
+MIN_DESCRIPTION_CHARS = 16
+
+USER_PLACEHOLDER = '{user_query}'
+CATALOG_PLACEHOLDER = '{catalog}'
+
+# 对话摘要附加在系统提示末尾
+SUMMARY_SECTION = "\n\n以下是与该用户更早对话的摘要，可作为背景参考：\n{summary}"
+
+
+class TokenCounter:
+    """tiktoken 计数；编码文件不可用时退化为按字符估算"""
+
+    def __init__(self, encoding_name=None):
+        self._encoding_name = encoding_name or Config.PROMPT_TOKEN_ENCODING
+        self._encoding = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _get_encoding(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    try:
+                        import tiktoken
+                        self._encoding = tiktoken.get_encoding(self._encoding_name)
+                    except Exception as e:
+                        print(f"⚠️ tiktoken encoding '{self._encoding_name}' unavailable, "
+                              f"using estimation: {type(e).__name__}: {e}")
+                    self._loaded = True
+        return self._encoding
+
+    def count(self, text):
+        if not text:
+            return 0
+        encoding = self._get_encoding()
+        if encoding is not None:
+            return len(encoding.encode(text, disallowed_special=()))
+        # 估算：中文约 1 字 1 token，其余约 4 字符 1 token
+        non_ascii = sum(1 for ch in text if not ch.isascii())
+        return non_ascii + (len(text) - non_ascii + 3) // 4
+
+    def count_message(self, message):
+        tokens = MESSAGE_OVERHEAD_TOKENS + self.count(message.get('content') or '')
+        for tool_call in message.get('tool_calls') or []:
+            tokens += self.count(tool_call['function']['name'])
+            tokens += self.count(tool_call['function']['arguments'])
+        return tokens
+
+    def truncate(self, text, max_tokens):
+        """按 token 截断文本（保留开头）"""
+        if max_tokens <= 0:
+            return ''
+        encoding = self._get_encoding()
+        if encoding is not None:
+            tokens = encoding.encode(text, disallowed_special=())
+            if len(tokens) <= max_tokens:
+                return text
+            return encoding.decode(tokens[:max_tokens])
+        while text and self.count(text) > max_tokens:
+            text = text[:max(1, len(text) * 3 // 4)] if len(text) > 1 else ''
+        return text
+
+
+class CatalogItem:
+    """目录上下文中的一行：固定前缀 + 可截短的描述"""
+
+    __slots__ = ('prefix', 'description')
+
+    def __init__(self, prefix, description):
+        self.prefix = prefix
+        self.description = description or ''
+
+    def render(self):
+        return f"{self.prefix}{self.description}"
+
+
+def split_turn(messages):
+    """把 state["messages"] 拆成 (历史, 当前用户消息, 本轮工具调用消息)"""
+    for i in range(len(messages) - 1, -1, -1):
+        if messages[i].get('role') == 'user':
+            return messages[:i], messages[i], messages[i + 1:]
+    return [], None, list(messages)
+
+
+class PromptStats:
+    """提示词 token 统计"""
+
+    SECTIONS = ('system', 'summary', 'catalog', 'history', 'user', 'tools', 'total')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.sums = {k: 0 for k in self.SECTIONS}
+        self.max_total = 0
+        self.history_turns_dropped = 0
+        self.games_trimmed = 0
+        self.last = None
+
+    def record(self, usage):
+        with self._lock:
+            self.requests += 1
+            for k in self.SECTIONS:
+                self.sums[k] += usage.get(k, 0)
+            self.max_total = max(self.max_total, usage['total'])
+            self.history_turns_dropped += usage['history_dropped']
+            self.games_trimmed += usage['games_trimmed']
+            self.last = usage
+
+    def snapshot(self):
+        with self._lock:
+            n = self.requests
+            return {
+                'requests': n,
+                'avg_tokens': {k: round(v / n, 1) if n else 0 for k, v in self.sums.items()},
+                'max_total_tokens': self.max_total,
+                'history_messages_dropped': self.history_turns_dropped,
+                'games_trimmed': self.games_trimmed,
+                'last': self.last,
+            }
+
+
+class PromptBuilder:
+    """
+    按预算组装 [system] + 历史 + [user] + 本轮工具消息
+
+    system_template 中 {user_query} 和 {catalog} 两个占位符会被替换为截断后的
+    用户输入和裁剪后的目录上下文；模板其余部分不能截断，超出 system 预算时抛出 ValueError
+    （各模板在启动时由 check_system 检查）。传入 summary 时，截断到 summary 预算后附加在系统提示末尾
+    """
+
+    def __init__(self, counter=None, budgets=None):
+        self.counter = counter or TokenCounter()
+        self.budgets = budgets or {
+            'system': Config.PROMPT_BUDGET_SYSTEM,
+            'catalog': Config.PROMPT_BUDGET_CATALOG,
+            'history': Config.PROMPT_BUDGET_HISTORY,
+            'user': Config.PROMPT_BUDGET_USER,
+            'summary': Config.PROMPT_BUDGET_SUMMARY,
+        }
+        self.stats = PromptStats()
+
+    def system_tokens(self, system_template):
+        """模板固定部分（去掉占位符）的 token 数；超出 system 预算时抛出 ValueError"""
+        static = system_template.replace(USER_PLACEHOLDER, '').replace(CATALOG_PLACEHOLDER, '')
+        tokens = self.counter.count(static) + MESSAGE_OVERHEAD_TOKENS
+        if tokens > self.budgets['system']:
+            raise ValueError(f"System prompt template uses {tokens} tokens, over PROMPT_BUDGET_SYSTEM "
+                             f"({self.budgets['system']}): {system_template[:40]!r}")
+        return tokens
+
+    def check_system(self, *templates):
+        """启动时检查各系统提示模板，任一超出 system 预算即抛出 ValueError"""
+        for template in templates:
+            self.system_tokens(template)
+
+    def fit_text(self, text, budget=None):
+        """把用户输入截断到预算内"""
+        return self.counter.truncate(text or '', self.budgets['user'] if budget is None else budget)
+
+    def fit_catalog(self, items, budget=None):
+        """
+        裁剪目录上下文：超预算时反复把最长的描述截短一半，
+        描述已经很短时从末尾（排名最低）丢弃整行。返回 (文本, token 数, 被裁剪的游戏数)
+        """
+        budget = self.budgets['catalog'] if budget is None else budget
+        items = list(items)
+        costs = [self.counter.count(item.render()) + 1 for item in items]
+        total = sum(costs)
+        trimmed = set()
+        while items and total > budget:
+            longest = max(range(len(items)), key=lambda i: len(items[i].description))
+            item = items[longest]
+            if len(item.description) > MIN_DESCRIPTION_CHARS:
+                item.description = item.description[:len(item.description) // 2] + '…'
+                trimmed.add(id(item))
+                new_cost = self.counter.count(item.render()) + 1
+                total += new_cost - costs[longest]
+                costs[longest] = new_cost
+            else:
+                trimmed.add(id(items[-1]))
+                total -= costs.pop()
+                items.pop()
+        text = "\n".join(item.render() for item in items)
+        return text, max(0, total - 1) if items else 0, len(trimmed)
+
+    def fit_history(self, history, budget=None):
+        """从最新的轮次往前保留历史，超预算时丢弃最早的消息。返回 (历史, token 数, 丢弃数)"""
+        budget = self.budgets['history'] if budget is None else budget
+        kept = []
+        used = 0
+        for message in reversed(history):
+            cost = self.counter.count_message(message)
+            if used + cost > budget:
+                break
+            kept.append(message)
+            used += cost
+        kept.reverse()
+        # 保证历史以用户消息开头，避免孤立的助手回复
+        while kept and kept[0].get('role') != 'user':
+            used -= self.counter.count_message(kept.pop(0))
+        return kept, used, len(history) - len(kept)
+
+    def build(self, system_template, messages, catalog_items=(), user_query=None, summary=None,
+              catalog_budget=None):
+        """
+        messages 为 state["messages"]（最近的历史 + 当前用户消息 + 本轮工具消息）
+        summary 为更早对话的摘要（可选）；catalog_budget 覆盖默认的目录上下文预算
+        返回 (发送给模型的消息列表, 各部分 token 用量)
+        """
+        system_tokens = self.system_tokens(system_template)
+        history, user_message, tail = split_turn(messages)
+        user_text = self.fit_text(user_message['content'] if user_message else (user_query or ''))
+        quoted_query = self.fit_text(user_query if user_query is not None else user_text)
+
+        catalog_text, catalog_tokens, games_trimmed = self.fit_catalog(catalog_items, catalog_budget)
+        system_prompt = system_template.replace(USER_PLACEHOLDER, quoted_query) \
+                                       .replace(CATALOG_PLACEHOLDER, catalog_text)
+        summary_text = self.counter.truncate(summary, self.budgets['summary']) if summary else ''
+        if summary_text:
+            system_prompt += SUMMARY_SECTION.format(summary=summary_text)
+
+        kept_history, history_tokens, dropped = self.fit_history(history)
+
+        result = [{"role": "system", "content": system_prompt}] + kept_history
+        if user_message is not None:
+            result.append({"role": "user", "content": user_text})
+        result.extend(tail)
+
+        usage = {
+            'system': system_tokens,
+            'summary': self.counter.count(SUMMARY_SECTION.format(summary=summary_text)) if summary_text else 0,
+            'catalog': catalog_tokens,
+            'history': history_tokens,
+            'user': self.counter.count(user_text) + self.counter.count(quoted_query)
+                    + (MESSAGE_OVERHEAD_TOKENS if user_message is not None else 0),
+            'tools': sum(self.counter.count_message(m) for m in tail),
+            'history_dropped': dropped,
+            'games_trimmed': games_trimmed,
+        }
+        usage['total'] = (usage['system'] + usage['summary'] + usage['catalog'] + usage['history']
+                          + usage['user'] + usage['tools'])
+        self.stats.record(usage)
+        return result, usage
+
+
+prompt_builder = PromptBuilder()
@@ -0,0 +1,130 @@
+"""
+语义搜索
+在游戏目录快照之上维护向量索引（名称、类型、标签、简介），跟随目录增量更新，
+索引持久化到 VECTOR_INDEX_DIR，重启后按内容指纹复用未变化的向量
+"""
+import atexit
+import threading
+
+from config import Config
+from services.category_keywords import CATEGORY_KEYWORDS
+from services.embeddings import HashingEmbedder, VectorIndex, content_hash
+from services.game_catalog import change_action, game_catalog
+
+
+def document_text(record):
+    """参与向量计算的游戏文本"""
+    category = record.category or ''
+    parts = [
+        record.name,
+        record.name_en,
+        ' '.join([category] + CATEGORY_KEYWORDS.get(category, [])),
+        record.tags,
+        record.description,
+    ]
+    return '\n'.join(part for part in parts if part)
+
+
+class SemanticSearchEngine:
+    """跟随目录快照维护的向量索引"""
+
+    def __init__(self, catalog, embedder=None, directory=None):
+        self._catalog = catalog
+        self.embedder = embedder or HashingEmbedder(Config.SEMANTIC_EMBED_DIM)
+        self._directory = Config.VECTOR_INDEX_DIR if directory is None else directory
+        self._lock = threading.RLock()
+        self.index = None
+        self.version = None
+        self._dirty = False
+        self._stats = {'queries': 0, 'embedded': 0, 'reused': 0}
+        catalog.subscribe(self._on_catalog_change)
+
+    def _embed_records(self, records):
+        texts = [document_text(record) for record in records]
+        if texts:
+            self.index.add([record.id for record in records], self.embedder.embed(texts),
+                           [content_hash(text) for text in texts])
+            self._stats['embedded'] += len(texts)
+            self._dirty = True
+
+    def _load_persisted(self):
+        if not self._directory:
+            return None
+        index, meta = VectorIndex.load(self._directory)
+        if index is not None and meta.get('embedder') != self.embedder.name:
+            print(f"⚠️ Vector index was built with {meta.get('embedder')}, rebuilding")
+            return None
+        return index
+
+    def _rebuild(self, snapshot):
+        # 首次构建时优先复用持久化的向量；之后与内存中的索引做差量同步
+        if self.index is None:
+            self.index = self._load_persisted() or VectorIndex(self.embedder.dim)
+        stale = [item_id for item_id in self.index.ids() if item_id not in snapshot.by_id]
+        for item_id in stale:
+            self.index.remove(item_id)
+        changed = [record for record in snapshot.games
+                   if self.index.content_hash_of(record.id) != content_hash(document_text(record))]
+        self._stats['reused'] += len(snapshot.games) - len(changed)
+        self._embed_records(changed)
+        self._dirty = self._dirty or bool(stale)
+        self.version = snapshot.version
+        print(f"🧭 Vector index ready: {len(self.index)} games "
+              f"({len(changed)} embedded, {len(stale)} removed)")
+        self.save()
+
+    def _on_catalog_change(self, event, snapshot, old, new):
+        with self._lock:
+            if self.index is None:
+                # 还没有用过语义搜索，等第一次查询时再构建
+                return
+            action = change_action(self.version, snapshot, event)
+            if action == 'skip':
+                return
+            if action == 'apply' and event == 'upsert':
+                self._embed_records([new])
+                self.version = snapshot.version
+            elif action == 'apply' and event == 'remove':
+                self._dirty = self.index.remove(old.id) or self._dirty
+                self.version = snapshot.version
+            else:
+                self._rebuild(snapshot)
+
+    def _ensure_current(self):
+        snapshot = self._catalog.snapshot()
+        if self.version != snapshot.version:
+            with self._lock:
+                if self.version is None or self.version < snapshot.version:
+                    self._rebuild(snapshot)
+        return snapshot
+
+    def search(self, query, limit=5, min_score=None):
+        """按语义相似度检索，返回 [(GameRecord, 相似度)]"""
+        snapshot = self._ensure_current()
+        self._stats['queries'] += 1
+        min_score = Config.SEMANTIC_MIN_SCORE if min_score is None else min_score
+        hits = self.index.search(self.embedder.embed_one(query), k=limit, min_score=min_score)
+        return [(snapshot.by_id[game_id], score) for game_id, score in hits
+                if game_id in snapshot.by_id]
+
+    def save(self):
+        """把有变化的索引写回磁盘"""
+        with self._lock:
+            if not self._directory or not self._dirty or self.index is None:
+                return
+            try:
+                self.index.save(self._directory, {'embedder': self.embedder.name})
+                self._dirty = False
+            except OSError as e:
+                print(f"⚠️ Failed to save vector index: {type(e).__name__}: {e}")
+
+    def stats(self):
+        data = dict(self._stats)
+        data['indexed'] = len(self.index) if self.index is not None else 0
+        data['mapped'] = bool(self.index is not None and self.index.mapped)
+        data['embedder'] = self.embedder.name
+        return data
+
+
+semantic_search = SemanticSearchEngine(game_catalog)
+atexit.register(semantic_search.save)
@@ -0,0 +1,122 @@
+"""
+请求合并（singleflight）
+同一个键同时只执行一次：第一个请求负责执行，其余并发的相同请求等待并共享结果
+（包括异常）。执行结束后键即释放，不缓存结果
+AsyncSingleFlight 是供 ASGI 入口使用的协程版本
+"""
+import asyncio
+import threading
+
+
+class _Call:
+    __slots__ = ('event', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    do(key, fn)：key 没有正在执行的调用时执行 fn()，否则等待正在执行的调用并返回其结果
+
+    结果对象在所有等待者之间共享，调用方不应修改
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {'calls': 0, 'executions': 0, 'coalesced': 0, 'errors': 0, 'max_waiters': 0}
+
+    def do(self, key, fn):
+        with self._lock:
+            self._stats['calls'] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._stats['executions'] += 1
+            else:
+                call.waiters += 1
+                self._stats['coalesced'] += 1
+                self._stats['max_waiters'] = max(self._stats['max_waiters'], call.waiters)
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            with self._lock:
+                self._stats['errors'] += 1
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data['in_flight'] = len(self._calls)
+        data['coalesced_ratio'] = round(data['coalesced'] / data['calls'], 4) if data['calls'] else 0.0
+        return data
+
+
+class AsyncSingleFlight:
+    """
+    协程版 singleflight：do(key, fn) 中 fn 返回协程，同一个键只创建一个任务
+
+    等待者通过 asyncio.shield 等待，单个客户端断开（任务被取消）不会取消共享的调用
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._tasks = {}
+        self._stats = {'calls': 0, 'executions': 0, 'coalesced': 0, 'errors': 0, 'max_waiters': 0}
+        self._waiters = {}
+
+    def _done(self, key, task):
+        self._tasks.pop(key, None)
+        self._waiters.pop(key, None)
+        if not task.cancelled() and task.exception() is not None:
+            self._stats['errors'] += 1
+
+    async def do(self, key, fn):
+        self._stats['calls'] += 1
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._tasks[key] = task
+            self._waiters[key] = 0
+            self._stats['executions'] += 1
+            task.add_done_callback(lambda t: self._done(key, t))
+        else:
+            self._waiters[key] += 1
+            self._stats['coalesced'] += 1
+            self._stats['max_waiters'] = max(self._stats['max_waiters'], self._waiters[key])
+        return await asyncio.shield(task)
+
+    def stats(self):
+        data = dict(self._stats)
+        data['in_flight'] = len(self._tasks)
+        data['coalesced_ratio'] = round(data['coalesced'] / data['calls'], 4) if data['calls'] else 0.0
+        return data
+
+
+# 目录搜索（键：归一化查询 + 目录版本）
+search_flight = SingleFlight('search')
+
+# 意图分析的 LLM 调用（键：归一化查询 + 目录版本）
+intent_flight = SingleFlight('intent')
+
+# ASGI 入口的意图分析调用
+async_intent_flight = AsyncSingleFlight('intent_async')
@@ -0,0 +1,107 @@
+"""
+推测执行
+在 LLM 做意图分析的同时，用用户原话先把目录搜索跑起来；
+模型返回的工具参数与原话一致时直接复用结果，否则丢弃
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import Config
+from services.intent_router import normalize_query
+
+
+class SpeculativeResult:
+    """一次推测执行的句柄"""
+
+    def __init__(self, query):
+        self.query = query
+        self.key = normalize_query(query)
+        self.future = None
+        self.duration_ms = None
+
+    def run(self, fn):
+        start = time.perf_counter()
+        try:
+            return fn(self.query)
+        finally:
+            self.duration_ms = (time.perf_counter() - start) * 1000
+
+    def matches(self, query):
+        return normalize_query(query) == self.key
+
+
+class SpeculativeSearch:
+    """
+    推测搜索执行器
+
+    start(query, fn) 在线程池中执行 fn(query)，返回句柄；
+    take(handle, query) 在模型给出的查询与原话一致时返回结果（必要时等待），
+    不一致时返回 None 并记为未命中；discard(handle) 在不需要搜索时丢弃结果
+    """
+
+    def __init__(self, max_workers=None):
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or Config.SPECULATION_WORKERS,
+            thread_name_prefix='speculative-search'
+        )
+        self._lock = threading.Lock()
+        self._stats = {
+            'started': 0,
+            'hits': 0,
+            'misses': 0,
+            'discarded': 0,
+            'errors': 0,
+            'time_saved_ms': 0.0,
+        }
+
+    def _bump(self, key, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def start(self, query, fn):
+        self._bump('started')
+        handle = SpeculativeResult(query)
+        handle.future = self._executor.submit(handle.run, fn)
+        return handle
+
+    def take(self, handle, query):
+        if handle is None:
+            return None
+        if not handle.matches(query):
+            self._bump('misses')
+            handle.future.cancel()
+            return None
+        waited_from = time.perf_counter()
+        try:
+            result = handle.future.result()
+        except Exception as e:
+            print(f"⚠️ Speculative search failed: {type(e).__name__}: {e}")
+            self._bump('errors')
+            return None
+        # 节省的时间 = 搜索耗时 - LLM 返回后仍需等待搜索的时间
+        waited_ms = (time.perf_counter() - waited_from) * 1000
+        self._bump('hits')
+        self._bump('time_saved_ms', max(0.0, (handle.duration_ms or 0.0) - waited_ms))
+        return result
+
+    def discard(self, handle):
+        if handle is None:
+            return
+        handle.future.cancel()
+        self._bump('discarded')
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+        resolved = data['hits'] + data['misses'] + data['discarded']
+        data['hit_rate'] = round(data['hits'] / resolved, 4) if resolved else 0.0
+        data['time_saved_ms'] = round(data['time_saved_ms'], 2)
+        data['avg_time_saved_ms'] = round(data['time_saved_ms'] / data['hits'], 2) if data['hits'] else 0.0
+        return data
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+speculative_search = SpeculativeSearch()
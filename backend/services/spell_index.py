@@ -0,0 +1,143 @@
+"""
+拼写纠错索引（SymSpell）
+对游戏名/英文名中的英文单词预先生成编辑距离 2 以内的删除变体，
+查询词同样生成删除变体后查表，再用 Damerau-Levenshtein 距离校验，
+不需要扫描整个词表
+"""
+import re
+import threading
+
+MAX_EDIT_DISTANCE = 2
+
+# 太短的词容错空间小，按长度限制最大编辑距离
+_SHORT_WORD_LENGTH = 4
+
+_WORD_PATTERN = re.compile(r'[a-z0-9]+')
+
+
+def words(text):
+    return _WORD_PATTERN.findall((text or '').lower())
+
+
+def max_distance_for(word):
+    if len(word) <= 2:
+        return 0
+    return 1 if len(word) <= _SHORT_WORD_LENGTH else MAX_EDIT_DISTANCE
+
+
+def deletes(word, distance):
+    """word 删除最多 distance 个字符得到的所有变体（含自身）"""
+    result = {word}
+    frontier = {word}
+    for _ in range(distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w)) if len(w) > 1}
+        result |= frontier
+    return result
+
+
+def edit_distance(a, b, limit=MAX_EDIT_DISTANCE):
+    """Damerau-Levenshtein（相邻交换算一次编辑）；超过 limit 时返回 limit + 1"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2 = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if (prev2 is not None and i > 1 and j > 1
+                    and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1] if prev[-1] <= limit else limit + 1
+
+
+class SymSpellIndex:
+    """
+    词表 + 删除变体表，支持增量增删
+
+    词频按出现该词的条目数计，纠错时距离相同取词频高的
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._counts = {}
+        self._deletes = {}
+        self._item_words = {}
+        self.version = None
+
+    def __len__(self):
+        return len(self._counts)
+
+    def add(self, item_id, texts):
+        with self._lock:
+            self.remove(item_id)
+            item_words = set()
+            for text in texts:
+                item_words.update(w for w in words(text) if not w.isdigit())
+            for word in item_words:
+                count = self._counts.get(word, 0)
+                self._counts[word] = count + 1
+                if count == 0:
+                    for variant in deletes(word, max_distance_for(word)):
+                        self._deletes.setdefault(variant, set()).add(word)
+            self._item_words[item_id] = item_words
+
+    def remove(self, item_id):
+        with self._lock:
+            for word in self._item_words.pop(item_id, ()):
+                count = self._counts[word] - 1
+                if count:
+                    self._counts[word] = count
+                    continue
+                del self._counts[word]
+                for variant in deletes(word, max_distance_for(word)):
+                    bucket = self._deletes.get(variant)
+                    if bucket is not None:
+                        bucket.discard(word)
+                        if not bucket:
+                            del self._deletes[variant]
+
+    def lookup(self, word, limit=3):
+        """返回 [(候选词, 编辑距离)]，按距离、词频排序；词表中已有的词返回 [(word, 0)]"""
+        word = word.lower()
+        with self._lock:
+            if word in self._counts:
+                return [(word, 0)]
+            distance = max_distance_for(word)
+            if not distance:
+                return []
+            candidates = set()
+            for variant in deletes(word, distance):
+                candidates.update(self._deletes.get(variant, ()))
+            scored = []
+            for candidate in candidates:
+                d = edit_distance(word, candidate, min(distance, max_distance_for(candidate)))
+                if d <= min(distance, max_distance_for(candidate)):
+                    scored.append((candidate, d, self._counts[candidate]))
+        scored.sort(key=lambda x: (x[1], -x[2], x[0]))
+        return [(candidate, d) for candidate, d, _ in scored[:limit]]
+
+    def correct(self, text):
+        """
+        逐词纠正文本中的英文单词，返回纠正后的文本；没有需要纠正的词时返回 None
+        非英文部分原样保留
+        """
+        changed = False
+
+        def replace(match):
+            nonlocal changed
+            word = match.group()
+            if word.isdigit():
+                return word
+            hits = self.lookup(word, limit=1)
+            if hits and hits[0][1] > 0:
+                changed = True
+                return hits[0][0]
+            return word
+
+        corrected = _WORD_PATTERN.sub(replace, (text or '').lower())
+        return corrected if changed else None
@@ -0,0 +1,60 @@
+"""
+流式回复统计
+记录完成、中途断开（客户端关闭页面）和出错的流式回复数量；
+断开时按已完成回复的平均长度估算因提前终止上游生成而省下的 token
+"""
+import threading
+
+
+class StreamStats:
+    """流式回复统计（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = 0
+        self.completed = 0
+        self.abandoned = 0
+        self.errors = 0
+        self.completion_tokens = 0
+        self.abandoned_tokens = 0
+        self.tokens_saved = 0
+
+    def begin(self):
+        with self._lock:
+            self.started += 1
+
+    def complete(self, tokens):
+        with self._lock:
+            self.completed += 1
+            self.completion_tokens += tokens
+
+    def abandon(self, tokens):
+        """tokens：断开前已生成的 token 数"""
+        with self._lock:
+            self.abandoned += 1
+            self.abandoned_tokens += tokens
+            if self.completed:
+                average = self.completion_tokens / self.completed
+                self.tokens_saved += max(0, round(average - tokens))
+
+    def error(self):
+        with self._lock:
+            self.errors += 1
+
+    def snapshot(self):
+        with self._lock:
+            finished = self.completed + self.abandoned + self.errors
+            return {
+                'started': self.started,
+                'in_progress': self.started - finished,
+                'completed': self.completed,
+                'abandoned': self.abandoned,
+                'errors': self.errors,
+                'abandon_rate': round(self.abandoned / finished, 4) if finished else 0.0,
+                'avg_completion_tokens': round(self.completion_tokens / self.completed, 1) if self.completed else 0.0,
+                'abandoned_tokens_generated': self.abandoned_tokens,
+                'estimated_tokens_saved': self.tokens_saved,
+            }
+
+
+stream_stats = StreamStats()
@@ -0,0 +1,220 @@
+"""
+对话滚动摘要
+较早的对话轮次由后台线程增量压缩成每个用户一条摘要，
+聊天时提示词只带摘要 + 最近几轮，长对话的每轮提示词大小保持不变
+"""
+import queue
+import threading
+from collections import OrderedDict
+
+from config import Config
+from database.models import ChatHistory, ConversationSummary, SessionLocal
+from services.llm_client import llm_clients
+
+SUMMARY_PROMPT = """你负责压缩一段用户与游戏库助手的对话，供后续对话参考。
+
+已有摘要：
+{previous}
+
+新增对话：
+{transcript}
+
+请输出更新后的摘要：
+1. 保留用户的游戏偏好、提到过的游戏名、已推荐过的游戏和未解决的问题
+2. 使用第三人称，简洁客观，不超过 {max_chars} 字
+3. 只输出摘要本身"""
+
+# 送入摘要模型时每条消息最多保留的字符数
+TRANSCRIPT_MESSAGE_CHARS = 300
+
+
+class ConversationSummarizer:
+    """
+    滚动摘要服务
+
+    - get(user_id)：读取 (摘要, 摘要覆盖到的最后一条历史 id)，进程内缓存，未命中时查询一次数据库
+    - schedule(user_id)：每轮对话保存后调用，放入后台队列，不阻塞请求
+    - 后台线程：最近 keep_recent 条之外、尚未进入摘要的消息达到 batch_size 条时，
+      连同旧摘要一起交给 LLM 生成新摘要并写回 conversation_summaries
+    - 每次最多合并 pass_size 条，积压更多时（上线前已有大量历史的用户）重新排队，
+      下一次从新的 last_history_id 继续
+    """
+
+    def __init__(self, session_factory=SessionLocal, keep_recent=None, batch_size=None,
+                 cache_size=None, pass_size=None):
+        self._session_factory = session_factory
+        self.keep_recent = keep_recent or Config.HISTORY_WINDOW_MESSAGES
+        self.batch_size = batch_size or Config.SUMMARY_BATCH_MESSAGES
+        self.pass_size = max(pass_size or Config.SUMMARY_PASS_MESSAGES, self.batch_size)
+        self._cache_size = cache_size or Config.SUMMARY_CACHE_SIZE
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {'scheduled': 0, 'summarized': 0, 'skipped': 0, 'errors': 0, 'stale': 0}
+
+    def _count(self, name):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    # ---- 缓存 ----
+
+    def _cache_get(self, user_id):
+        with self._cache_lock:
+            if user_id in self._cache:
+                self._cache.move_to_end(user_id)
+                return True, self._cache[user_id]
+            return False, None
+
+    def _cache_put(self, user_id, entry):
+        with self._cache_lock:
+            self._cache[user_id] = entry
+            self._cache.move_to_end(user_id)
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+
+    def invalidate(self, user_id):
+        """清空对话历史时调用"""
+        with self._cache_lock:
+            self._cache.pop(user_id, None)
+
+    def get(self, user_id, db=None):
+        """获取用户的 (摘要文本, 已摘要的最后一条历史 id)，没有摘要时返回 (None, 0)"""
+        hit, entry = self._cache_get(user_id)
+        if hit:
+            return entry
+        own_session = db is None
+        db = db or self._session_factory()
+        try:
+            row = db.query(ConversationSummary.summary, ConversationSummary.last_history_id)\
+                .filter(ConversationSummary.user_id == user_id)\
+                .first()
+        finally:
+            if own_session:
+                db.close()
+        entry = (row[0], row[1] or 0) if row else (None, 0)
+        self._cache_put(user_id, entry)
+        return entry
+
+    # ---- 后台任务 ----
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='conversation-summarizer',
+                                                daemon=True)
+                self._worker.start()
+
+    def schedule(self, user_id):
+        """登记一个需要检查是否该做摘要的用户（同一用户排队期间只登记一次）"""
+        if not Config.SUMMARY_ENABLED:
+            return
+        with self._pending_lock:
+            if user_id in self._pending:
+                return
+            self._pending.add(user_id)
+        self._count('scheduled')
+        self._ensure_worker()
+        self._queue.put(user_id)
+
+    def _run(self):
+        while True:
+            user_id = self._queue.get()
+            with self._pending_lock:
+                self._pending.discard(user_id)
+            try:
+                self._count('summarized' if self.summarize(user_id) else 'skipped')
+            except Exception as e:
+                self._count('errors')
+                print(f"⚠️ Summarize failed for user {user_id}: {type(e).__name__}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _pending_messages(self, user_id):
+        """返回 (摘要行, 本次要合并的消息, 是否可能还有更多)"""
+        db = self._session_factory()
+        try:
+            row = db.query(ConversationSummary.summary, ConversationSummary.last_history_id)\
+                .filter(ConversationSummary.user_id == user_id)\
+                .first()
+            last_id = (row[1] or 0) if row else 0
+
+            # 最近 keep_recent 条会原样放进提示词，不参与摘要；多取 keep_recent 条用来排除它们
+            fetch = self.pass_size + self.keep_recent
+            newer = db.query(ChatHistory.id, ChatHistory.role, ChatHistory.content)\
+                .filter(ChatHistory.user_id == user_id, ChatHistory.id > last_id)\
+                .order_by(ChatHistory.id.asc())\
+                .limit(fetch)\
+                .all()
+        finally:
+            db.close()
+        older = newer[:len(newer) - self.keep_recent]
+        return row, last_id, older, len(newer) == fetch
+
+    def summarize(self, user_id):
+        """把尚未摘要的较早消息（最多 pass_size 条）并入摘要；没有足够的新消息时返回 False"""
+        row, last_id, older, more = self._pending_messages(user_id)
+        if len(older) < self.batch_size:
+            return False
+
+        # 调用 LLM 期间不占用数据库连接
+        transcript = "\n".join(
+            f"{'用户' if h.role == 'user' else '助手'}：{(h.content or '')[:TRANSCRIPT_MESSAGE_CHARS]}"
+            for h in older
+        )
+        prompt = SUMMARY_PROMPT.format(
+            previous=row[0] if row else '（无）',
+            transcript=transcript,
+            max_chars=Config.SUMMARY_MAX_CHARS
+        )
+        response = llm_clients.get_client().chat.completions.create(
+            model=Config.SUMMARY_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.3
+        )
+        summary = (response.choices[0].message.content or '').strip()
+        if not summary:
+            return False
+
+        db = self._session_factory()
+        try:
+            current = db.query(ConversationSummary)\
+                .filter(ConversationSummary.user_id == user_id)\
+                .first()
+            # 期间摘要已被更新，或历史已被清空：丢弃这次结果
+            if ((current.last_history_id or 0) if current else 0) != last_id \
+                    or db.get(ChatHistory, older[-1].id) is None:
+                self._count('stale')
+                return False
+            if current is None:
+                current = ConversationSummary(user_id=user_id, message_count=0)
+                db.add(current)
+            current.summary = summary
+            current.last_history_id = older[-1].id
+            current.message_count = (current.message_count or 0) + len(older)
+            db.commit()
+            self._cache_put(user_id, (summary, current.last_history_id))
+        finally:
+            db.close()
+        print(f"📝 Conversation summary updated for user {user_id} (+{len(older)} messages)")
+
+        if more:
+            self.schedule(user_id)
+        return True
+
+    def stats(self):
+        with self._stats_lock:
+            data = dict(self._stats)
+        data['queue_size'] = self._queue.qsize()
+        with self._cache_lock:
+            data['cached_users'] = len(self._cache)
+        return data
+
+
+conversation_summarizer = ConversationSummarizer()
@@ -0,0 +1,44 @@
+"""
+工具调用执行
+模型一次返回多个工具调用时在有界线程池中并发执行，并合并去重搜索结果
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from config import Config
+
+tool_executor = ThreadPoolExecutor(
+    max_workers=Config.TOOL_CALL_WORKERS,
+    thread_name_prefix='tool-call'
+)
+
+
+def run_tool_calls(calls, execute):
+    """
+    并发执行工具调用，按原顺序返回结果
+    calls 为参数元组列表，execute(*call) 执行单个调用；只有一个调用时直接在当前线程执行
+    """
+    if len(calls) <= 1:
+        return [execute(*call) for call in calls]
+    futures = [tool_executor.submit(execute, *call) for call in calls]
+    return [future.result() for future in futures]
+
+
+def merge_ranked(result_lists, key=lambda item: item['id'], limit=None):
+    """
+    合并多路排序结果并去重（倒数排名融合 RRF）
+    在多路结果中都靠前的条目排在最前；同分时保持首次出现的顺序
+    """
+    scores = {}
+    items = {}
+    first_seen = {}
+    for results in result_lists:
+        for rank, item in enumerate(results or []):
+            k = key(item)
+            if k not in items:
+                items[k] = item
+                first_seen[k] = len(first_seen)
+            scores[k] = scores.get(k, 0.0) + 1.0 / (60 + rank)
+    ordered = sorted(items, key=lambda k: (-scores[k], first_seen[k]))
+    if limit:
+        ordered = ordered[:limit]
+    return [items[k] for k in ordered]
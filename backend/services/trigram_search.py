@@ -0,0 +1,119 @@
+"""
+Postgres pg_trgm 搜索
+name / name_en / description 上建有 gin_trgm_ops 索引（见 alembic 迁移 f3c8d1a95b27），
+子串匹配（ILIKE）和相似度匹配（% 运算符）都走索引，在数据库中排序并限制条数；
+目录很大时替代逐条计算相似度的进程内回退
+"""
+import threading
+
+from sqlalchemy import case, func, literal, or_, text
+
+from config import Config
+from database.models import Game, SessionLocal, engine
+
+# 排序权重：名称子串命中 > 名称相似 > 描述子串命中 > 描述词相似
+WEIGHT_NAME_CONTAINS = 1.0
+WEIGHT_DESCRIPTION_CONTAINS = 0.6
+WEIGHT_DESCRIPTION_WORD = 0.5
+
+
+def like_pattern(query):
+    """ILIKE '%query%'，转义通配符"""
+    escaped = query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+
+def trigram_query(db, query, limit):
+    """返回 [(Game, score)]；调用前需在同一事务中设置 similarity_threshold"""
+    pattern = like_pattern(query)
+    q = literal(query)
+    name_en = func.coalesce(Game.name_en, '')
+    description = func.coalesce(Game.description, '')
+    name_contains = or_(Game.name.ilike(pattern, escape='\\'), Game.name_en.ilike(pattern, escape='\\'))
+    description_contains = Game.description.ilike(pattern, escape='\\')
+    score = func.greatest(
+        case((name_contains, WEIGHT_NAME_CONTAINS), else_=0.0),
+        func.similarity(Game.name, q),
+        func.similarity(name_en, q),
+        case((description_contains, WEIGHT_DESCRIPTION_CONTAINS), else_=0.0),
+        func.word_similarity(q, description) * WEIGHT_DESCRIPTION_WORD,
+    ).label('score')
+    return db.query(Game, score)\
+        .filter(or_(
+            name_contains,
+            description_contains,
+            Game.name.op('%')(q),
+            Game.name_en.op('%')(q),
+        ))\
+        .order_by(score.desc(), Game.id)\
+        .limit(limit)\
+        .all()
+
+
+class TrigramSearch:
+    """按配置和目录规模决定是否使用 pg_trgm；扩展是否可用只检测一次"""
+
+    def __init__(self, engine=engine, session_factory=SessionLocal):
+        self._engine = engine
+        self._session_factory = session_factory
+        self._available = None
+        self._lock = threading.Lock()
+        self._stats = {'searches': 0, 'errors': 0}
+
+    def available(self):
+        if self._available is None:
+            with self._lock:
+                if self._available is None:
+                    self._available = self._detect()
+        return self._available
+
+    def _detect(self):
+        if self._engine.dialect.name != 'postgresql':
+            return False
+        try:
+            with self._engine.connect() as conn:
+                installed = conn.execute(
+                    text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+                ).first()
+            if not installed:
+                print("⚠️ pg_trgm extension not installed, using in-memory fuzzy search")
+            return bool(installed)
+        except Exception as e:
+            print(f"⚠️ pg_trgm detection failed: {type(e).__name__}: {e}")
+            return False
+
+    def enabled(self, catalog_size):
+        mode = Config.SEARCH_TRIGRAM
+        if mode == 'off':
+            return False
+        if mode != 'on' and catalog_size < Config.TRIGRAM_MIN_GAMES:
+            return False
+        return self.available()
+
+    def search(self, query, limit=20, db=None, threshold=None):
+        """返回 [(Game, score)]，按分数降序"""
+        threshold = Config.TRIGRAM_THRESHOLD if threshold is None else threshold
+        own_session = db is None
+        db = db or self._session_factory()
+        try:
+            # SET LOCAL 只作用于当前事务，不影响连接池中的其他请求
+            db.execute(text(f"SET LOCAL pg_trgm.similarity_threshold = {float(threshold)}"))
+            results = trigram_query(db, query, limit)
+            self._stats['searches'] += 1
+            return results
+        except Exception:
+            self._stats['errors'] += 1
+            raise
+        finally:
+            if own_session:
+                db.close()
+
+    def stats(self):
+        data = dict(self._stats)
+        data['available'] = self._available
+        data['mode'] = Config.SEARCH_TRIGRAM
+        data['min_games'] = Config.TRIGRAM_MIN_GAMES
+        return data
+
+
+trigram_search = TrigramSearch()
@@ -0,0 +1,102 @@
+"""
+带过期时间的 LRU 缓存
+用于缓存工具调用结果和意图分析的决策；键中包含目录版本，
+目录变化时整体清空，避免返回已删除或已改名的游戏
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from config import Config
+from services.game_catalog import game_catalog
+
+
+class TTLCache:
+    """线程安全的 LRU + TTL 缓存；maxsize <= 0 时禁用（不加锁、不存储、不计统计）"""
+
+    def __init__(self, name, maxsize, ttl):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        """返回 (是否命中, 值)"""
+        if self.maxsize <= 0:
+            return False, None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._data.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return True, value
+                del self._data[key]
+                self._stats['expirations'] += 1
+            self._stats['misses'] += 1
+            return False, None
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._stats['invalidations'] += 1
+
+    def get_or_compute(self, key, compute, flight=None):
+        """
+        命中时直接返回；未命中时执行 compute() 并写入缓存
+        传入 flight（SingleFlight）时，相同键的并发未命中只执行一次（缓存禁用时同样合并）
+        """
+        if self.maxsize <= 0:
+            return flight.do(key, compute) if flight is not None else compute()
+        hit, value = self.get(key)
+        if hit:
+            return value
+
+        def load():
+            result = compute()
+            self.set(key, result)
+            return result
+
+        return flight.do(key, load) if flight is not None else load()
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data['size'] = len(self._data)
+        lookups = data['hits'] + data['misses']
+        data['hit_rate'] = round(data['hits'] / lookups, 4) if lookups else 0.0
+        data['maxsize'] = self.maxsize
+        data['ttl_seconds'] = self.ttl
+        return data
+
+
+# 搜索类工具的结果（键：工具名 + 归一化查询 + 目录版本）
+tool_result_cache = TTLCache('tool_results', Config.TOOL_CACHE_SIZE, Config.TOOL_CACHE_TTL)
+
+# 第一步 LLM 意图分析返回的决策（键：归一化查询 + 目录版本）
+intent_cache = TTLCache('intent', Config.INTENT_CACHE_SIZE, Config.INTENT_CACHE_TTL)
+
+
+def _on_catalog_change(event, snapshot, old, new):
+    tool_result_cache.clear()
+    intent_cache.clear()
+
+
+game_catalog.subscribe(_on_catalog_change)
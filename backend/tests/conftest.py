@@ -0,0 +1,58 @@
+"""
+测试公共配置
+导入应用代码之前把 DATABASE_URL 指向临时目录中的 SQLite 文件，所有测试共用这个库，
+每个用到数据库的测试开始前清空各表
+"""
+import os
+import sys
+import tempfile
+
+_TMP_DIR = tempfile.mkdtemp(prefix='ltygames-tests-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_TMP_DIR, 'test.db')
+os.environ['VECTOR_INDEX_DIR'] = os.path.join(_TMP_DIR, 'vector_index')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+
+from database.models import Base, Game, SessionLocal, User, engine  # noqa: E402
+
+
+@pytest.fixture(scope='session', autouse=True)
+def schema():
+    Base.metadata.create_all(engine)
+    yield
+    engine.dispose()
+
+
+@pytest.fixture
+def db():
+    """清空所有表后返回一个会话"""
+    with engine.begin() as conn:
+        for table in reversed(Base.metadata.sorted_tables):
+            conn.execute(table.delete())
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def user(db):
+    user = User(user_key='test-user')
+    db.add(user)
+    db.commit()
+    return user
+
+
+@pytest.fixture
+def games(db):
+    rows = [
+        Game(name='星露谷物语', name_en='Stardew Valley', category='模拟', description='温馨的农场经营模拟游戏'),
+        Game(name='杀戮尖塔', name_en='Slay the Spire', category='肉鸽', description='卡牌构筑肉鸽游戏'),
+        Game(name='艾尔登法环', name_en='Elden Ring', category='动作', description='开放世界魂系动作游戏'),
+    ]
+    db.add_all(rows)
+    db.commit()
+    return rows
@@ -0,0 +1,146 @@
+import json
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+from sqlalchemy import event
+
+from config import Config
+from database.models import ChatHistory, ChatHistoryGame, engine
+from routes.chat_history_routes import bp, export_history
+from services.history_writer import history_writer
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.register_blueprint(bp)
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def histories(db, user, games):
+    """5 条消息，第 2 条关联两款游戏"""
+    start = datetime(2026, 1, 1)
+    rows = [ChatHistory(user_id=user.id, role='user' if i % 2 == 0 else 'assistant',
+                        content=f'消息{i}', created_at=start + timedelta(minutes=i))
+            for i in range(5)]
+    rows[1].game_links = [ChatHistoryGame(game_id=games[1].id, position=0),
+                          ChatHistoryGame(game_id=games[0].id, position=1)]
+    db.add_all(rows)
+    db.commit()
+    return [row.id for row in rows]
+
+
+@contextmanager
+def count_queries():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def _pages(client, limit):
+    """按 next_before_id 一直向前翻页，返回每页的消息 id"""
+    pages, before_id = [], None
+    while True:
+        url = f'/api/chat/history/test-user?limit={limit}'
+        if before_id is not None:
+            url += f'&before_id={before_id}'
+        data = client.get(url).get_json()
+        pages.append([history['id'] for history in data['histories']])
+        before_id = data['next_before_id']
+        assert data['has_more'] == (before_id is not None)
+        if before_id is None:
+            return pages
+
+
+def test_history_page_uses_two_queries(client, histories):
+    # 用户查询 + 一条带 JOIN 的分页查询；游戏不再逐条查询，翻页游标也在同一条查询中
+    for url in ('/api/chat/history/test-user', f'/api/chat/history/test-user?limit=2&before_id={histories[3]}'):
+        with count_queries() as statements:
+            data = client.get(url).get_json()
+        assert data['success']
+        assert len(statements) == 2
+
+    data = client.get('/api/chat/history/test-user').get_json()
+    assert [game['name'] for game in data['histories'][1]['games']] == ['杀戮尖塔', '星露谷物语']
+
+
+def test_history_pages_cover_every_message_once(client, histories):
+    assert _pages(client, 2) == [histories[3:5], histories[1:3], histories[0:1]]
+    # 页大小等于消息数：一页取完，没有下一页
+    assert _pages(client, 5) == [histories]
+    assert _pages(client, 4) == [histories[1:5], histories[0:1]]
+
+
+def test_history_limit_is_capped(client, histories, monkeypatch):
+    monkeypatch.setattr(Config, 'HISTORY_PAGE_MAX', 3)
+    assert _pages(client, 100) == [histories[2:5], histories[0:2]]
+
+
+def test_history_pages_break_created_at_ties_by_id(client, db, user):
+    same_time = datetime(2026, 1, 1)
+    rows = [ChatHistory(user_id=user.id, role='user', content=f'消息{i}', created_at=same_time) for i in range(5)]
+    db.add_all(rows)
+    db.commit()
+    ids = [row.id for row in rows]
+    assert _pages(client, 2) == [ids[3:5], ids[1:3], ids[0:1]]
+
+
+def test_history_before_the_first_message(client, histories):
+    data = client.get(f'/api/chat/history/test-user?before_id={histories[0]}').get_json()
+    assert (data['histories'], data['has_more'], data['next_before_id']) == ([], False, None)
+
+
+def test_history_rejects_invalid_paging(client, user):
+    for query in ('limit=0', 'limit=abc', 'before_id=-1'):
+        assert client.get(f'/api/chat/history/test-user?{query}').status_code == 400
+    assert client.get('/api/chat/history/nobody').status_code == 404
+
+
+def test_export_streams_all_history_in_order(client, histories):
+    response = client.get('/api/chat/history/test-user/export')
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [line['id'] for line in lines] == histories
+    assert [game['name'] for game in lines[1]['games']] == ['杀戮尖塔', '星露谷物语']
+
+
+def test_export_holds_no_connection_until_the_body_is_read(app, db, histories):
+    db.close()
+    checked_out = engine.pool.checkedout()
+    # 直接调用视图拿到未读取的响应（测试客户端会先读取第一块）
+    with app.test_request_context('/api/chat/history/test-user/export'):
+        response = export_history('test-user')
+    try:
+        assert engine.pool.checkedout() == checked_out
+    finally:
+        response.close()
+    assert engine.pool.checkedout() == checked_out
+
+
+def test_export_unknown_user(client, db):
+    checked_out = engine.pool.checkedout()
+    assert client.get('/api/chat/history/nobody/export').status_code == 404
+    assert engine.pool.checkedout() == checked_out
+
+
+def test_saved_message_is_committed_with_its_id(client, db, user, monkeypatch):
+    monkeypatch.setattr(history_writer, 'write_behind', True)
+    data = client.post('/api/chat/history/test-user', json={'role': 'user', 'content': '你好'}).get_json()
+    assert data['success'] and data['history']['id'] is not None
+    # 不等后台线程，行已经提交
+    assert [(row.id, row.content) for row in db.query(ChatHistory)] == [(data['history']['id'], '你好')]
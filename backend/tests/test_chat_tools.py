@@ -0,0 +1,71 @@
+import pytest
+
+from routes import chat_routes_langgraph as chat
+from services.game_catalog import game_catalog
+from services.ttl_cache import tool_result_cache
+
+
+@pytest.fixture
+def catalog(games):
+    game_catalog.reload()
+    tool_result_cache.clear()
+    yield game_catalog.snapshot()
+    tool_result_cache.clear()
+
+
+def test_query_variants_share_one_search_on_the_original_text(catalog, monkeypatch):
+    searched = []
+
+    def fake_search(query):
+        searched.append(query)
+        return [{'id': 1, 'name': query}], None
+
+    monkeypatch.setattr(chat, 'search_games_tool', fake_search)
+    first = chat.coalesced_search('《星露谷物语》吗？')
+    second = chat.coalesced_search('星露谷物语')
+    # 归一化只用于合并键，搜索收到的是用户的原话
+    assert searched == ['《星露谷物语》吗？']
+    assert first == second
+
+
+def test_intent_request_carries_the_original_text(catalog, monkeypatch):
+    sent = []
+
+    class FakeCompletions:
+        def create(self, **kwargs):
+            sent.append(kwargs['messages'][-1]['content'])
+            raise RuntimeError('stop after the request is built')
+
+    class FakeClient:
+        chat = type('Chat', (), {'completions': FakeCompletions()})()
+
+    monkeypatch.setattr(chat, 'get_openai_client', lambda: FakeClient())
+    monkeypatch.setattr(chat, 'route_fast_path', lambda state: None)
+    with pytest.raises(RuntimeError):
+        chat.analyze_and_call_tools(chat.new_state([], '《星露谷物语》好玩吗？', None), speculate=False)
+    assert sent == ['《星露谷物语》好玩吗？']
+
+
+def test_fallback_list_is_not_cached(catalog, monkeypatch):
+    monkeypatch.setattr(chat, 'search_games_tool', lambda query: ([], None))
+    results, all_games, _did_you_mean = chat.coalesced_search('不存在的游戏')
+    assert results == []
+    assert [g['name'] for g in all_games] == [g.name for g in catalog.games]
+    assert list(tool_result_cache._data.values())[0][1] == ([], None)
+
+
+def test_fallback_list_is_truncated(catalog, monkeypatch):
+    monkeypatch.setattr(chat, 'TOOL_RESULT_LIST_LIMIT', 2)
+    monkeypatch.setattr(chat, 'search_games_tool', lambda query: ([], None))
+    _results, all_games, _did_you_mean = chat.coalesced_search('不存在的游戏')
+    assert len(all_games) == 2
+
+
+def test_did_you_mean_only_when_the_correction_was_used(catalog):
+    correct = chat.execute_tool('search_games', {'query': 'Stardew Valley'})
+    assert [g['name'] for g in correct['games']] == ['星露谷物语']
+    assert correct['did_you_mean'] is None
+
+    misspelled = chat.execute_tool('search_games', {'query': 'Stardew Vallee'})
+    assert [g['name'] for g in misspelled['games']] == ['星露谷物语']
+    assert misspelled['did_you_mean'] == 'stardew valley'
@@ -0,0 +1,64 @@
+import os
+import threading
+import time
+
+import numpy as np
+
+from services import embeddings
+from services.embeddings import INDEX_POINTER, VectorIndex
+
+
+def _index(size, dim=8):
+    index = VectorIndex(dim)
+    vectors = np.eye(size, dim, dtype=np.float32)
+    index.add(list(range(1, size + 1)), vectors, list(range(size)))
+    return index
+
+
+def _versions(directory):
+    return sorted(name for name in os.listdir(directory) if name.startswith(embeddings.INDEX_VERSION_PREFIX))
+
+
+def test_load_reads_the_latest_save(tmp_path):
+    directory = str(tmp_path)
+    _index(2).save(directory, {'embedder': 'test'})
+    _index(3).save(directory, {'embedder': 'test'})
+
+    index, meta = VectorIndex.load(directory)
+    assert (len(index), meta['count'], meta['embedder']) == (3, 3, 'test')
+    assert index.mapped
+    assert [item_id for item_id, _score in index.search(np.eye(1, 8, 2, dtype=np.float32)[0], k=1)] == [3]
+
+
+def test_missing_index_loads_as_none(tmp_path):
+    assert VectorIndex.load(str(tmp_path)) == (None, None)
+
+
+def test_concurrent_saves_never_mix_files(tmp_path):
+    directory = str(tmp_path)
+    sizes = [1, 2, 3, 4, 5, 6, 7, 8]
+    threads = [threading.Thread(target=_index(size).save, args=(directory, {'size': size})) for size in sizes]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    index, meta = VectorIndex.load(directory)
+    # 无论哪次保存最后生效，矩阵、id 和 meta 都来自同一次保存
+    assert meta['size'] == meta['count'] == len(index) == len(index.ids())
+    assert not [name for name in os.listdir(directory) if name.endswith('.tmp')]
+    assert len(_versions(directory)) == len(sizes)
+
+
+def test_old_versions_are_removed(tmp_path):
+    directory = str(tmp_path)
+    _index(1).save(directory, {})
+    _index(2).save(directory, {})
+    old = time.time() - embeddings.STALE_VERSION_SECONDS - 1
+    for name in _versions(directory):
+        os.utime(os.path.join(directory, name), (old, old))
+
+    _index(3).save(directory, {})
+    with open(os.path.join(directory, INDEX_POINTER), encoding='utf-8') as f:
+        assert _versions(directory) == [f.read().strip()]
+    assert len(VectorIndex.load(directory)[0]) == 3
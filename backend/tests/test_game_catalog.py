@@ -0,0 +1,107 @@
+import threading
+import time
+
+import pytest
+
+from database.models import Game
+from services.game_catalog import GameCatalog, change_action
+from services.game_search import GameSearchEngine
+
+
+@pytest.fixture
+def catalog(games):
+    catalog = GameCatalog(refresh_seconds=0.05)
+    catalog.events = []
+    catalog.subscribe(lambda event, snapshot, old, new: catalog.events.append(event))
+    catalog.snapshot()
+    return catalog
+
+
+def _wait_refresh(catalog):
+    time.sleep(0.06)
+    snapshot = catalog.snapshot()
+    catalog._refresh_thread.join(5)
+    return snapshot
+
+
+def test_unchanged_catalog_keeps_its_version(catalog):
+    first = catalog.snapshot()
+    assert _wait_refresh(catalog) is first
+    assert catalog.snapshot() is first
+    assert catalog.events == ['reload']
+
+
+def test_stale_snapshot_is_served_while_refreshing(db, catalog):
+    first = catalog.snapshot()
+    db.add(Game(name='哈迪斯', name_en='Hades'))
+    db.commit()
+
+    # 过期后发现变化的请求仍拿到旧快照，新快照由后台线程生成
+    assert _wait_refresh(catalog) is first
+    current = catalog.snapshot()
+    assert current.version == first.version + 1
+    assert '哈迪斯' in current.by_name
+    assert catalog.events == ['reload', 'reload']
+
+
+def test_local_write_during_refresh_wins(catalog, games):
+    removed = games[0].id
+    load_session = catalog._session_factory
+
+    def session_after_local_write():
+        # 刷新开始读取数据库时，本进程刚好删除了一款游戏（数据库中的删除稍后提交）
+        catalog.remove(removed)
+        return load_session()
+
+    catalog._session_factory = session_after_local_write
+    assert removed not in catalog.reload(only_if_changed=True).by_id
+    assert catalog.events == ['reload', 'remove']
+
+
+def test_listeners_run_outside_the_catalog_lock(catalog, games):
+    finished = []
+
+    def slow_listener(event, snapshot, old, new):
+        if event != 'remove':
+            return
+        # 监听器执行期间其他线程仍能写入目录
+        writer = threading.Thread(target=catalog.remove, args=(games[1].id,))
+        writer.start()
+        writer.join(2)
+        finished.append(not writer.is_alive())
+
+    catalog.subscribe(slow_listener)
+    catalog.remove(games[0].id)
+    assert finished[0] is True
+    assert catalog.snapshot().version == 3
+
+
+def test_listener_receives_the_snapshot_of_its_event(catalog, games):
+    seen = []
+    catalog.subscribe(lambda event, snapshot, old, new: seen.append((event, snapshot.version, old.id)))
+    first = catalog.snapshot().version
+    catalog.remove(games[0].id)
+    catalog.remove(games[0].id)  # 已删除，不产生新版本
+    assert seen == [('remove', first + 1, games[0].id)]
+
+
+def test_change_action():
+    snapshot = type('Snapshot', (), {'version': 5})()
+    assert change_action(None, snapshot, 'upsert') == 'rebuild'
+    assert change_action(4, snapshot, 'upsert') == 'apply'
+    assert change_action(4, snapshot, 'reload') == 'rebuild'
+    assert change_action(3, snapshot, 'remove') == 'rebuild'
+    assert change_action(5, snapshot, 'upsert') == 'skip'
+    assert change_action(6, snapshot, 'remove') == 'skip'
+
+
+def test_search_indexes_ignore_stale_events(catalog, games):
+    search = GameSearchEngine(catalog)
+    search.titles_in('星露谷物语')
+    stale = catalog.snapshot()
+    catalog.remove(games[0].id)
+    assert search.name_index.version == catalog.snapshot().version
+
+    # 晚到的旧版本事件不能把已删除的游戏加回索引
+    search._on_catalog_change('upsert', stale, None, stale.by_id[games[0].id])
+    assert search.titles_in('星露谷物语') == []
@@ -0,0 +1,35 @@
+import json
+
+import pytest
+from flask import Flask
+
+from routes import game_routes
+from services.game_catalog import game_catalog
+
+
+@pytest.fixture
+def client(games):
+    game_catalog.reload()
+    app = Flask(__name__)
+    app.register_blueprint(game_routes.bp, url_prefix='/api/games')
+    return app.test_client()
+
+
+def test_search_reports_the_correction_it_used(client):
+    response = client.get('/api/games/search?q=Stardew Vallee')
+    assert [game['name'] for game in response.get_json()] == ['星露谷物语']
+    assert json.loads(response.headers['X-Did-You-Mean']) == 'stardew valley'
+
+
+def test_search_without_correction_has_no_header(client):
+    response = client.get('/api/games/search?q=Stardew Valley')
+    assert [game['name'] for game in response.get_json()] == ['星露谷物语']
+    assert 'X-Did-You-Mean' not in response.headers
+
+
+def test_unused_correction_is_not_reported(client, monkeypatch):
+    # 纠正后的查询没有结果，返回的是原查询的模糊匹配，不能再提示纠正
+    monkeypatch.setattr(game_routes.game_search, 'did_you_mean', lambda query: 'no such game')
+    response = client.get('/api/games/search?q=Stardew Vallee')
+    assert [game['name'] for game in response.get_json()] == ['星露谷物语']
+    assert 'X-Did-You-Mean' not in response.headers
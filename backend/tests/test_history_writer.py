@@ -0,0 +1,54 @@
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from database.models import ChatHistory, User
+from services.history_writer import HistoryWriter, history_row
+
+
+@pytest.fixture
+def users(db):
+    users = [User(user_key='writer-a'), User(user_key='writer-b')]
+    db.add_all(users)
+    db.commit()
+    return [user.id for user in users]
+
+
+def _stored(db):
+    db.expire_all()
+    return [(row.user_id, row.content) for row in db.query(ChatHistory).order_by(ChatHistory.id)]
+
+
+def test_bad_entry_only_drops_its_own_rows(db, users):
+    writer = HistoryWriter(write_behind=True, batch_size=100, flush_interval=60, retries=2)
+    committed, dropped = [], []
+    writer.subscribe(dropped.extend)
+    a, b = users
+    try:
+        writer.append([history_row(a, 'user', 'a1'), history_row(a, 'assistant', 'a2')],
+                      on_commit=lambda: committed.append('a'))
+        writer.append([history_row(b, 'user', None)], on_commit=lambda: committed.append('bad'))
+        writer.append([history_row(b, 'user', 'b1')], on_commit=lambda: committed.append('b'))
+        writer.flush()
+    finally:
+        writer.close()
+
+    assert _stored(db) == [(a, 'a1'), (a, 'a2'), (b, 'b1')]
+    assert committed == ['a', 'b']
+    assert [row['content'] for row in dropped] == [None]
+    stats = writer.stats()
+    assert (stats['written'], stats['dropped'], stats['pending']) == (3, 1, 0)
+    # 整批失败一次 + 坏条目一次（约束错误不重试）
+    assert stats['errors'] == 2
+
+
+def test_sync_mode_raises_on_failure(db, users):
+    writer = HistoryWriter(write_behind=False, retries=1)
+    a, _ = users
+    rows = [history_row(a, 'user', 'ok')]
+    writer.append(rows)
+    assert rows[0]['id'] is not None
+
+    with pytest.raises(IntegrityError):
+        writer.append([history_row(a, 'user', 'kept?'), history_row(a, 'assistant', None)])
+    assert _stored(db) == [(a, 'ok')]
+    assert writer.stats()['dropped'] == 2
@@ -0,0 +1,146 @@
+"""
+LLM 客户端连接池的集成测试：在本地起一个返回流式 chat completion 的 HTTP 服务，
+分别通过同步和异步客户端请求，检查 trace 回调和 in_flight 统计
+"""
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from config import Config
+from services.llm_client import LLMClientManager
+
+
+def _chunk(content):
+    return {
+        'id': 'chatcmpl-test', 'object': 'chat.completion.chunk', 'created': 0, 'model': 'test',
+        'choices': [{'index': 0, 'delta': {'content': content}, 'finish_reason': None}],
+    }
+
+
+class _StreamingHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        self._write(f"data: {json.dumps(_chunk('你好'))}\n\n")
+        # 第二段等测试读完第一段、检查过 in_flight 后再发送
+        self.server.release.wait(5)
+        self._write(f"data: {json.dumps(_chunk('世界'))}\n\n")
+        self._write('data: [DONE]\n\n')
+        self.wfile.write(b'0\r\n\r\n')
+        self.wfile.flush()
+
+    def _write(self, text):
+        data = text.encode('utf-8')
+        self.wfile.write(f'{len(data):x}\r\n'.encode() + data + b'\r\n')
+        self.wfile.flush()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def llm_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _StreamingHandler)
+    server.release = threading.Event()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.release.set()
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def manager(llm_server):
+    config = type('TestConfig', (Config,), {
+        'QWEN_API_KEY': 'test-key',
+        'QWEN_BASE_URL': f'http://127.0.0.1:{llm_server.server_port}/v1',
+        'LLM_HTTP2': False,
+        'LLM_MAX_RETRIES': 0,
+    })
+    manager = LLMClientManager(config)
+    yield manager
+    manager.close()
+
+
+def _request_args():
+    return {'model': 'test', 'messages': [{'role': 'user', 'content': 'hi'}], 'stream': True}
+
+
+def test_sync_stream_counts_in_flight_until_closed(manager, llm_server):
+    stream = manager.get_client().chat.completions.create(**_request_args())
+    chunks = iter(stream)
+    assert next(chunks).choices[0].delta.content == '你好'
+    assert manager.stats()['in_flight'] == 1
+
+    llm_server.release.set()
+    assert [chunk.choices[0].delta.content for chunk in chunks] == ['世界']
+    stream.close()
+
+    stats = manager.stats()
+    assert stats['in_flight'] == 0
+    assert stats['requests'] == 1
+    assert stats['connections_opened'] == 1
+    assert stats['errors'] == 0
+
+
+def test_async_stream_uses_async_trace_and_releases_on_close(manager, llm_server):
+    async def run():
+        client = manager.get_async_client()
+        try:
+            stream = await client.chat.completions.create(**_request_args())
+            contents = []
+            async for chunk in stream:
+                contents.append(chunk.choices[0].delta.content)
+                if len(contents) == 1:
+                    assert manager.stats()['async']['in_flight'] == 1
+                    llm_server.release.set()
+            await stream.close()
+            return contents, manager.stats()['async']
+        finally:
+            await manager.aclose()
+
+    contents, stats = asyncio.run(run())
+    assert contents == ['你好', '世界']
+    assert stats['in_flight'] == 0
+    assert stats['requests'] == 1
+    assert stats['connections_opened'] == 1
+    assert stats['errors'] == 0
+
+
+def test_async_stream_abandoned_early_is_released(manager, llm_server):
+    async def run():
+        client = manager.get_async_client()
+        try:
+            stream = await client.chat.completions.create(**_request_args())
+            async for _chunk_ in stream:
+                break
+            await stream.close()
+            return manager.stats()['async']
+        finally:
+            llm_server.release.set()
+            await manager.aclose()
+
+    stats = asyncio.run(run())
+    assert stats['in_flight'] == 0
+
+
+def test_sync_request_interrupted_is_released(manager, monkeypatch):
+    # KeyboardInterrupt 等非 Exception 的中断也要释放 in_flight
+    def interrupted(self, request):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(httpx.HTTPTransport, 'handle_request', interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        manager.get_client().chat.completions.create(**_request_args())
+    stats = manager.stats()
+    assert (stats['in_flight'], stats['errors']) == (0, 1)
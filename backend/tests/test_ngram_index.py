@@ -0,0 +1,40 @@
+import time
+
+import pytest
+
+from services.ngram_index import NgramIndex
+
+
+@pytest.fixture
+def index():
+    index = NgramIndex()
+    index.add(1, {'name': '星露谷物语', 'name_en': 'Stardew Valley'})
+    index.add(2, {'name': '杀戮尖塔', 'name_en': 'Slay the Spire'})
+    index.add(3, {'name': '原神'})
+    return index
+
+
+def test_contained_items(index):
+    found = index.contained_items('我想玩星露谷物语和原神')
+    assert sorted(found) == [(1, 'name', 5), (3, 'name', 2)]
+
+
+def test_search_scores(index):
+    assert index.search('原神')[0] == (3, 1.0)
+    assert index.search('星露谷物')[0][0] == 1
+    assert index.search('slay the spyre')[0][0] == 2
+
+
+def test_remove_updates_max_length(index):
+    index.remove(1)
+    assert index._max_len == len('slay the spire')
+    assert index.contained_items('星露谷物语') == []
+    index.remove(2)
+    assert index._max_len == 2
+
+
+def test_long_query_is_linear_in_title_length(index):
+    query = '有没有类似的好玩游戏推荐一下' * 150
+    start = time.perf_counter()
+    index.contained_items(query)
+    assert time.perf_counter() - start < 0.2
@@ -0,0 +1,43 @@
+import time
+
+import pytest
+
+from services.pinyin_index import SCORE_CONTAINED, SCORE_FULL, SCORE_INITIALS, SCORE_PREFIX, PinyinIndex
+
+
+@pytest.fixture
+def index():
+    index = PinyinIndex()
+    for item_id, name in enumerate(['原神', '战神', '鬼泣', '黑神话悟空', '康斯坦丝'], start=1):
+        index.add(item_id, name)
+    return index
+
+
+def test_homophone_and_pinyin_input(index):
+    assert index.search('康斯坦斯')[0] == (5, SCORE_FULL)
+    assert index.search('yuanshen')[0] == (1, SCORE_FULL)
+
+
+def test_initials_only_for_ascii_queries(index):
+    assert index.search('ys') == [(1, SCORE_INITIALS)]
+    assert index.search('hsh') == [(4, SCORE_PREFIX)]
+    # 汉字查询的首字母相同不算命中
+    for query in ('意思', '知识', '真是', '钢琴'):
+        assert index.search(query) == []
+
+
+def test_title_contained_in_cjk_query(index):
+    assert index.search('我想玩康斯坦斯') == [(5, SCORE_CONTAINED)]
+
+
+def test_long_query_is_bounded(index):
+    query = '我想找一个好玩的游戏' * 20
+    start = time.perf_counter()
+    index.search(query)
+    assert time.perf_counter() - start < 0.5
+
+
+def test_remove_shrinks_window(index):
+    index.remove(4)
+    assert index._max_units == 4
+    assert index.search('hshwk') == []
@@ -0,0 +1,131 @@
+"""
+Postgres 搜索索引测试：只有设置了 TEST_POSTGRES_URL（如 postgresql://user@localhost/postgres）才运行
+测试在临时创建的数据库中执行 alembic upgrade head（账号需有 CREATEDB 权限），
+检查模型声明与迁移一致，并实际执行 pg_trgm 和全文搜索
+"""
+import os
+import uuid
+from contextlib import contextmanager
+
+import pytest
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.config import Config as AlembicConfig
+from alembic.migration import MigrationContext
+from sqlalchemy import create_engine, make_url, text
+from sqlalchemy.orm import sessionmaker
+
+from database.models import TRIGRAM_COLUMNS, Base, Game
+from services.fulltext_search import FullTextSearch
+from services.trigram_search import TrigramSearch
+
+POSTGRES_URL = os.getenv('TEST_POSTGRES_URL')
+
+pytestmark = pytest.mark.skipif(not POSTGRES_URL, reason='TEST_POSTGRES_URL not set')
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@contextmanager
+def temporary_database():
+    """创建一个空数据库，返回连接它的 engine，结束时删除"""
+    name = f'ltygames_test_{uuid.uuid4().hex[:12]}'
+    admin = create_engine(POSTGRES_URL, isolation_level='AUTOCOMMIT')
+    with admin.connect() as conn:
+        conn.execute(text(f'CREATE DATABASE {name}'))
+    engine = create_engine(make_url(POSTGRES_URL).set(database=name))
+    try:
+        yield engine
+    finally:
+        engine.dispose()
+        with admin.connect() as conn:
+            conn.execute(text(f'DROP DATABASE {name}'))
+        admin.dispose()
+
+
+@pytest.fixture(scope='module')
+def pg_engine():
+    with temporary_database() as engine:
+        alembic_cfg = AlembicConfig(os.path.join(BACKEND_DIR, 'alembic.ini'))
+        alembic_cfg.set_main_option('script_location', os.path.join(BACKEND_DIR, 'alembic'))
+        with engine.begin() as conn:
+            alembic_cfg.attributes['connection'] = conn
+            command.upgrade(alembic_cfg, 'head')
+        with engine.begin() as conn:
+            conn.execute(Game.__table__.insert(), [
+                {'name': '星露谷物语', 'name_en': 'Stardew Valley', 'category': '模拟', 'description': '温馨的农场经营模拟游戏'},
+                {'name': '杀戮尖塔', 'name_en': 'Slay the Spire', 'category': '肉鸽', 'description': '卡牌构筑肉鸽游戏'},
+                {'name': '艾尔登法环', 'name_en': 'Elden Ring', 'category': '动作', 'description': '开放世界魂系动作游戏'},
+            ])
+        yield engine
+
+
+@pytest.fixture
+def pg_session(pg_engine):
+    session = sessionmaker(bind=pg_engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def _diff_table(diff):
+    """autogenerate 差异所涉及的表名"""
+    if isinstance(diff, list):  # modify_* 差异是列表
+        diff = diff[0]
+    if diff[0].endswith('_index'):
+        return diff[1].table.name
+    if diff[0].endswith('_table'):
+        return diff[1].name
+    return diff[2]
+
+
+def test_model_matches_the_migrated_games_table(pg_engine):
+    with pg_engine.connect() as conn:
+        diffs = compare_metadata(MigrationContext.configure(conn), Base.metadata)
+    assert [diff for diff in diffs if _diff_table(diff) == 'games'] == []
+
+
+def test_create_all_creates_the_search_indexes():
+    with temporary_database() as engine:
+        Base.metadata.create_all(engine)
+        with engine.connect() as conn:
+            indexes = {row[0] for row in conn.execute(text('SELECT indexname FROM pg_indexes'))}
+        assert FullTextSearch(engine=engine).available()
+    assert {f'ix_games_{column}_trgm' for column in TRIGRAM_COLUMNS} <= indexes
+    assert 'ix_games_search_vector' in indexes
+
+
+def test_trigram_search(pg_engine, pg_session):
+    search = TrigramSearch(engine=pg_engine)
+    assert search.available()
+
+    assert [game.name for game, _score in search.search('星露谷', db=pg_session)] == ['星露谷物语']
+    pg_session.rollback()
+    # 拼写错误靠相似度命中
+    assert [game.name for game, _score in search.search('Eldn Ring', db=pg_session)] == ['艾尔登法环']
+
+
+def test_substring_match_uses_the_trigram_index(pg_session):
+    pg_session.execute(text('SET LOCAL enable_seqscan = off'))
+    plan = '\n'.join(row[0] for row in pg_session.execute(
+        text("EXPLAIN SELECT id FROM games WHERE name ILIKE '%露谷%'")))
+    assert 'ix_games_name_trgm' in plan
+
+
+def test_fulltext_search(pg_engine, pg_session):
+    search = FullTextSearch(engine=pg_engine)
+    assert search.available()
+
+    # ORM 插入不取回生成列，search_vector 由数据库计算
+    pg_session.add(Game(name='哈迪斯', name_en='Hades', category='动作', description='希腊神话题材的动作肉鸽游戏'))
+    pg_session.commit()
+
+    results, has_more = search.search('肉鸽', db=pg_session)
+    assert not has_more
+    # 分类和简介都命中的排在只有简介命中的前面
+    assert [game.name for game, _rank, _headline in results][:2] == ['杀戮尖塔', '哈迪斯']
+    assert '<mark>肉鸽</mark>' in results[0][2]
+
+    page, has_more = search.search('肉鸽', limit=1, db=pg_session)
+    assert has_more and len(page) == 1
@@ -0,0 +1,40 @@
+import pytest
+
+from services.prompt_builder import PromptBuilder
+
+TEMPLATE = '你是游戏库助手。用户询问："{user_query}"\n{catalog}'
+
+
+class CharCounter:
+    """一个字符一个 token，便于构造超预算的模板"""
+
+    def count(self, text):
+        return len(text or '')
+
+    def count_message(self, message):
+        return 4 + self.count(message.get('content'))
+
+    def truncate(self, text, max_tokens):
+        return text[:max(0, max_tokens)]
+
+
+def _builder(system_budget):
+    return PromptBuilder(counter=CharCounter(), budgets={
+        'system': system_budget, 'catalog': 100, 'history': 100, 'user': 100, 'summary': 100,
+    })
+
+
+def test_system_tokens_exclude_placeholders():
+    # 固定部分 16 字 + 消息开销 4
+    assert _builder(100).system_tokens(TEMPLATE) == 20
+    messages, usage = _builder(20).build(TEMPLATE, [{'role': 'user', 'content': '星露谷'}], user_query='星露谷')
+    assert usage['system'] == 20
+    assert messages[0]['content'].startswith('你是游戏库助手。用户询问："星露谷"')
+
+
+def test_system_template_over_budget_fails():
+    builder = _builder(19)
+    with pytest.raises(ValueError, match='PROMPT_BUDGET_SYSTEM'):
+        builder.check_system('短模板', TEMPLATE)
+    with pytest.raises(ValueError):
+        builder.build(TEMPLATE, [{'role': 'user', 'content': '星露谷'}])
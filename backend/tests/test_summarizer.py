@@ -0,0 +1,89 @@
+from types import SimpleNamespace
+
+import pytest
+
+from database.models import ChatHistory, ConversationSummary, engine
+from services import summarizer as summarizer_module
+from services.summarizer import ConversationSummarizer
+
+
+class FakeCompletions:
+    def __init__(self):
+        self.prompts = []
+        self.checked_out = []
+
+    def create(self, **kwargs):
+        self.prompts.append(kwargs['messages'][0]['content'])
+        self.checked_out.append(engine.pool.checkedout())
+        message = SimpleNamespace(content=f'摘要 {len(self.prompts)}')
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+@pytest.fixture
+def completions(monkeypatch):
+    completions = FakeCompletions()
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    monkeypatch.setattr(summarizer_module.llm_clients, 'get_client', lambda: client)
+    return completions
+
+
+@pytest.fixture
+def summarizer(monkeypatch):
+    summarizer = ConversationSummarizer(keep_recent=8, batch_size=12, pass_size=100)
+    summarizer.rescheduled = []
+    monkeypatch.setattr(summarizer, 'schedule', summarizer.rescheduled.append)
+    return summarizer
+
+
+def _add_messages(db, user, count):
+    db.add_all([
+        ChatHistory(user_id=user.id, role='user' if i % 2 == 0 else 'assistant', content=f'消息 {i}')
+        for i in range(count)
+    ])
+    db.commit()
+    return [row.id for row in db.query(ChatHistory.id).order_by(ChatHistory.id)]
+
+
+def test_large_backlog_is_summarized_in_bounded_passes(db, user, summarizer, completions):
+    ids = _add_messages(db, user, 250)
+
+    assert summarizer.summarize(user.id)
+    assert summarizer.rescheduled == [user.id]
+    row = db.query(ConversationSummary).filter_by(user_id=user.id).one()
+    assert (row.last_history_id, row.message_count) == (ids[99], 100)
+    assert '消息 99' in completions.prompts[0] and '消息 100' not in completions.prompts[0]
+
+    assert summarizer.summarize(user.id)
+    assert summarizer.summarize(user.id)
+    db.expire_all()
+    row = db.query(ConversationSummary).filter_by(user_id=user.id).one()
+    # 最近 8 条留在提示词窗口中
+    assert (row.last_history_id, row.message_count) == (ids[-9], 242)
+    assert summarizer.rescheduled == [user.id, user.id]
+    assert summarizer.get(user.id) == ('摘要 3', ids[-9])
+
+    assert not summarizer.summarize(user.id)
+    assert len(completions.prompts) == 3
+
+
+def test_llm_call_does_not_hold_a_connection(db, user, summarizer, completions):
+    _add_messages(db, user, 30)
+    user_id = user.id
+    db.close()
+    assert summarizer.summarize(user_id)
+    assert completions.checked_out == [0]
+
+
+def test_result_discarded_when_history_cleared_during_call(db, user, summarizer, completions):
+    _add_messages(db, user, 30)
+    create = completions.create
+
+    def clear_then_create(**kwargs):
+        db.query(ChatHistory).delete()
+        db.commit()
+        return create(**kwargs)
+
+    completions.create = clear_then_create
+    assert not summarizer.summarize(user.id)
+    assert db.query(ConversationSummary).count() == 0
+    assert summarizer.stats()['stale'] == 1
@@ -0,0 +1,23 @@
+from services.ttl_cache import TTLCache
+
+
+def test_cache_evicts_least_recently_used():
+    cache = TTLCache('test', maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == (True, 1)
+    cache.set('c', 3)
+    assert (cache.get('b'), cache.get('a')) == ((False, None), (True, 1))
+    assert cache.stats()['evictions'] == 1
+
+
+def test_disabled_cache_stores_nothing():
+    cache = TTLCache('test', maxsize=0, ttl=60)
+    calls = []
+    for _ in range(3):
+        assert cache.get_or_compute('key', lambda: calls.append(1) or 'value') == 'value'
+    cache.set('key', 'value')
+    assert cache.get('key') == (False, None)
+    assert len(calls) == 3 and len(cache) == 0
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['evictions']) == (0, 0, 0)
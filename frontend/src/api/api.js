@@ -84,9 +84,11 @@ export const verifyUser = async (userKey) => {
   return response.data;
 };
 
-// 对话历史 API
-export const getChatHistory = async (userKey) => {
-  const response = await api.get(`/chat/history/${userKey}`);
+// 对话历史 API（按页返回最近的消息，传入上一页的 next_before_id 继续向前翻页）
+export const getChatHistory = async (userKey, beforeId) => {
+  const response = await api.get(`/chat/history/${userKey}`, {
+    params: beforeId ? { before_id: beforeId } : {},
+  });
   return response.data;
 };
 
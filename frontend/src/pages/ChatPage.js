@@ -24,7 +24,10 @@ function ChatPage() {
   const [userKey, setUserKeyState] = useState(null);
   const [loadingHistory, setLoadingHistory] = useState(true);
   const [randomGameName, setRandomGameName] = useState('');
+  const [olderBeforeId, setOlderBeforeId] = useState(null); // 更早一页的游标，null 表示没有更早的消息
+  const [loadingOlder, setLoadingOlder] = useState(false);
   const messagesEndRef = useRef(null);
+  const skipScrollRef = useRef(false); // 在顶部插入更早的消息时不滚动到底部
   const navigate = useNavigate();
   
   // 随机 placeholder 模板
@@ -63,6 +66,14 @@ function ChatPage() {
     return templates[Math.floor(Math.random() * templates.length)];
   };
 
+  // 历史记录 -> 消息格式（包含关联的游戏卡片）
+  const toMessages = (histories) => histories.map(h => ({
+    role: h.role,
+    content: h.content,
+    timestamp: h.created_at,
+    games: h.games || [] // 从历史记录中加载游戏卡片
+  }));
+
   // 加载对话历史，如果用户不存在则静默创建游客账号
   useEffect(() => {
     const initializeUser = async () => {
@@ -88,17 +99,10 @@ function ChatPage() {
         try {
           console.log('📚 Loading chat history...');
           const historyResponse = await getChatHistory(key);
-          const histories = historyResponse.histories || [];
-          
-          // 转换为消息格式（包含关联的游戏卡片）
-          const loadedMessages = histories.map(h => ({
-            role: h.role,
-            content: h.content,
-            timestamp: h.created_at,
-            games: h.games || [] // 从历史记录中加载游戏卡片
-          }));
+          const loadedMessages = toMessages(historyResponse.histories || []);
           
           setMessages(loadedMessages);
+          setOlderBeforeId(historyResponse.has_more ? historyResponse.next_before_id : null);
           console.log(`✅ Loaded ${loadedMessages.length} messages`);
         } catch (historyError) {
           // 用户可能不存在（数据库被清空），静默创建新游客账号
@@ -166,9 +170,31 @@ function ChatPage() {
   };
 
   useEffect(() => {
+    if (skipScrollRef.current) {
+      skipScrollRef.current = false;
+      return;
+    }
     scrollToBottom();
   }, [messages]);
 
+  // 向前翻一页，把更早的消息插入到列表顶部
+  const handleLoadOlder = async () => {
+    if (!userKey || !olderBeforeId || loadingOlder) return;
+
+    setLoadingOlder(true);
+    try {
+      const historyResponse = await getChatHistory(userKey, olderBeforeId);
+      skipScrollRef.current = true;
+      setMessages((prev) => [...toMessages(historyResponse.histories || []), ...prev]);
+      setOlderBeforeId(historyResponse.has_more ? historyResponse.next_before_id : null);
+    } catch (error) {
+      console.error('Failed to load older messages:', error);
+      message.error(t('chat.loadOlderFailed'));
+    } finally {
+      setLoadingOlder(false);
+    }
+  };
+
   const handleSendMessage = async () => {
     if (!inputValue.trim() || !userKey) return;
 
@@ -246,6 +272,7 @@ function ChatPage() {
     try {
       await clearChatHistory(userKey);
       setMessages([]);
+      setOlderBeforeId(null);
       message.success(t('chat.historyCleared'));
     } catch (error) {
       console.error('Failed to clear history:', error);
@@ -300,6 +327,14 @@ function ChatPage() {
       <Content className="chat-content">
         <div className="messages-container">
           <div className="messages-inner">
+            {olderBeforeId && messages.length > 0 && (
+              <div style={{ display: 'flex', justifyContent: 'center', marginBottom: 16 }}>
+                <button onClick={handleLoadOlder} className="glass-btn" disabled={loadingOlder}>
+                  <MessageSquare size={16} />
+                  <span>{loadingOlder ? t('chat.loadingOlder') : t('chat.loadOlder')}</span>
+                </button>
+              </div>
+            )}
             {messages.length === 0 ? (
               <motion.div 
                 className="welcome-container"